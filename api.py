@@ -0,0 +1,721 @@
+#!/usr/bin/env python3
+"""Local HTTP API for submitting and watching conversions, without the GUI
+
+Scripts submit batches, poll their state and stream progress over HTTP on
+localhost (or a Unix socket), and the jobs go into the same durable queue the
+GUI uses, converted by `python -m jobqueue` worker processes:
+
+    python -m api [--port 8765 | --socket PATH] [--workers N] [--db PATH]
+
+    POST /jobs                       submit a batch (JSON, see submit())
+    GET  /jobs[?batch=ID&state=S]    jobs as a JSON list
+    GET  /jobs/ID                    one job, with its telemetry record once it has finished
+    POST /jobs/ID/ACTION             cancel, pause, resume or prioritize a job
+    GET  /batches/ID                 a batch's jobs, state counts and overall progress
+    POST /batches/ID/ACTION          cancel, pause, resume or prioritize a whole batch
+    GET  /events[?batch=ID]          Server-Sent Events: one "job" event per change
+    GET  /status                     job counts and workers
+
+The server is a single asyncio event loop and never imports Qt. Many clients
+cost the workers nothing extra: one poll loop reads what changed in the queue
+every half second into an in-memory snapshot, and every status request and
+event stream is answered from that snapshot. Queue writes and the probing of
+submitted files run on thread pools, so a large submission never holds up
+status requests.
+
+Over TCP every request must carry the install's API token
+(`Authorization: Bearer TOKEN`, see api_token()) and a Host header naming this
+machine, and POST bodies must be sent as application/json. Requests with an
+Origin header from another site are refused. Web pages therefore cannot queue
+jobs through the user's browser, whether by a cross-site form post or by DNS
+rebinding. A Unix socket is created usable by its owner only, so it needs no
+token.
+"""
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import hmac
+import secrets
+import asyncio
+import argparse
+import subprocess
+import dataclasses
+from urllib.parse import urlsplit, parse_qs
+from concurrent.futures import ThreadPoolExecutor
+
+from probe import MetadataCache, state_dir
+from engine import ConversionOptions, ROTATE_BURN, ROTATE_FAST, expand_inputs, plan_jobs
+from jobqueue import JobQueue, PAUSE, PENDING, FINISHED_STATES, job_inputs, default_db_path
+from telemetry import default_log_path
+from profiles import PROFILE_NAMES
+from trim import parse_time
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# How often the queue is read for changes
+POLL_INTERVAL = 0.5
+# Finished jobs are re-read for this long after they finish, so clock skew between
+# workers on different machines cannot hide a job's last change
+FINISHED_MARGIN = 60.0
+# Idle event streams get a comment line this often, so proxies and clients keep them open
+KEEPALIVE_INTERVAL = 15.0
+# Events buffered per stream; a client that falls this far behind is disconnected
+MAX_PENDING_EVENTS = 1000
+MAX_BODY_BYTES = 1024 * 1024
+# Threads that expand and probe submitted files
+SUBMIT_THREADS = 4
+
+# What the control endpoints can do
+ACTIONS = ("cancel", "pause", "resume", "prioritize")
+
+# Host names that always refer to this machine
+LOOPBACK_HOSTS = ("localhost", "127.0.0.1", "::1")
+
+HTTP_STATUS = {
+    200: "OK", 201: "Created", 400: "Bad Request", 401: "Unauthorized", 403: "Forbidden", 404: "Not Found",
+    405: "Method Not Allowed", 413: "Payload Too Large", 415: "Unsupported Media Type",
+    500: "Internal Server Error",
+}
+
+
+class HttpError(Exception):
+    """Error returned to the client as {"error": message} with an HTTP status"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+@dataclasses.dataclass
+class Request:
+    method: str
+    path: str
+    query: dict
+    headers: dict
+    body: bytes
+    keep_alive: bool
+
+    def json(self):
+        try:
+            return json.loads(self.body or b"{}")
+        except ValueError as e:
+            raise HttpError(400, f"Invalid JSON: {str(e)}")
+
+
+async def read_request(reader):
+    """Read one HTTP/1.x request, or return None when the client closed the connection"""
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, target, version = line.decode("latin-1").split()
+    except ValueError:
+        raise HttpError(400, "Malformed request line")
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+        if len(headers) > 100:
+            raise HttpError(400, "Too many headers")
+
+    try:
+        length = int(headers.get("content-length", 0))
+    except ValueError:
+        raise HttpError(400, "Invalid Content-Length")
+    if length > MAX_BODY_BYTES:
+        raise HttpError(413, f"Request bodies are limited to {MAX_BODY_BYTES} bytes")
+    body = await reader.readexactly(length) if length else b""
+
+    connection = headers.get("connection", "").lower()
+    keep_alive = connection == "keep-alive" if version == "HTTP/1.0" else connection != "close"
+    url = urlsplit(target)
+    query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+    return Request(method.upper(), url.path.rstrip("/") or "/", query, headers, body, keep_alive)
+
+
+def default_token_path():
+    return os.environ.get("VIDEOCONVERTER_API_TOKEN_FILE") or os.path.join(state_dir(), "api-token")
+
+
+def api_token(path=None):
+    """The install's API token, created (readable by its owner only) on first use"""
+    path = path or default_token_path()
+    try:
+        with open(path, "r") as f:
+            token = f.read().strip()
+        if token:
+            return token
+    except OSError:
+        pass
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    token = secrets.token_urlsafe(32)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as f:
+        f.write(token + "\n")
+    os.replace(tmp_path, path)
+    return token
+
+
+def _host_name(value):
+    """The host part of a Host header or an origin's netloc, without the port"""
+    value = value.strip().lower()
+    if value.startswith("["):
+        return value[1:].partition("]")[0]
+    return value.rpartition(":")[0] if value.count(":") == 1 else value
+
+
+def check_request(request, token=None, hosts=None):
+    """Refuse requests that may come from a web page rather than a local client
+
+    `token` is required as a Bearer token and `hosts` are the names the Host
+    header may use (None skips these checks, for the Unix socket). Raises HttpError.
+    """
+    origin = request.headers.get("origin")
+    if origin is not None:
+        url = urlsplit(origin)
+        if url.scheme not in ("http", "https") or _host_name(url.netloc) not in (hosts or LOOPBACK_HOSTS):
+            raise HttpError(403, "Cross-origin requests are not allowed")
+    if hosts is not None and _host_name(request.headers.get("host", "")) not in hosts:
+        raise HttpError(403, "Unexpected Host header")
+    if token is not None:
+        scheme, _, given = request.headers.get("authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not hmac.compare_digest(given.strip().encode(), token.encode()):
+            raise HttpError(401, "Missing or wrong API token (Authorization: Bearer TOKEN)")
+    if request.method == "POST":
+        content_type = request.headers.get("content-type", "").partition(";")[0].strip().lower()
+        if content_type != "application/json":
+            raise HttpError(415, "POST bodies must be sent as Content-Type: application/json")
+
+
+def write_response(writer, status, payload, keep_alive=True):
+    """Send a JSON response"""
+    body = (json.dumps(payload) + "\n").encode("utf-8")
+    writer.write(
+        f"HTTP/1.1 {status} {HTTP_STATUS.get(status, 'Unknown')}\r\n"
+        "Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+        "\r\n".encode("latin-1") + body
+    )
+
+
+def parse_options(data):
+    """Build ConversionOptions from the "options" object of a submission
+
+    Values are converted to the type of each field; trim times may also be
+    given as "MM:SS" or "HH:MM:SS". Raises HttpError for unknown fields and
+    invalid values.
+    """
+    if not isinstance(data, dict):
+        raise HttpError(400, '"options" must be an object')
+    fields = {f.name: f for f in dataclasses.fields(ConversionOptions)}
+    values = {}
+    for name, value in data.items():
+        if name not in fields or name == "requested_profile":  # Set by the workers when resolving "auto"
+            raise HttpError(400, f"Unknown option: {name}")
+        kind = type(fields[name].default)
+        try:
+            if name in ("trim_start", "trim_end") and isinstance(value, str):
+                value = parse_time(value)
+            elif kind is bool and not isinstance(value, bool):
+                raise ValueError("expected true or false")
+            values[name] = kind(value)
+        except (TypeError, ValueError) as e:
+            raise HttpError(400, f"Invalid value for {name}: {str(e)}")
+        if kind in (int, float) and values[name] < 0:
+            raise HttpError(400, f"Invalid value for {name}: must not be negative")
+    options = ConversionOptions(**values)
+    if options.trim_end and options.trim_end <= options.trim_start:
+        raise HttpError(400, "trim_end must come after trim_start")
+    if options.profile not in PROFILE_NAMES:
+        raise HttpError(400, f"Unknown profile: {options.profile} (one of {', '.join(PROFILE_NAMES)})")
+    if options.rotate_method not in (ROTATE_BURN, ROTATE_FAST):
+        raise HttpError(400, f"Unknown rotate_method: {options.rotate_method}")
+    return options
+
+
+def job_view(job):
+    """The JSON form of a queue row"""
+    return {
+        "id": job["id"],
+        "batch": job["batch"],
+        "state": job["state"],
+        "paused": job["control"] == PAUSE,
+        "control": job["control"],
+        "progress": round(job["progress"], 4),
+        "input": job["input_path"],
+        "inputs": job_inputs(job),
+        "output": job["output_path"],
+        "options": json.loads(job["options"]),
+        "priority": job.get("priority", 0),
+        "attempts": job["attempts"],
+        "max_attempts": job["max_attempts"],
+        "worker": job["worker"],
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+    }
+
+
+def batch_summary(batch, jobs):
+    """State counts and overall progress of a batch's jobs"""
+    states = {}
+    for job in jobs:
+        states[job["state"]] = states.get(job["state"], 0) + 1
+    return {
+        "batch": batch,
+        "jobs": len(jobs),
+        "states": states,
+        "progress": round(sum(job["progress"] for job in jobs) / len(jobs), 4) if jobs else 0.0,
+        "finished": all(job["state"] in FINISHED_STATES for job in jobs),
+    }
+
+
+def _changes(job):
+    """The fields whose changes are reported (not the heartbeat)"""
+    return {k: v for k, v in job.items() if k != "heartbeat"}
+
+
+class JobSnapshot:
+    """In-memory copy of the queue, updated from the rows that can have changed
+
+    refresh() does blocking database reads; the server runs it on its
+    database thread.
+    """
+
+    def __init__(self, queue):
+        self.queue = queue
+        self.jobs = {}  # id -> row
+        self._last_poll = None
+
+    def refresh(self):
+        """Read what changed since the last refresh; returns the rows that changed"""
+        now = time.time()
+        rows = self.queue.jobs() if self._last_poll is None else self.queue.recent_jobs(
+            self._last_poll - FINISHED_MARGIN)
+        self._last_poll = now
+        changed = []
+        for row in rows:
+            old = self.jobs.get(row["id"])
+            if old is None or _changes(old) != _changes(row):
+                changed.append(row)
+            self.jobs[row["id"]] = row
+        return changed
+
+    def batch(self, batch):
+        return [job for job in self.jobs.values() if job["batch"] == batch]
+
+
+class TelemetryIndex:
+    """Telemetry records by output path, read incrementally from the end of the log"""
+
+    def __init__(self, path=None):
+        self.path = path or default_log_path()
+        self._offset = 0
+        self._records = {}  # output path -> records, oldest first
+
+    def refresh(self):
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(0, os.SEEK_END)
+                if f.tell() < self._offset:
+                    # The log was rotated or truncated
+                    self._offset, self._records = 0, {}
+                f.seek(self._offset)
+                data = f.read()
+        except OSError:
+            return
+        # Leave a line that is still being written for the next refresh
+        complete = data[:data.rfind(b"\n") + 1]
+        self._offset += len(complete)
+        for line in complete.splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            self._records.setdefault(record.get("output"), []).append(record)
+
+    def for_job(self, job):
+        """The latest record of a job's last attempt, or None"""
+        self.refresh()
+        started = job["started_at"] or job["created_at"]
+        records = [r for r in self._records.get(job["output_path"], []) if r.get("time", 0) >= started]
+        return records[-1] if records else None
+
+
+class ApiServer:
+    """Serves the API on top of a JobQueue, and keeps worker processes running while jobs are pending"""
+
+    def __init__(self, db_path=None, worker_count=0, telemetry_path=None, token=None, hosts=None):
+        self.queue = JobQueue(db_path)
+        # Required API token and allowed Host names (both None on a Unix socket, see check_request())
+        self.token = token
+        self.hosts = hosts
+        self.worker_count = worker_count
+        self.snapshot = JobSnapshot(self.queue)
+        self.telemetry = TelemetryIndex(telemetry_path)
+        self.metadata_cache = MetadataCache()
+        # Every database access runs on one thread, so the event loop never blocks on SQLite
+        self.db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="api-db")
+        self.submit_executor = ThreadPoolExecutor(max_workers=SUBMIT_THREADS, thread_name_prefix="api-submit")
+        self.subscribers = set()  # (queue of events, batch or None)
+        self.workers = []
+        self._poll_task = None
+        self.routes = [
+            ("GET", re.compile(r"/status"), self.status),
+            ("GET", re.compile(r"/jobs"), self.list_jobs),
+            ("POST", re.compile(r"/jobs"), self.submit),
+            ("GET", re.compile(r"/jobs/(\d+)"), self.get_job),
+            ("POST", re.compile(rf"/jobs/(\d+)/({'|'.join(ACTIONS)})"), self.control_job),
+            ("GET", re.compile(r"/batches/([\w.-]+)"), self.get_batch),
+            ("POST", re.compile(rf"/batches/([\w.-]+)/({'|'.join(ACTIONS)})"), self.control_batch),
+            ("GET", re.compile(r"/events"), self.events),
+        ]
+
+    async def _db(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.db_executor, function, *args)
+
+    # Lifecycle
+
+    async def start(self):
+        await self.refresh()
+        self._poll_task = asyncio.ensure_future(self._poll())
+
+    async def close(self):
+        if self._poll_task:
+            self._poll_task.cancel()
+        self.submit_executor.shutdown(wait=True)
+        self.db_executor.shutdown(wait=True)
+        self.metadata_cache.save()
+        self.queue.close()
+        # Workers keep converting; the queue is durable and they exit once it is empty
+
+    async def refresh(self):
+        """Update the snapshot and send the changes to the event streams"""
+        changed = await self._db(self.snapshot.refresh)
+        for job in changed:
+            self._publish("job", job_view(job), job["batch"])
+        for batch in {job["batch"] for job in changed if job["state"] in FINISHED_STATES}:
+            summary = batch_summary(batch, self.snapshot.batch(batch))
+            if summary["finished"]:
+                self._publish("complete", summary, batch)
+        return changed
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(POLL_INTERVAL)
+            try:
+                await self.refresh()
+                self.spawn_workers()
+            except Exception as e:
+                print(f"Error polling the job queue: {str(e)}", file=sys.stderr)
+
+    def spawn_workers(self):
+        """Make sure worker_count workers are alive while there are jobs to run"""
+        self.workers = [worker for worker in self.workers if worker.poll() is None]
+        if len(self.workers) >= self.worker_count:
+            return
+        if not any(job["state"] == PENDING and job["control"] is None for job in self.snapshot.jobs.values()):
+            return
+        cmd = [sys.executable, "-m", "jobqueue", "--db", self.queue.db_path, "work", "--exit-when-idle",
+               "--threads", str(max(1, (os.cpu_count() or 1) // self.worker_count))]
+        app_dir = os.path.dirname(os.path.abspath(__file__))
+        for _ in range(self.worker_count - len(self.workers)):
+            self.workers.append(subprocess.Popen(cmd, cwd=app_dir, stdin=subprocess.DEVNULL,
+                                                 stdout=subprocess.DEVNULL))
+
+    def _publish(self, event, data, batch):
+        for subscriber in list(self.subscribers):
+            events, wanted = subscriber
+            if wanted is not None and wanted != batch:
+                continue
+            try:
+                events.put_nowait((event, data))
+            except asyncio.QueueFull:
+                # Too slow to keep up: end the stream rather than buffer without limit
+                self.subscribers.discard(subscriber)
+                while not events.empty():
+                    events.get_nowait()
+                events.put_nowait(None)
+
+    # Connections
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                except HttpError as e:
+                    write_response(writer, e.status, {"error": str(e)}, keep_alive=False)
+                    break
+                if request is None:
+                    break
+                if not await self.dispatch(request, writer):
+                    break
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            try:
+                writer.close()
+            except Exception:
+                pass
+
+    async def dispatch(self, request, writer):
+        """Handle one request; returns whether the connection stays open"""
+        try:
+            check_request(request, self.token, self.hosts)
+        except HttpError as e:
+            write_response(writer, e.status, {"error": str(e)}, keep_alive=False)
+            return False
+
+        allowed = []
+        for method, pattern, handler in self.routes:
+            match = pattern.fullmatch(request.path)
+            if match is None:
+                continue
+            if method != request.method:
+                allowed.append(method)
+                continue
+            try:
+                result = await handler(request, writer, *match.groups())
+            except HttpError as e:
+                write_response(writer, e.status, {"error": str(e)}, request.keep_alive)
+                return request.keep_alive
+            except (ConnectionError, asyncio.CancelledError):
+                raise
+            except Exception as e:
+                print(f"Error handling {request.method} {request.path}: {str(e)}", file=sys.stderr)
+                write_response(writer, 500, {"error": str(e)}, request.keep_alive)
+                return request.keep_alive
+            if result is None:
+                return False  # An event stream, which ends with the connection
+            status, payload = result
+            write_response(writer, status, payload, request.keep_alive)
+            return request.keep_alive
+
+        if allowed:
+            write_response(writer, 405, {"error": f"Use {' or '.join(allowed)}"}, request.keep_alive)
+        else:
+            write_response(writer, 404, {"error": f"No such resource: {request.path}"}, request.keep_alive)
+        return request.keep_alive
+
+    # Handlers. Each returns (status, JSON payload), or None after streaming its own response
+
+    async def status(self, request, writer):
+        states = {}
+        for job in self.snapshot.jobs.values():
+            states[job["state"]] = states.get(job["state"], 0) + 1
+        self.workers = [worker for worker in self.workers if worker.poll() is None]
+        return 200, {"db": self.queue.db_path, "states": states, "workers": len(self.workers),
+                     "max_workers": self.worker_count}
+
+    async def list_jobs(self, request, writer):
+        jobs = self.snapshot.jobs.values()
+        if "batch" in request.query:
+            jobs = [job for job in jobs if job["batch"] == request.query["batch"]]
+        if "state" in request.query:
+            jobs = [job for job in jobs if job["state"] == request.query["state"]]
+        return 200, [job_view(job) for job in sorted(jobs, key=lambda job: job["id"])]
+
+    async def get_job(self, request, writer, job_id):
+        job = self.snapshot.jobs.get(int(job_id))
+        if job is None:
+            raise HttpError(404, f"No job {job_id}")
+        view = job_view(job)
+        if job["state"] in FINISHED_STATES:
+            view["telemetry"] = await self._db(self.telemetry.for_job, job)
+        return 200, view
+
+    async def get_batch(self, request, writer, batch):
+        jobs = sorted(self.snapshot.batch(batch), key=lambda job: job["id"])
+        if not jobs:
+            raise HttpError(404, f"No batch {batch}")
+        summary = batch_summary(batch, jobs)
+        summary["jobs"] = [job_view(job) for job in jobs]
+        return 200, summary
+
+    async def submit(self, request, writer):
+        """Queue a batch
+
+        {"inputs": [files, folders or glob patterns], "output_dir": "...",
+         "options": {ConversionOptions fields}, "join_spanned": true,
+         "batch": "optional id", "prioritize": false}
+
+        Returns {"batch": ..., "jobs": [ids]} once the jobs are queued.
+        """
+        body = request.json()
+        inputs = body.get("inputs")
+        if not isinstance(inputs, list) or not inputs or not all(isinstance(p, str) for p in inputs):
+            raise HttpError(400, '"inputs" must be a non-empty list of paths')
+        output_dir = body.get("output_dir")
+        if not isinstance(output_dir, str) or not output_dir:
+            raise HttpError(400, '"output_dir" is required')
+        options = parse_options(body.get("options", {}))
+        batch = str(body.get("batch") or uuid.uuid4().hex)
+        if not re.fullmatch(r"[\w.-]+", batch):
+            raise HttpError(400, '"batch" may only contain letters, digits, "_", "-" and "."')
+
+        loop = asyncio.get_running_loop()
+        jobs = await loop.run_in_executor(self.submit_executor, self._plan, inputs, output_dir,
+                                          bool(body.get("join_spanned", True)))
+        job_ids = await self._db(self.queue.enqueue_many, [(job, options) for job in jobs], batch)
+        if body.get("prioritize"):
+            await self._db(self.queue.prioritize, job_ids)
+        await self.refresh()
+        self.spawn_workers()
+        return 201, {"batch": batch, "jobs": job_ids}
+
+    def _plan(self, inputs, output_dir, join_spanned):
+        """Expand and probe submitted inputs into ConversionJobs (blocking)"""
+        inputs = [os.path.expanduser(path) for path in inputs]
+        output_dir = os.path.abspath(os.path.expanduser(output_dir))
+        video_files = expand_inputs(inputs)
+        if not video_files:
+            raise HttpError(400, "No input files found")
+        metadata = {}
+        for path in video_files:
+            try:
+                metadata[path] = self.metadata_cache.get(path)
+            except Exception as e:
+                print(f"Error probing {path}: {str(e)}", file=sys.stderr)
+                metadata[path] = None
+        try:
+            os.makedirs(output_dir, exist_ok=True)
+        except OSError as e:
+            raise HttpError(400, f"Could not create output directory: {str(e)}")
+        return plan_jobs(video_files, output_dir, metadata, join_spanned)
+
+    async def _control(self, action, job_ids=None, batch=None):
+        if action == "prioritize":
+            if job_ids is None:
+                job_ids = [job["id"] for job in sorted(self.snapshot.batch(batch), key=lambda job: job["id"])
+                           if job["state"] == PENDING]
+            await self._db(self.queue.prioritize, job_ids)
+        else:
+            selection = {"batch": batch} if batch is not None else {"job_ids": job_ids}
+            await self._db(lambda: getattr(self.queue, action)(**selection))
+        await self.refresh()
+
+    async def control_job(self, request, writer, job_id, action):
+        if int(job_id) not in self.snapshot.jobs:
+            raise HttpError(404, f"No job {job_id}")
+        await self._control(action, job_ids=[int(job_id)])
+        return 200, job_view(self.snapshot.jobs[int(job_id)])
+
+    async def control_batch(self, request, writer, batch, action):
+        if not self.snapshot.batch(batch):
+            raise HttpError(404, f"No batch {batch}")
+        await self._control(action, batch=batch)
+        return 200, batch_summary(batch, self.snapshot.batch(batch))
+
+    async def events(self, request, writer):
+        """Stream job changes as Server-Sent Events
+
+        Starts with the current state of every unfinished job (of the batch,
+        if given), then sends a "job" event for each change and a "complete"
+        event when every job of a batch has finished.
+        """
+        batch = request.query.get("batch")
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: text/event-stream\r\n"
+            b"Cache-Control: no-cache\r\n"
+            b"Connection: close\r\n"
+            b"\r\n"
+        )
+        events = asyncio.Queue(MAX_PENDING_EVENTS)
+        subscriber = (events, batch)
+        self.subscribers.add(subscriber)
+        try:
+            jobs = self.snapshot.batch(batch) if batch else self.snapshot.jobs.values()
+            for job in sorted(jobs, key=lambda job: job["id"]):
+                if batch or job["state"] not in FINISHED_STATES:
+                    events.put_nowait(("job", job_view(job)))
+            if batch and jobs and all(job["state"] in FINISHED_STATES for job in jobs):
+                events.put_nowait(("complete", batch_summary(batch, jobs)))
+
+            while True:
+                try:
+                    item = await asyncio.wait_for(events.get(), KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    writer.write(b": keepalive\n\n")
+                    await writer.drain()
+                    continue
+                if item is None:
+                    return None
+                event, data = item
+                writer.write(f"event: {event}\ndata: {json.dumps(data)}\n\n".encode("utf-8"))
+                await writer.drain()
+        finally:
+            self.subscribers.discard(subscriber)
+
+
+async def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, socket_path=None, db_path=None, worker_count=0,
+                telemetry_path=None, token_path=None):
+    """Run the API server until cancelled"""
+    if socket_path:
+        api = ApiServer(db_path, worker_count, telemetry_path)
+    else:
+        hosts = LOOPBACK_HOSTS + (_host_name(f"[{host}]" if ":" in host else host),)
+        api = ApiServer(db_path, worker_count, telemetry_path, api_token(token_path), hosts)
+    await api.start()
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)  # Left behind by a server that did not shut down
+        server = await asyncio.start_unix_server(api.handle_connection, socket_path)
+        os.chmod(socket_path, 0o600)
+        address = socket_path
+    else:
+        server = await asyncio.start_server(api.handle_connection, host, port)
+        address = f"http://{host}:{port}"
+    event = {"event": "listening", "address": address, "db": api.queue.db_path}
+    if api.token is not None:
+        event["token_file"] = token_path or default_token_path()
+    print(json.dumps(event), flush=True)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await api.close()
+        if socket_path and os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+def main(argv=None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(prog="python -m api", description="Local HTTP API for video conversion jobs")
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"address to listen on (default: {DEFAULT_HOST})")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"TCP port (default: {DEFAULT_PORT})")
+    parser.add_argument("--socket", default=None, metavar="PATH",
+                        help="listen on this Unix socket instead of TCP (only its owner can connect)")
+    parser.add_argument("--db", default=None, help=f"queue database (default: {default_db_path()})")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="worker processes started while jobs are pending (default: number of CPU "
+                             "cores; 0: leave converting to workers started separately)")
+    parser.add_argument("--telemetry-log", default=None,
+                        help="telemetry log the workers write (default: $VIDEOCONVERTER_TELEMETRY_LOG "
+                             "or the state directory)")
+    parser.add_argument("--token-file", default=None,
+                        help="file holding the API token TCP clients must send, created if missing (default: "
+                             "$VIDEOCONVERTER_API_TOKEN_FILE or api-token in the state directory)")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.socket, args.db, max(0, args.workers), args.telemetry_log,
+                          args.token_file))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,31 +4,92 @@ import sys
 import subprocess
 import threading
 import time
+import json
+import uuid
+from collections import deque
+from dataclasses import replace
+
+# Startup timings count from here (see startup.py)
+STARTED = time.perf_counter()
+
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
-                            QLabel, QPushButton, QListWidget, QFileDialog, QProgressBar, 
-                            QFrame, QSplitter, QGroupBox, QGridLayout, QLineEdit, QCheckBox)
-from PyQt6.QtCore import Qt, QUrl, pyqtSignal, pyqtSlot, QSize, QThread
-from PyQt6.QtMultimedia import QMediaPlayer, QAudioOutput
-from PyQt6.QtMultimediaWidgets import QVideoWidget
-from PyQt6.QtGui import QIcon, QFont
+                            QLabel, QPushButton, QTableView, QFileDialog, QProgressBar, 
+                            QFrame, QSplitter, QGroupBox, QGridLayout, QLineEdit, QCheckBox,
+                            QSpinBox, QComboBox, QAbstractItemView, QHeaderView, QMenu)
+from PyQt6.QtCore import Qt, QUrl, pyqtSignal, pyqtSlot, QSize, QObject, QIODevice, QTimer
+from PyQt6.QtGui import QIcon, QFont, QImage, QPixmap
+
+from probe import MetadataCache
+from ingest import collect_files
+from filemodel import FileTableModel, FileFilterProxy, PATH_ROLE, NAME, format_size, format_duration
+from preview import build_preview_command, PreviewCache, PreviewPrefetcher
+from thumbnails import ThumbnailCache
+from engine import ConversionOptions, job_trim, plan_jobs, ROTATE_BURN, ROTATE_FAST
+from supervisor import ProcessSupervisor, SupervisorError
+from jobqueue import JobQueue, CANCELLED, FAILED, FINISHED_STATES, PAUSE, PENDING, RUNNING, SKIPPED
+from profiles import PROFILES, AUTO
+from trim import format_time, parse_time
+from startup import StartupTimer, exit_after_startup
+
+# Worker processes are started from the application directory so "python -m jobqueue" resolves
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+# Poster frames shown in the file list
+THUMBNAIL_ICON_SIZE = QSize(48, 27)
+# Files each worker copies ahead when staging is on
+STAGE_AHEAD = 2
 
 class VideoConverter(QMainWindow):
-    def __init__(self):
+    def __init__(self, startup=None):
         super().__init__()
+        self.startup = startup  # StartupTimer of this launch, or None
         
         # Set window properties
         self.setWindowTitle("MTS to MP4 Video Converter - Portrait Mode")
         self.setMinimumSize(900, 600)
         
         # Initialize variables
-        self.video_files = []
-        self.video_properties = {}  # Dictionary to store properties for each video file
+        self.metadata_cache = MetadataCache()  # Probe results, persisted across runs
+        
+        # Probe files on background threads so slow media never blocks the UI
+        self.prober = MetadataProber(self.metadata_cache)
+        self.prober.metadata_ready.connect(self.on_metadata_ready)
+        self.prober.probe_failed.connect(self.on_probe_failed)
+        
+        # Selected files, indexed by path; rows that scroll into view are probed first
+        self.file_model = FileTableModel(self.metadata_cache, self)
+        self.file_model.metadata_needed.connect(self.prober.prioritize)
+        
+        # Poster frames for the list and filmstrips for the selected file, extracted from keyframes only
+        self.thumbnail_loader = ThumbnailLoader(ThumbnailCache(), self.metadata_cache, THUMBNAIL_ICON_SIZE)
+        self.thumbnail_loader.thumbnail_ready.connect(self.on_thumbnail_ready)
+        self.file_model.thumbnail_needed.connect(self.thumbnail_loader.prioritize)
+        self.filmstrips = {}  # path -> filmstrip image path
+        self.trims = {}  # path -> (start, end) in seconds; end 0 means the end of the clip
+        self.file_proxy = FileFilterProxy(self)
+        self.file_proxy.setSourceModel(self.file_model)
+        
+        # Folders are scanned and copies detected on a background thread
+        self.importer = FileImporter()
+        self.importer.imported.connect(self.on_files_imported)
+        
+        # Finished previews are kept in a size-capped cache and neighbors are prepared ahead of time
+        self.preview_cache = PreviewCache()
+        self.prefetcher = PreviewPrefetcher(self.preview_cache, self.metadata_cache)
         self.current_preview_file = None
         self.preview_running = False
+        self.preview_device = None
         self.output_directory = os.path.expanduser("~/Desktop/VideoConverter")
         
+        # Conversions are queued in a durable job queue and run by worker processes
+        self.job_queue = JobQueue()
+        self.queue_monitor = None
+        self.paused = False
+        
         # Setup UI
         self.setup_ui()
+        
+        # Pick up batches left unfinished by a previous session
+        self.resume_unfinished_batches()
     
     def setup_ui(self):
         # Create central widget
@@ -65,15 +126,45 @@ class VideoConverter(QMainWindow):
         self.select_btn.clicked.connect(self.select_videos)
         file_buttons_layout.addWidget(self.select_btn)
         
+        self.add_folder_btn = QPushButton("Add Folder")
+        self.add_folder_btn.setToolTip("Add every clip in a folder and its subfolders (or an AVCHD card)")
+        self.add_folder_btn.clicked.connect(self.add_folder)
+        file_buttons_layout.addWidget(self.add_folder_btn)
+        
+        self.remove_btn = QPushButton("Remove")
+        self.remove_btn.clicked.connect(self.remove_selected_video)
+        file_buttons_layout.addWidget(self.remove_btn)
+        
         self.clear_btn = QPushButton("Clear All")
         self.clear_btn.clicked.connect(self.clear_videos)
         file_buttons_layout.addWidget(self.clear_btn)
         
         file_layout.addLayout(file_buttons_layout)
         
-        # File list
-        self.file_list = QListWidget()
-        self.file_list.currentRowChanged.connect(self.on_file_select)
+        # Filter the list by name
+        self.filter_input = QLineEdit()
+        self.filter_input.setPlaceholderText("Filter by name...")
+        self.filter_input.setClearButtonEnabled(True)
+        self.filter_input.textChanged.connect(self.file_proxy.setFilterFixedString)
+        file_layout.addWidget(self.filter_input)
+        
+        # File list: a sortable table view over the file model (only visible rows are rendered)
+        self.file_list = QTableView()
+        self.file_list.setModel(self.file_proxy)
+        self.file_list.setSortingEnabled(True)
+        self.file_list.sortByColumn(NAME, Qt.SortOrder.AscendingOrder)
+        self.file_list.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.file_list.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+        self.file_list.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.file_list.setWordWrap(False)
+        self.file_list.verticalHeader().hide()
+        self.file_list.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+        self.file_list.verticalHeader().setDefaultSectionSize(THUMBNAIL_ICON_SIZE.height() + 4)
+        self.file_list.setIconSize(THUMBNAIL_ICON_SIZE)
+        self.file_list.horizontalHeader().setSectionResizeMode(NAME, QHeaderView.ResizeMode.Stretch)
+        self.file_list.selectionModel().currentRowChanged.connect(self.on_file_select)
+        self.file_list.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
+        self.file_list.customContextMenuRequested.connect(self.show_file_menu)
         file_layout.addWidget(self.file_list)
         
         # Video properties section
@@ -127,6 +218,19 @@ class VideoConverter(QMainWindow):
         self.convert_btn.clicked.connect(self.convert_videos)
         convert_layout.addWidget(self.convert_btn)
         
+        # Batch controls (single files can be controlled from the file list's context menu)
+        batch_buttons_layout = QHBoxLayout()
+        self.pause_btn = QPushButton("Pause")
+        self.pause_btn.setEnabled(False)
+        self.pause_btn.clicked.connect(self.toggle_pause)
+        batch_buttons_layout.addWidget(self.pause_btn)
+        
+        self.cancel_btn = QPushButton("Cancel")
+        self.cancel_btn.setEnabled(False)
+        self.cancel_btn.clicked.connect(self.cancel_conversion)
+        batch_buttons_layout.addWidget(self.cancel_btn)
+        convert_layout.addLayout(batch_buttons_layout)
+        
         # Progress bar
         self.progress_bar = QProgressBar()
         self.progress_bar.setRange(0, 100)
@@ -141,6 +245,52 @@ class VideoConverter(QMainWindow):
         self.rotate_checkbox.setChecked(False)  # Default to checked
         options_layout.addWidget(self.rotate_checkbox)
         
+        # Fast rotation only sets the display matrix; burn-in re-encodes the rotated video
+        rotate_method_layout = QHBoxLayout()
+        rotate_method_layout.addWidget(QLabel("Rotation method:"))
+        self.rotate_method_combo = QComboBox()
+        self.rotate_method_combo.addItem("Burn-in (re-encode, works everywhere)", ROTATE_BURN)
+        self.rotate_method_combo.addItem("Fast (metadata only, remux speed)", ROTATE_FAST)
+        rotate_method_layout.addWidget(self.rotate_method_combo)
+        rotate_method_layout.addStretch()
+        options_layout.addLayout(rotate_method_layout)
+        
+        # Speed/quality trade-off for re-encoded video; "auto" benchmarks a sample of the batch
+        profile_layout = QHBoxLayout()
+        profile_layout.addWidget(QLabel("Encoding profile:"))
+        self.profile_combo = QComboBox()
+        for profile in PROFILES:
+            self.profile_combo.addItem(profile.label, profile.name)
+        self.profile_combo.addItem("Auto (fastest quality that keeps up with real time)", AUTO)
+        profile_layout.addWidget(self.profile_combo)
+        profile_layout.addStretch()
+        options_layout.addLayout(profile_layout)
+        
+        # Segmented mode: encode long rotated clips as parallel keyframe-aligned chunks
+        self.segmented_checkbox = QCheckBox("Split long rotations into parallel chunks")
+        self.segmented_checkbox.setChecked(False)
+        options_layout.addWidget(self.segmented_checkbox)
+        
+        # Spanned recordings (00000.MTS, 00001.MTS, ...) become one MP4 each
+        self.join_spanned_checkbox = QCheckBox("Join spanned clips into one video")
+        self.join_spanned_checkbox.setChecked(True)
+        options_layout.addWidget(self.join_spanned_checkbox)
+        
+        # Staging: copy the next files off a slow card to local disk while the current one converts
+        self.staging_checkbox = QCheckBox("Copy upcoming files to local disk first (slow cards)")
+        self.staging_checkbox.setChecked(False)
+        options_layout.addWidget(self.staging_checkbox)
+        
+        # Number of ffmpeg jobs to run at once (defaults to the core count)
+        jobs_layout = QHBoxLayout()
+        jobs_layout.addWidget(QLabel("Parallel jobs:"))
+        self.jobs_spinbox = QSpinBox()
+        self.jobs_spinbox.setRange(1, max(1, (os.cpu_count() or 1) * 2))
+        self.jobs_spinbox.setValue(os.cpu_count() or 1)
+        jobs_layout.addWidget(self.jobs_spinbox)
+        jobs_layout.addStretch()
+        options_layout.addLayout(jobs_layout)
+        
         convert_layout.addLayout(options_layout)
         
         # Status label
@@ -155,23 +305,21 @@ class VideoConverter(QMainWindow):
         preview_group = QGroupBox("Video Preview")
         preview_layout = QVBoxLayout(preview_group)
         
-        # Video player
-        self.video_widget = QVideoWidget()
-        self.video_widget.setMinimumHeight(300)
-        preview_layout.addWidget(self.video_widget)
-        
-        # Media player (PyQt6 has separate audio output)
-        # Create with larger buffer size to reduce crackling
-        self.media_player = QMediaPlayer()
-        
-        # Configure audio output with optimized settings
-        self.audio_output = QAudioOutput()
-        # Set a moderate volume to reduce potential distortion
-        self.audio_output.setVolume(0.7)
+        # Video player. QtMultimedia is only loaded (and the player built) for the first preview,
+        # since starting its backend is a large part of startup and many sessions only convert
+        self.video_container = QWidget()
+        self.video_container.setMinimumHeight(300)
+        self.video_layout = QVBoxLayout(self.video_container)
+        self.video_layout.setContentsMargins(0, 0, 0, 0)
+        preview_layout.addWidget(self.video_container)
+        self.media_player = None
+        self.audio_output = None
+        self.video_widget = None
         
-        # Connect components
-        self.media_player.setAudioOutput(self.audio_output)
-        self.media_player.setVideoOutput(self.video_widget)
+        # Filmstrip of keyframes spread over the clip, available without encoding a preview
+        self.filmstrip_label = QLabel()
+        self.filmstrip_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        preview_layout.addWidget(self.filmstrip_label)
         
         # Preview controls
         controls_layout = QHBoxLayout()
@@ -179,6 +327,28 @@ class VideoConverter(QMainWindow):
         self.preview_btn.clicked.connect(self.toggle_preview)
         controls_layout.addWidget(self.preview_btn)
         
+        # Trim points of the selected file; whole GOPs between them are copied, not re-encoded
+        self.trim_start_input = QLineEdit()
+        self.trim_start_input.setPlaceholderText("start")
+        self.trim_start_input.setMaximumWidth(90)
+        self.trim_start_input.editingFinished.connect(self.on_trim_edited)
+        self.trim_end_input = QLineEdit()
+        self.trim_end_input.setPlaceholderText("end")
+        self.trim_end_input.setMaximumWidth(90)
+        self.trim_end_input.editingFinished.connect(self.on_trim_edited)
+        set_in_btn = QPushButton("Set In")
+        set_in_btn.setToolTip("Start the output at the current preview position")
+        set_in_btn.clicked.connect(lambda: self.set_trim_point(self.trim_start_input))
+        set_out_btn = QPushButton("Set Out")
+        set_out_btn.setToolTip("End the output at the current preview position")
+        set_out_btn.clicked.connect(lambda: self.set_trim_point(self.trim_end_input))
+        controls_layout.addWidget(QLabel("In:"))
+        controls_layout.addWidget(self.trim_start_input)
+        controls_layout.addWidget(set_in_btn)
+        controls_layout.addWidget(QLabel("Out:"))
+        controls_layout.addWidget(self.trim_end_input)
+        controls_layout.addWidget(set_out_btn)
+        
         # Add spacer to push controls to the left
         controls_layout.addStretch()
         
@@ -198,34 +368,116 @@ class VideoConverter(QMainWindow):
         )
         
         if files:
-            # Add new files to the list (avoid duplicates)
-            for file in files:
-                if file not in self.video_files:
-                    self.video_files.append(file)
-                    filename = os.path.basename(file)
-                    self.file_list.addItem(filename)
-            
-            # Select the first file if none is selected
-            if not self.current_preview_file and self.video_files:
-                self.file_list.setCurrentRow(0)
+            self.import_paths(files)
+    
+    def add_folder(self):
+        """Open a folder dialog and add every clip below the chosen folder"""
+        folder = QFileDialog.getExistingDirectory(self, "Select Folder or Card", "")
+        if folder:
+            self.import_paths([folder])
+    
+    def import_paths(self, paths):
+        """Import files and folders in the background; results arrive in on_files_imported"""
+        self.statusBar().showMessage("Scanning for videos...")
+        self.importer.start(paths, self.file_model.paths())
+    
+    @pyqtSlot(object)
+    def on_files_imported(self, result):
+        """Add the clips found by an import to the list"""
+        # Add new files to the list (the model skips files that are already there)
+        new_files = self.file_model.add_files(result.files)
+        
+        # Start probing the new files in the background
+        self.prober.enqueue(new_files)
+        
+        message = f"Added {len(new_files)} video(s)"
+        if result.duplicates:
+            message += f", skipped {len(result.duplicates)} duplicate clip(s)"
+        if result.rejected:
+            message += f", ignored {len(result.rejected)} file(s) that are not videos"
+        self.statusBar().showMessage(message + ".")
+        
+        # Select the first file if none is selected
+        if not self.current_preview_file and self.file_proxy.rowCount() > 0:
+            self.file_list.setCurrentIndex(self.file_proxy.index(0, NAME))
+    
+    def remove_selected_video(self):
+        """Remove the selected video from the list"""
+        if self.current_preview_file:
+            self.file_model.remove_files([self.current_preview_file])
+            self.current_preview_file = None
+            self.stop_preview()
+            self.update_video_properties(None)
     
     def clear_videos(self):
         """Clear all selected videos"""
-        self.video_files = []
-        self.file_list.clear()
+        self.prober.clear()
+        self.thumbnail_loader.clear()
+        self.file_model.clear()
         self.current_preview_file = None
         self.stop_preview()
         self.update_video_properties(None)
     
-    def on_file_select(self, row):
+    def _path_at(self, row):
+        """Path of a row of the (sorted and filtered) view, or None"""
+        if 0 <= row < self.file_proxy.rowCount():
+            return self.file_proxy.index(row, NAME).data(PATH_ROLE)
+        return None
+    
+    def on_file_select(self, current, previous=None):
         """Handle file selection from the list"""
-        if row >= 0 and row < len(self.video_files):
-            self.current_preview_file = self.video_files[row]
+        path = self._path_at(current.row()) if current.isValid() else None
+        if path:
+            if path == self.current_preview_file:
+                return
+            self.current_preview_file = path
             self.stop_preview()
             self.update_video_properties(self.current_preview_file)
+            self.show_trim(path)
+            
+            # Prepare previews for the neighbors (in view order) so browsing the list feels instant
+            neighbors = [self._path_at(r) for r in (current.row() + 1, current.row() - 1)]
+            self.prefetcher.prefetch([p for p in neighbors if p])
         else:
             self.current_preview_file = None
             self.update_video_properties(None)
+            self.show_trim(None)
+    
+    def show_trim(self, path):
+        """Show the trim points of a file in the In/Out fields"""
+        start, end = self.trims.get(path, (0.0, 0.0))
+        self.trim_start_input.setText(format_time(start) if start else "")
+        self.trim_end_input.setText(format_time(end) if end else "")
+    
+    def set_trim_point(self, field):
+        """Set the In or Out field to the preview's current position"""
+        if self.current_preview_file is None:
+            return
+        if self.media_player is None:
+            self.statusBar().showMessage("Start the preview to set trim points at its position")
+            return
+        field.setText(format_time(self.media_player.position() / 1000))
+        self.on_trim_edited()
+    
+    def on_trim_edited(self):
+        """Store the trim points typed for the selected file"""
+        path = self.current_preview_file
+        if path is None:
+            return
+        try:
+            start = parse_time(self.trim_start_input.text()) if self.trim_start_input.text().strip() else 0.0
+            end = parse_time(self.trim_end_input.text()) if self.trim_end_input.text().strip() else 0.0
+            if end and end <= start:
+                raise ValueError("The Out point must come after the In point")
+        except ValueError as e:
+            # Keep the previous trim points
+            self.statusBar().showMessage(f"Invalid trim point: {str(e)}")
+        else:
+            if start or end:
+                self.trims[path] = (start, end)
+            else:
+                self.trims.pop(path, None)
+        self.show_trim(path)
     
     def update_video_properties(self, video_path):
         """Update the video properties display with information about the selected video"""
@@ -234,105 +486,85 @@ class VideoConverter(QMainWindow):
             self.resolution_label.setText("-")
             self.fps_label.setText("-")
             self.duration_label.setText("-")
+            self.filmstrip_label.clear()
             return
         
+        # Show the filmstrip if it has been extracted, otherwise extract it next
+        self._show_filmstrip(self.filmstrips.get(video_path))
+        if video_path not in self.filmstrips:
+            self.thumbnail_loader.prioritize(video_path)
+        
         try:
             # Get file size
-            file_size = os.path.getsize(video_path)
-            if file_size < 1024 * 1024:  # Less than 1MB
-                size_str = f"{file_size / 1024:.1f} KB"
-            else:  # MB or larger
-                size_str = f"{file_size / (1024 * 1024):.2f} MB"
-            self.file_size_label.setText(size_str)
-            
-            # Use ffprobe to get video properties
-            # Get duration
-            duration_cmd = [
-                "ffprobe", "-v", "error", "-show_entries", "format=duration",
-                "-of", "default=noprint_wrappers=1:nokey=1", video_path
-            ]
-            try:
-                duration = float(subprocess.check_output(duration_cmd, universal_newlines=True).strip())
-                minutes = int(duration // 60)
-                seconds = int(duration % 60)
-                self.duration_label.setText(f"{minutes}m {seconds}s")
-            except:
-                self.duration_label.setText("Unknown")
-            
-            # Get all video properties using ffprobe
-            self._get_video_properties(video_path)
-                
+            self.file_size_label.setText(format_size(os.path.getsize(video_path)))
         except Exception as e:
             # Reset properties on error
             self.file_size_label.setText("Error")
             self.resolution_label.setText("Error")
             self.fps_label.setText("Error")
             self.duration_label.setText("Error")
+            return
+        
+        # Use cached metadata if we have it, otherwise move the file to the front of the probe queue
+        metadata = self.metadata_cache.lookup(video_path)
+        if metadata:
+            self._show_metadata(metadata)
+        else:
+            self.resolution_label.setText("Loading...")
+            self.fps_label.setText("Loading...")
+            self.duration_label.setText("Loading...")
+            self.prober.prioritize(video_path)
     
-    def _get_video_properties(self, video_path):
-        """Get video properties using ffprobe"""
-        # Get resolution
-        try:
-            resolution_cmd = [
-                "ffprobe", "-v", "error", "-select_streams", "v:0",
-                "-show_entries", "stream=width,height",
-                "-of", "default=noprint_wrappers=1:nokey=1", video_path
-            ]
-            output = subprocess.check_output(resolution_cmd, universal_newlines=True).strip()
-            lines = output.split('\n')
-            if len(lines) >= 2:
-                width = int(lines[0])
-                height = int(lines[1])
-                self.resolution_label.setText(f"{width}x{height}")
-            else:
-                self.resolution_label.setText("Unknown")
-        except Exception as e:
-            print(f"Error getting resolution with ffprobe: {str(e)}")
+    def _show_metadata(self, metadata):
+        """Fill the properties panel from a probed metadata record"""
+        if metadata.width and metadata.height:
+            self.resolution_label.setText(f"{metadata.width}x{metadata.height}")
+        else:
             self.resolution_label.setText("Unknown")
         
-        # Get FPS
-        try:
-            fps_cmd = [
-                "ffprobe", "-v", "error", "-select_streams", "v:0",
-                "-show_entries", "stream=r_frame_rate",
-                "-of", "default=noprint_wrappers=1:nokey=1", video_path
-            ]
-            fps_output = subprocess.check_output(fps_cmd, universal_newlines=True).strip()
-            print(f"Raw FPS output: {fps_output}")
-            
-            # Handle multiple lines in output (some videos have multiple frame rates)
-            fps_lines = fps_output.strip().split('\n')
-            if fps_lines:
-                # Use the first frame rate if multiple are returned
-                fps_value = fps_lines[0]
-                
-                # Parse frame rate (which may be a fraction like "30000/1001")
-                if '/' in fps_value:
-                    try:
-                        num, den = fps_value.split('/')
-                        fps = float(num) / float(den)
-                        self.fps_label.setText(f"{fps:.2f}")
-                        # Store FPS in video properties dictionary
-                        if video_path not in self.video_properties:
-                            self.video_properties[video_path] = {}
-                        self.video_properties[video_path]['fps'] = fps
-                    except ValueError as e:
-                        print(f"Error parsing fraction: {e}")
-                        self.fps_label.setText("Unknown")
-                elif fps_value.replace('.', '', 1).isdigit():  # Check if it's a valid number
-                    fps = float(fps_value)
-                    self.fps_label.setText(f"{fps:.2f}")
-                    # Store FPS in video properties dictionary
-                    if video_path not in self.video_properties:
-                        self.video_properties[video_path] = {}
-                    self.video_properties[video_path]['fps'] = fps
-                else:
-                    self.fps_label.setText("Unknown")
-            else:
-                self.fps_label.setText("Unknown")
-        except Exception as e:
-            print(f"Error getting FPS with ffprobe: {str(e)}")
+        if metadata.fps > 0:
+            self.fps_label.setText(f"{metadata.fps:.2f}")
+        else:
+            self.fps_label.setText("Unknown")
+        
+        if metadata.duration > 0:
+            self.duration_label.setText(format_duration(metadata.duration))
+        else:
+            self.duration_label.setText("Unknown")
+    
+    def _show_filmstrip(self, filmstrip_path):
+        """Show a filmstrip image scaled to the properties panel (or clear it)"""
+        pixmap = QPixmap(filmstrip_path) if filmstrip_path else QPixmap()
+        if pixmap.isNull():
+            self.filmstrip_label.clear()
+        else:
+            self.filmstrip_label.setPixmap(pixmap.scaledToWidth(
+                max(self.filmstrip_label.width(), 160), Qt.TransformationMode.SmoothTransformation))
+    
+    @pyqtSlot(str, object, str)
+    def on_thumbnail_ready(self, video_path, icon, filmstrip_path):
+        """Show an extracted poster frame in the list (and the filmstrip if the file is selected)"""
+        self.filmstrips[video_path] = filmstrip_path
+        self.file_model.set_thumbnail(video_path, QPixmap.fromImage(icon))
+        if video_path == self.current_preview_file:
+            self._show_filmstrip(filmstrip_path)
+    
+    @pyqtSlot(str, object)
+    def on_metadata_ready(self, video_path, metadata):
+        """Show probe results as they arrive"""
+        self.file_model.update_metadata(video_path, metadata)
+        if video_path == self.current_preview_file:
+            self._show_metadata(metadata)
+    
+    @pyqtSlot(str, str)
+    def on_probe_failed(self, video_path, error):
+        """Handle a file that could not be probed"""
+        print(f"Error probing {video_path}: {error}")
+        self.file_model.set_status(video_path, "Unreadable")
+        if video_path == self.current_preview_file:
+            self.resolution_label.setText("Unknown")
             self.fps_label.setText("Unknown")
+            self.duration_label.setText("Unknown")
     
     def select_output_dir(self):
         """Open dialog to select output directory"""
@@ -351,85 +583,117 @@ class VideoConverter(QMainWindow):
         else:
             if self.current_preview_file:
                 self.start_preview()
-                self.preview_btn.setText("Stop Preview")
+                if self.preview_running:
+                    self.preview_btn.setText("Stop Preview")
+    
+    def ensure_media_player(self):
+        """Build the video widget, media player and audio output on first use"""
+        if self.media_player is not None:
+            return
+        from PyQt6.QtMultimedia import QMediaPlayer, QAudioOutput
+        from PyQt6.QtMultimediaWidgets import QVideoWidget
+        
+        self.video_widget = QVideoWidget()
+        self.video_layout.addWidget(self.video_widget)
+        
+        # Media player (PyQt6 has separate audio output)
+        self.media_player = QMediaPlayer()
+        
+        # Configure audio output with optimized settings
+        self.audio_output = QAudioOutput()
+        # Set a moderate volume to reduce potential distortion
+        self.audio_output.setVolume(0.7)
+        
+        # Connect components
+        self.media_player.setAudioOutput(self.audio_output)
+        self.media_player.setVideoOutput(self.video_widget)
+        self.media_player.mediaStatusChanged.connect(self.on_media_status_changed)
     
     def start_preview(self):
         """Start video preview"""
         if self.current_preview_file and not self.preview_running:
+            try:
+                self.ensure_media_player()
+            except ImportError as e:
+                # Converting works without a multimedia backend; only previews need one
+                print(f"Error loading QtMultimedia: {str(e)}")
+                self.status_label.setText("Preview not available")
+                return
             self.preview_running = True
             self.status_label.setText("Preparing preview...")
             
-            # For MTS files, create a temporary preview file with optimized audio
+            # For MTS files, play a cached preview if there is one. Otherwise stream a fragmented
+            # MP4 from ffmpeg straight into the player (playback starts on the first fragment)
+            # and keep a copy in the preview cache for next time.
             if self.current_preview_file.lower().endswith('.mts'):
-                try:
-                    # Create a temporary file for the preview
-                    import tempfile
-                    fd, temp_preview_file = tempfile.mkstemp(suffix='.mp4')
-                    os.close(fd)
-                    
-                    # Convert a small portion with optimized audio settings
-                    cmd = [
-                        "ffmpeg", "-i", self.current_preview_file,
-                        "-t", "30",  # First 30 seconds for preview
-                        "-c:v", "libx264", "-preset", "ultrafast",
-                        "-c:a", "aac", "-b:a", "192k",  # Higher audio bitrate
-                        "-ar", "48000",  # Standard audio sample rate
-                        "-y", temp_preview_file
-                    ]
+                cached_preview = self.preview_cache.get(self.current_preview_file)
+                if cached_preview:
+                    self.media_player.setSource(QUrl.fromLocalFile(cached_preview))
+                    self.media_player.play()
+                    return
                 
-                    # Run the conversion process
-                    process = subprocess.Popen(
-                        cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+                try:
+                    metadata = self.metadata_cache.lookup(self.current_preview_file)
+                    cmd = build_preview_command(self.current_preview_file, metadata)
+                    temp_path = self.preview_cache.new_temp_path(self.current_preview_file)
+                    self.preview_device = StreamingPreviewDevice(
+                        cmd, self, tee_path=temp_path,
+                        on_finished=lambda ok: self._store_streamed_preview(temp_path, ok)
                     )
-                    
-                    # Wait for the process to complete
-                    process.communicate()
-                    
-                    if process.returncode == 0:
-                        # Use the temporary file for preview
-                        self.temp_preview_file = temp_preview_file
-                        preview_file = temp_preview_file
-                    else:
-                        # If conversion fails, use the original file
-                        self.temp_preview_file = None
-                        preview_file = self.current_preview_file
+                    self.media_player.setSourceDevice(self.preview_device, QUrl("preview.mp4"))
+                    self.media_player.play()
+                    return
                 except Exception as e:
                     # If there's an error, fall back to the original file
-                    self.temp_preview_file = None
-                    preview_file = self.current_preview_file
+                    self._close_preview_device()
                     print(f"Preview preparation error: {str(e)}")
-            else:
-                # For non-MTS files, use the original file
-                self.temp_preview_file = None
-                preview_file = self.current_preview_file
-                
-            # Start playing the video
-            self.media_player.setSource(QUrl.fromLocalFile(preview_file))
-            self.status_label.setText("Ready")
+            
+            # For non-MTS files (or if streaming failed), use the original file
+            self.media_player.setSource(QUrl.fromLocalFile(self.current_preview_file))
             self.media_player.play()
     
+    def on_media_status_changed(self, status):
+        """Clear the "Preparing preview..." status once the first frames are ready"""
+        from PyQt6.QtMultimedia import QMediaPlayer  # Already loaded by ensure_media_player()
+        
+        if status in (QMediaPlayer.MediaStatus.LoadedMedia, QMediaPlayer.MediaStatus.BufferedMedia):
+            if self.status_label.text() == "Preparing preview...":
+                self.status_label.setText("Ready")
+        elif status == QMediaPlayer.MediaStatus.InvalidMedia and self.preview_running:
+            self.status_label.setText("Preview not available")
+    
+    def _store_streamed_preview(self, temp_path, ok):
+        """Keep a fully streamed preview in the cache (called from the reader thread)"""
+        if ok:
+            self.preview_cache.commit(temp_path)
+        else:
+            self.preview_cache.discard(temp_path)
+    
+    def _close_preview_device(self):
+        """Stop the ffmpeg process feeding the streaming preview, if any"""
+        if self.preview_device is not None:
+            self.preview_device.close()
+            self.preview_device.deleteLater()
+            self.preview_device = None
+    
     def stop_preview(self):
         """Stop the video preview"""
         if self.preview_running:
             self.preview_running = False
             self.media_player.stop()
-            
-            # Clean up temporary preview file if it exists
-            if hasattr(self, 'temp_preview_file') and self.temp_preview_file and os.path.exists(self.temp_preview_file):
-                try:
-                    os.unlink(self.temp_preview_file)
-                    self.temp_preview_file = None
-                except Exception as e:
-                    print(f"Error removing temporary file: {str(e)}")
+            self.media_player.setSource(QUrl())
+            self._close_preview_device()
     
     def convert_videos(self):
         """Convert selected MTS videos to MP4 format"""
-        if not self.video_files:
+        video_files = self.file_model.paths()
+        if not video_files:
             self.statusBar().showMessage("Please select at least one video to convert.")
             return
         
         # Get rotation setting
         rotate_video = self.rotate_checkbox.isChecked()
+        segments = (os.cpu_count() or 1) if self.segmented_checkbox.isChecked() else 0
         
         output_dir = self.output_dir_input.text()
         if not os.path.exists(output_dir):
@@ -439,21 +703,128 @@ class VideoConverter(QMainWindow):
                 self.statusBar().showMessage(f"Could not create output directory: {str(e)}")
                 return
         
-        # Stop any preview that might be running
+        # Stop any preview that might be running, and leave the CPU to the conversion
         self.stop_preview()
+        self.prefetcher.clear()
+        
+        # Queue one job per file (or per spanned sequence); worker processes do the actual conversion.
+        # Spanned clips are detected from cached probe results only, so the GUI never waits on
+        # ffprobe here; clips that have not been probed yet are converted on their own.
+        options = ConversionOptions(rotate=rotate_video, rotate_method=self.rotate_method_combo.currentData(),
+                                    segments=segments, profile=self.profile_combo.currentData())
+        metadata = {f: self.metadata_cache.lookup(f) for f in video_files}
+        jobs = plan_jobs(video_files, output_dir, metadata, self.join_spanned_checkbox.isChecked())
+        batch = uuid.uuid4().hex
+        queued = []
+        for job in jobs:
+            try:
+                start, end = job_trim(job, self.trims)
+            except ValueError as e:
+                self.statusBar().showMessage(f"Invalid trim points: {str(e)}")
+                return
+            queued.append((job, replace(options, trim_start=start, trim_end=end)))
+        self.job_queue.enqueue_many(queued, batch)
         
-        # Start conversion in a separate thread
         self.convert_btn.setEnabled(False)
         self.progress_bar.setValue(0)
         self.status_label.setText("Converting...")
+        self.watch_batches([batch])
+    
+    def resume_unfinished_batches(self):
+        """Watch (and restart workers for) batches that were still running when the app last closed"""
+        batches = self.job_queue.unfinished_batches()
+        if batches:
+            self.convert_btn.setEnabled(False)
+            self.status_label.setText("Resuming unfinished conversions...")
+            self.watch_batches(batches)
+    
+    def watch_batches(self, batches):
+        """Start worker processes and follow the progress of the given batches"""
+        self.queue_monitor = QueueMonitor(self.job_queue, batches, self.metadata_cache,
+                                          worker_count=self.jobs_spinbox.value(),
+                                          stage_ahead=STAGE_AHEAD if self.staging_checkbox.isChecked() else 0,
+                                          parent=self)
+        self.queue_monitor.progress_update.connect(self.update_progress)
+        self.queue_monitor.status_update.connect(self.update_status)
+        self.queue_monitor.conversion_complete.connect(self.conversion_completed)
+        self.queue_monitor.conversion_error.connect(self.conversion_error)
+        self.queue_monitor.job_updated.connect(self.file_model.set_job_state)
+        self.queue_monitor.start()
+        # Batches resumed from an earlier session may have been left paused
+        self.paused = any(job["control"] == PAUSE for batch in batches for job in self.job_queue.jobs(batch)
+                          if job["state"] not in FINISHED_STATES)
+        self.pause_btn.setText("Resume" if self.paused else "Pause")
+        self.pause_btn.setEnabled(True)
+        self.cancel_btn.setEnabled(True)
+    
+    def toggle_pause(self):
+        """Pause or resume every unfinished job of the running batches"""
+        if not self.queue_monitor:
+            return
+        self.paused = not self.paused
+        for batch in self.queue_monitor.batches:
+            if self.paused:
+                self.job_queue.pause(batch=batch)
+            else:
+                self.job_queue.resume(batch=batch)
+        self.pause_btn.setText("Resume" if self.paused else "Pause")
+        self.queue_monitor.poll()
+    
+    def cancel_conversion(self):
+        """Cancel every unfinished job of the running batches"""
+        if not self.queue_monitor:
+            return
+        for batch in self.queue_monitor.batches:
+            self.job_queue.cancel(batch=batch)
+        self.status_label.setText("Cancelling...")
+        self.queue_monitor.poll()
+    
+    def show_file_menu(self, position):
+        """Context menu with the conversion controls of one file"""
+        index = self.file_list.indexAt(position)
+        path = self._path_at(index.row()) if index.isValid() else None
+        job = self.queue_monitor.job_for(path) if self.queue_monitor and path else None
+        if job is None or job["state"] in FINISHED_STATES:
+            return
         
-        # Create and start the conversion thread
-        self.conversion_thread = ConversionThread(self.video_files, output_dir, self.video_properties, rotate_video)
-        self.conversion_thread.progress_update.connect(self.update_progress)
-        self.conversion_thread.status_update.connect(self.update_status)
-        self.conversion_thread.conversion_complete.connect(self.conversion_completed)
-        self.conversion_thread.conversion_error.connect(self.conversion_error)
-        self.conversion_thread.start()
+        menu = QMenu(self)
+        if job["state"] == PENDING:
+            menu.addAction("Convert Next", lambda: self.job_queue.prioritize([job["id"]]))
+        if job["control"] == PAUSE:
+            menu.addAction("Resume", lambda: self.job_queue.resume([job["id"]]))
+        else:
+            menu.addAction("Pause", lambda: self.job_queue.pause([job["id"]]))
+        menu.addAction("Cancel", lambda: self.job_queue.cancel([job["id"]]))
+        menu.exec(self.file_list.viewport().mapToGlobal(position))
+        self.queue_monitor.poll()
+    
+    def paintEvent(self, event):
+        """Record the first paint of the window (see startup.py)"""
+        super().paintEvent(event)
+        if self.startup and "first_paint" not in self.startup.marks:
+            self.startup.mark("first_paint")
+            # Runs once the events queued up during startup have been handled
+            QTimer.singleShot(0, self.on_startup_interactive)
+    
+    def on_startup_interactive(self):
+        """Record that the window handles input, and log this launch's startup timings"""
+        self.startup.mark("interactive")
+        self.startup.save()
+        if exit_after_startup():
+            print(json.dumps(self.startup.record()), flush=True)
+            self.close()
+    
+    def closeEvent(self, event):
+        """Persist the metadata cache when the window closes"""
+        self.stop_preview()
+        self.prober.stop()
+        self.thumbnail_loader.stop()
+        self.prefetcher.stop()
+        if self.queue_monitor:
+            # Workers keep converting in the background; the queue is picked up again on the next start
+            self.queue_monitor.stop()
+        self.metadata_cache.save()
+        super().closeEvent(event)
     
     @pyqtSlot(int)
     def update_progress(self, progress):
@@ -469,8 +840,19 @@ class VideoConverter(QMainWindow):
     def conversion_completed(self):
         """Handle conversion completion"""
         self.convert_btn.setEnabled(True)
+        self.pause_btn.setEnabled(False)
+        self.cancel_btn.setEnabled(False)
         self.status_label.setText("Conversion completed")
-        self.statusBar().showMessage("All videos have been converted successfully.")
+        if self.queue_monitor and self.queue_monitor.cancelled:
+            self.statusBar().showMessage(f"Conversion stopped, {self.queue_monitor.cancelled} file(s) cancelled.")
+        elif self.queue_monitor and self.queue_monitor.failed:
+            self.statusBar().showMessage(f"Conversion finished with {self.queue_monitor.failed} failed file(s).")
+        elif self.queue_monitor and self.queue_monitor.skipped:
+            self.statusBar().showMessage(
+                f"All videos are converted ({self.queue_monitor.skipped} were already up to date and skipped)."
+            )
+        else:
+            self.statusBar().showMessage("All videos have been converted successfully.")
     
     @pyqtSlot(str, str)
     def conversion_error(self, filename, error):
@@ -478,161 +860,404 @@ class VideoConverter(QMainWindow):
         self.statusBar().showMessage(f"Error converting {filename}: {error}")
 
 
-class ConversionThread(QThread):
-    """Thread for handling video conversion"""
+class StreamingPreviewDevice(QIODevice):
+    """Read-only, sequential QIODevice fed from the stdout of an ffmpeg process
+
+    A reader thread appends ffmpeg's output to an in-memory buffer. QMediaPlayer
+    reads from the buffer through setSourceDevice() and can start playback as
+    soon as the first fragment arrives. Reads from the media backend's own
+    threads wait for more data instead of reporting a premature end of stream.
+    
+    If tee_path is given, the stream is also written to that file, and
+    on_finished(ok) is called from the reader thread once ffmpeg exits.
+    ffmpeg is stopped if it produces no output for STALL_TIMEOUT seconds.
+    """
+    # How long a background read may wait for ffmpeg before giving up
+    READ_TIMEOUT = 10.0
+    STALL_TIMEOUT = 30.0
+    
+    _data_arrived = pyqtSignal()
+    
+    def __init__(self, cmd, parent=None, tee_path=None, on_finished=None):
+        super().__init__(parent)
+        self._buffer = bytearray()
+        self._condition = threading.Condition()
+        self._finished = False
+        self._closing = False
+        self.tee_path = tee_path
+        self.on_finished = on_finished
+        self._tee_file = None
+        
+        # readyRead must be emitted on the device's thread, so hop over with a queued signal
+        self._data_arrived.connect(self.readyRead)
+        
+        self.supervisor = ProcessSupervisor(cmd, on_data=self._on_data, stall_timeout=self.STALL_TIMEOUT).start()
+        self.open(QIODevice.OpenModeFlag.ReadOnly | QIODevice.OpenModeFlag.Unbuffered)
+        
+        self._reader = threading.Thread(target=self._read_output, daemon=True)
+        self._reader.start()
+    
+    def _on_data(self, chunk):
+        """Move a chunk of ffmpeg's output into the buffer (called on the reader thread)"""
+        with self._condition:
+            self._buffer.extend(chunk)
+            self._condition.notify_all()
+        self._data_arrived.emit()
+        if self._tee_file:
+            self._tee_file.write(chunk)
+    
+    def _read_output(self):
+        """Reader thread: pump ffmpeg's output until it exits"""
+        ok = False
+        try:
+            if self.tee_path:
+                self._tee_file = open(self.tee_path, "wb")
+            ok = self.supervisor.wait() == 0 and not self._closing
+            if self.supervisor.returncode != 0 and not self._closing:
+                print(f"Preview stream error: {self.supervisor.stderr_tail.strip()}")
+        except (OSError, ValueError, SupervisorError) as e:
+            if not self._closing:
+                print(f"Preview stream error: {str(e)}")
+        finally:
+            if self._tee_file:
+                self._tee_file.close()
+            with self._condition:
+                self._finished = True
+                self._condition.notify_all()
+            try:
+                self._data_arrived.emit()
+            except RuntimeError:
+                pass  # The device was already deleted
+            if self.on_finished:
+                self.on_finished(ok)
+    
+    def isSequential(self):
+        return True
+    
+    def bytesAvailable(self):
+        with self._condition:
+            return len(self._buffer) + super().bytesAvailable()
+    
+    def atEnd(self):
+        with self._condition:
+            return self._finished and not self._buffer
+    
+    def waitForReadyRead(self, msecs):
+        timeout = None if msecs < 0 else msecs / 1000
+        with self._condition:
+            self._condition.wait_for(lambda: self._buffer or self._finished, timeout)
+            return bool(self._buffer)
+    
+    def readData(self, maxlen):
+        with self._condition:
+            # Never block the GUI thread; the media backend's threads may wait for ffmpeg
+            if not self._buffer and threading.current_thread() is not threading.main_thread():
+                self._condition.wait_for(lambda: self._buffer or self._finished, self.READ_TIMEOUT)
+            data = bytes(self._buffer[:maxlen])
+            del self._buffer[:maxlen]
+            return data
+    
+    def writeData(self, data):
+        return -1
+    
+    def close(self):
+        """Stop ffmpeg and release the buffer"""
+        self._closing = self.supervisor.returncode is None or self._closing
+        self.supervisor.kill()
+        self._reader.join(timeout=2)
+        with self._condition:
+            self._buffer.clear()
+            self._finished = True
+            self._condition.notify_all()
+        super().close()
+
+
+class FileImporter(QObject):
+    """Runs ingest.collect_files on a background thread, so scanning a card never blocks the UI
+
+    Imports run one at a time.
+    """
+    imported = pyqtSignal(object)
+    
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+    
+    def start(self, paths, known):
+        threading.Thread(target=self._run, args=(list(paths), list(known)), daemon=True).start()
+    
+    def _run(self, paths, known):
+        with self._lock:
+            try:
+                result = collect_files(paths, known)
+            except Exception as e:
+                print(f"Error importing files: {str(e)}")
+                return
+            self.imported.emit(result)
+
+
+class BackgroundPool(QObject):
+    """Runs process(path) for queued files on a bounded pool of background threads
+
+    Files are processed in the order they were queued, except that prioritize()
+    moves a file to the front (used for the file the user just selected).
+    Subclasses deliver results through signals, so the GUI thread never waits.
+    """
+    
+    def __init__(self, max_workers):
+        super().__init__()
+        self.max_workers = max(1, max_workers)
+        
+        self._queue = deque()
+        self._queued = set()
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._workers = []
+    
+    def _ensure_workers(self):
+        """Start the worker threads on first use"""
+        while len(self._workers) < self.max_workers:
+            worker = threading.Thread(target=self._work, daemon=True)
+            worker.start()
+            self._workers.append(worker)
+    
+    def enqueue(self, video_paths):
+        """Queue files at normal priority"""
+        with self._condition:
+            for video_path in video_paths:
+                if video_path not in self._queued:
+                    self._queued.add(video_path)
+                    self._queue.append(video_path)
+            self._ensure_workers()
+            self._condition.notify_all()
+    
+    def prioritize(self, video_path):
+        """Move a file to the front of the queue (queueing it if needed)"""
+        with self._condition:
+            if video_path in self._queued:
+                try:
+                    self._queue.remove(video_path)
+                except ValueError:
+                    pass
+            self._queued.add(video_path)
+            self._queue.appendleft(video_path)
+            self._ensure_workers()
+            self._condition.notify()
+    
+    def clear(self):
+        """Drop every file that has not started yet"""
+        with self._condition:
+            self._queue.clear()
+            self._queued.clear()
+    
+    def stop(self):
+        """Stop the workers once their current file is done"""
+        with self._condition:
+            self._stopped = True
+            self._queue.clear()
+            self._condition.notify_all()
+    
+    def _work(self):
+        """Worker thread loop"""
+        while True:
+            with self._condition:
+                while not self._queue and not self._stopped:
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                video_path = self._queue.popleft()
+            
+            try:
+                self.process(video_path)
+            finally:
+                with self._condition:
+                    self._queued.discard(video_path)
+    
+    def process(self, video_path):
+        raise NotImplementedError
+
+
+class MetadataProber(BackgroundPool):
+    """Probes files in the background; the GUI thread never waits on ffprobe"""
+    metadata_ready = pyqtSignal(str, object)
+    probe_failed = pyqtSignal(str, str)
+    
+    def __init__(self, metadata_cache, max_workers=None):
+        # ffprobe is mostly I/O bound, but slow cards don't like too many readers at once
+        super().__init__(max_workers or min(4, os.cpu_count() or 1))
+        self.metadata_cache = metadata_cache
+    
+    def process(self, video_path):
+        try:
+            metadata = self.metadata_cache.get(video_path)
+        except Exception as e:
+            self.probe_failed.emit(video_path, str(e))
+        else:
+            self.metadata_ready.emit(video_path, metadata)
+
+
+class ThumbnailLoader(BackgroundPool):
+    """Extracts poster frames and filmstrips in the background
+
+    thumbnail_ready(path, icon, filmstrip_path) carries the poster already
+    scaled to the file list's icon size, as a QImage (QPixmap must be made
+    on the GUI thread).
+    """
+    thumbnail_ready = pyqtSignal(str, object, str)
+    
+    def __init__(self, thumbnail_cache, metadata_cache, icon_size, max_workers=2):
+        super().__init__(max_workers)
+        self.thumbnail_cache = thumbnail_cache
+        self.metadata_cache = metadata_cache
+        self.icon_size = icon_size
+    
+    def process(self, video_path):
+        try:
+            paths = self.thumbnail_cache.get(video_path)
+            if paths is None:
+                # The filmstrip is spread over the clip, so it needs the duration
+                paths = self.thumbnail_cache.generate(video_path, self.metadata_cache.get(video_path).duration)
+        except Exception as e:
+            print(f"Error extracting thumbnails for {video_path}: {str(e)}")
+            return
+        if paths:
+            poster, filmstrip = paths
+            icon = QImage(poster).scaled(self.icon_size, Qt.AspectRatioMode.KeepAspectRatio,
+                                         Qt.TransformationMode.SmoothTransformation)
+            self.thumbnail_ready.emit(video_path, icon, filmstrip)
+
+
+class QueueMonitor(QObject):
+    """Runs worker processes for queued batches and relays their progress as signals
+
+    The conversion itself happens in "python -m jobqueue work" processes, so it
+    survives the GUI being closed; this object only polls the job queue.
+    """
     progress_update = pyqtSignal(int)
     status_update = pyqtSignal(str)
     conversion_complete = pyqtSignal()
     conversion_error = pyqtSignal(str, str)
+    job_updated = pyqtSignal(str, str, float)  # input path, job state, progress
     
-    def __init__(self, video_files, output_dir, video_properties=None, rotate_video=True):
-        super().__init__()
-        self.video_files = video_files
-        self.output_dir = output_dir
-        self.video_properties = video_properties or {}
-        self.rotate_video = rotate_video
+    POLL_INTERVAL_MS = 500
     
-    def run(self):
-        """Run the conversion process"""
-        total_files = len(self.video_files)
-        completed = 0
+    def __init__(self, job_queue, batches, metadata_cache=None, worker_count=1, stage_ahead=0, parent=None):
+        super().__init__(parent)
+        self.job_queue = job_queue
+        self.batches = list(batches)
+        self.metadata_cache = metadata_cache
+        self.worker_count = max(1, worker_count)
+        self.stage_ahead = stage_ahead
+        self.workers = []
+        self.failed = 0
+        self.skipped = 0
+        self.cancelled = 0
+        self._reported_failures = set()
+        self._job_states = {}
+        self._jobs_by_path = {}
+        self._weights = {}  # job id -> weight
         
-        for input_file in self.video_files:
-            try:
-                # Update status
-                filename = os.path.basename(input_file)
-                self.status_update.emit(f"Converting {filename}...")
-                
-                # Create output filename
-                output_name = os.path.splitext(filename)[0] + ".mp4"
-                output_path = os.path.join(self.output_dir, output_name)
-                
-                # Get video duration for progress calculation
-                probe_cmd = [
-                    "ffprobe", "-v", "error", "-show_entries", "format=duration",
-                    "-of", "default=noprint_wrappers=1:nokey=1", input_file
-                ]
-                
-                try:
-                    duration = float(subprocess.check_output(probe_cmd, universal_newlines=True).strip())
-                except:
-                    duration = 0  # If we can't get duration, we'll use file-based progress
-                
-                # Run ffmpeg conversion with progress monitoring
-                # Check if we have stored FPS for this file
-                fps = 0
-                if input_file in self.video_properties and 'fps' in self.video_properties[input_file]:
-                    fps = self.video_properties[input_file]['fps']
-                    self.status_update.emit(f"Using stored FPS: {fps:.2f} for {filename}")
-                
-                # If no stored FPS, get it using ffprobe
-                if fps <= 0:
-                    fps_cmd = [
-                        "ffprobe", "-v", "error", "-select_streams", "v:0",
-                        "-show_entries", "stream=r_frame_rate", "-of", "default=noprint_wrappers=1:nokey=1",
-                        input_file
-                    ]
-                    
-                    try:
-                        fps_output = subprocess.check_output(fps_cmd, universal_newlines=True).strip()
-                        # r_frame_rate is returned as a fraction (e.g., "30000/1001")
-                        fps_parts = fps_output.split('/')
-                        if len(fps_parts) == 2:
-                            fps = float(fps_parts[0]) / float(fps_parts[1])
-                        else:
-                            fps = float(fps_output)
-                        self.status_update.emit(f"Detected FPS: {fps:.2f} for {filename}")
-                    except:
-                        fps = 0  # If we can't get FPS, ffmpeg will use the source FPS by default
-                
-                # Run ffmpeg conversion with progress monitoring
-                cmd = [
-                    "ffmpeg", "-i", input_file
-                ]
-                
-                # If rotation is enabled, we need to re-encode the video
-                if self.rotate_video:
-                    # Use high-quality encoding settings with rotation
-                    cmd.extend([
-                        "-c:v", "libx264", "-preset", "slow", "-crf", "18",  # Higher quality encoding
-                        "-c:a", "aac", "-b:a", "192k",  # Better audio quality
-                        # Rotate 90 degrees counterclockwise and change aspect ratio from 16:9 to 9:16
-                        "-vf", "transpose=2",
-                        "-aspect", "9:16"
-                    ])
-                else:
-                    # If no rotation, use -vcodec copy to preserve original quality
-                    # Use -ss 0.04 to skip the first frame (approximately)
-                    cmd.extend([
-                        "-vcodec", "copy",  # Copy video stream without re-encoding
-                        "-c:a", "aac", "-b:a", "192k"  # Convert audio to AAC for compatibility
-                    ])
-                
-                
-                # Add FPS parameter if we successfully retrieved it
-                if fps > 0:
-                    cmd.extend(["-r", str(fps)])
-                
-                # Add progress and output parameters
-                cmd.extend([
-                    "-progress", "pipe:1",  # Output progress to stdout
-                    "-y", output_path
-                ])
-                
-                process = subprocess.Popen(
-                    cmd, 
-                    stdout=subprocess.PIPE, 
-                    stderr=subprocess.PIPE,
-                    universal_newlines=True,
-                    bufsize=1  # Line buffered
-                )
-                
-                # Monitor the conversion progress
-                current_time = 0
-                file_progress = 0
-                
-                while process.poll() is None:
-                    output_line = process.stdout.readline().strip()
-                    
-                    if output_line.startswith("out_time_ms="):
-                        try:
-                            # Extract time in milliseconds
-                            time_ms = int(output_line.split("=")[1])
-                            current_time = time_ms / 1000000  # Convert to seconds
-                            
-                            if duration > 0:
-                                # Calculate progress based on video duration
-                                file_progress = min(100, (current_time / duration) * 100)
-                                
-                                # Calculate overall progress
-                                overall_progress = int(((completed / total_files) * 100) + (file_progress / total_files))
-                                self.progress_update.emit(overall_progress)
-                                
-                                # Update status with percentage
-                                status_text = f"Converting {filename}... {file_progress:.1f}%"
-                                self.status_update.emit(status_text)
-                        except:
-                            pass
-                
-                # Get the final output
-                stdout, stderr = process.communicate()
-                
-                if process.returncode != 0:
-                    self.conversion_error.emit(filename, stderr)
-                
-                # Update progress
-                completed += 1
-                progress = int((completed / total_files) * 100)
-                self.progress_update.emit(progress)
-                
-            except Exception as e:
-                self.conversion_error.emit(filename, str(e))
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.poll)
+    
+    def start(self):
+        """Start the workers and begin polling"""
+        self.spawn_workers()
+        self.timer.start(self.POLL_INTERVAL_MS)
+        self.poll()
+    
+    def stop(self):
+        """Stop polling (running workers finish the queue on their own)"""
+        self.timer.stop()
+    
+    def spawn_workers(self):
+        """Make sure worker_count of our worker processes are alive"""
+        self.workers = [worker for worker in self.workers if worker.poll() is None]
+        # Workers run at batch priority, below the preview, and split the CPU cores between them
+        cmd = [sys.executable, "-m", "jobqueue", "--db", self.job_queue.db_path, "work", "--exit-when-idle",
+               "--threads", str(max(1, (os.cpu_count() or 1) // self.worker_count))]
+        if self.stage_ahead:
+            cmd += ["--stage-ahead", str(self.stage_ahead)]
+        for _ in range(self.worker_count - len(self.workers)):
+            self.workers.append(subprocess.Popen(cmd, cwd=APP_DIR, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL))
+    
+    def job_for(self, input_path):
+        """The latest job (as last polled) that converts a file, or None"""
+        return self._jobs_by_path.get(input_path)
+    
+    def _weight(self, job):
+        """Weight a job by its duration so long files count for more of the overall progress
+
+        The weight is stored with the job when it is queued; jobs queued by older
+        versions are weighted from the metadata cache, once.
+        """
+        weight = self._weights.get(job["id"])
+        if weight is None:
+            weight = job.get("weight")
+            if weight is None:
+                weight = 0.0
+                for input_path in json.loads(job["inputs"] or "null") or [job["input_path"]]:
+                    metadata = self.metadata_cache.lookup(input_path) if self.metadata_cache else None
+                    weight += metadata.duration if metadata and metadata.duration > 0 else 1.0
+            self._weights[job["id"]] = weight
+        return weight
+    
+    def poll(self):
+        """Read the batch state from the queue"""
+        jobs = []
+        for batch in self.batches:
+            jobs.extend(self.job_queue.jobs(batch))
+        if not jobs:
+            self.stop()
+            self.conversion_complete.emit()
+            return
+        
+        # Report the state of every input file whose job changed
+        for job in jobs:
+            state = (job["state"], job["progress"], job["control"])
+            shown_state = "paused" if job["control"] == PAUSE else job["state"]
+            for input_path in json.loads(job["inputs"] or "null") or [job["input_path"]]:
+                self._jobs_by_path[input_path] = job
+                if self._job_states.get(job["id"]) != state:
+                    self.job_updated.emit(input_path, shown_state, job["progress"])
+            self._job_states[job["id"]] = state
+        
+        # Report failures once each
+        for job in jobs:
+            if job["state"] == FAILED and job["id"] not in self._reported_failures:
+                self._reported_failures.add(job["id"])
+                self.failed += 1
+                self.conversion_error.emit(os.path.basename(job["input_path"]), job["error"] or "")
+        
+        # Combine the job progress, weighted by duration
+        weights = [self._weight(job) for job in jobs]
+        progress = [1.0 if job["state"] in FINISHED_STATES else job["progress"] for job in jobs]
+        overall_progress = int(sum(w * p for w, p in zip(weights, progress)) / sum(weights) * 100)
+        self.progress_update.emit(min(100, overall_progress))
+        
+        finished = sum(1 for job in jobs if job["state"] in FINISHED_STATES)
+        running = sum(1 for job in jobs if job["state"] == RUNNING)
+        paused = sum(1 for job in jobs if job["state"] in (PENDING, RUNNING) and job["control"] == PAUSE)
+        self.skipped = sum(1 for job in jobs if job["state"] == SKIPPED)
+        self.cancelled = sum(1 for job in jobs if job["state"] == CANCELLED)
+        status_text = f"Converting... {finished}/{len(jobs)} files done, {running} running, {overall_progress}%"
+        if paused:
+            status_text += f", {paused} paused"
+        if self.skipped:
+            status_text += f" ({self.skipped} already up to date)"
+        self.status_update.emit(status_text)
         
-        # Signal completion
-        self.conversion_complete.emit()
+        if finished == len(jobs):
+            self.stop()
+            self.conversion_complete.emit()
+        elif any(job["state"] == PENDING and job["control"] is None for job in jobs):
+            # Replace workers that exited (they stop when the queue looks empty or crash)
+            self.spawn_workers()
 
 
 if __name__ == "__main__":
+    startup = StartupTimer(STARTED)
+    startup.mark("imports")
     app = QApplication(sys.argv)
     
     # Set application font
@@ -640,7 +1265,8 @@ if __name__ == "__main__":
     font.setPointSize(12)
     app.setFont(font)
     
-    window = VideoConverter()
+    window = VideoConverter(startup)
+    startup.mark("window")
     window.show()
     
     sys.exit(app.exec())
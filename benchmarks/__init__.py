@@ -0,0 +1,7 @@
+"""Reproducible performance benchmarks
+
+Run from the repository directory:
+
+    python -m benchmarks run [-o results.json] [--quick]
+    python -m benchmarks compare OLD.json NEW.json
+"""
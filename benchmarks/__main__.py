@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""Command line entry point of the benchmark suite
+
+    python -m benchmarks run [-o results.json] [--quick] [--jobs 1 2 4] [--paths copy rotate]
+    python -m benchmarks compare OLD.json NEW.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+from benchmarks.media import generate_inputs
+from benchmarks.suite import (PATHS, environment, measure_startup, measure_probe, measure_first_preview,
+                              measure_throughput)
+from profiles import DEFAULT_PROFILE, PROFILES_BY_NAME
+
+RESULTS_VERSION = 1
+
+DEFAULT_RESOLUTIONS = ["1280x720", "1920x1080"]
+DEFAULT_DURATIONS = [10.0, 30.0]
+QUICK_RESOLUTIONS = ["1280x720"]
+QUICK_DURATIONS = [5.0]
+
+
+def default_concurrency():
+    cores = os.cpu_count() or 1
+    return sorted({1, 2, cores})
+
+
+def run(args):
+    resolutions = args.resolutions or (QUICK_RESOLUTIONS if args.quick else DEFAULT_RESOLUTIONS)
+    durations = args.durations or (QUICK_DURATIONS if args.quick else DEFAULT_DURATIONS)
+    concurrency = args.jobs or ([1, 2] if args.quick else default_concurrency())
+    repeats = args.repeats or (1 if args.quick else 3)
+
+    print("Measuring GUI startup", file=sys.stderr)
+    startup = measure_startup(repeats)
+    paths = generate_inputs(args.media_dir, resolutions, durations)
+    print("Measuring probe latency", file=sys.stderr)
+    probe = measure_probe(paths, repeats)
+    print("Measuring time to first preview fragment", file=sys.stderr)
+    first_preview = measure_first_preview(paths, repeats)
+    throughput = measure_throughput(paths, args.paths, concurrency, args.profile)
+
+    results = {
+        "version": RESULTS_VERSION,
+        "environment": environment(),
+        "config": {
+            "resolutions": resolutions, "durations": durations, "jobs": concurrency,
+            "repeats": repeats, "paths": args.paths, "profile": args.profile,
+        },
+        "startup": startup,
+        "probe": probe,
+        "first_preview": first_preview,
+        "throughput": throughput,
+    }
+    output = args.output or f"bench-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}", file=sys.stderr)
+    return 0
+
+
+def _metrics(results):
+    """Flatten a results file into {metric name: (value, higher is better)}"""
+    metrics = {}
+    for milestone, summary in (results.get("startup") or {}).items():
+        metrics[f"startup/{milestone} median ms"] = (summary["median_ms"], False)
+    for section in ("probe", "first_preview"):
+        for filename, measurements in results.get(section, {}).items():
+            for name, summary in measurements.items():
+                metrics[f"{section}/{filename}/{name} median ms"] = (summary["median_ms"], False)
+    for entry in results.get("throughput", []):
+        if entry.get("failed"):
+            continue  # Not comparable: some of its files failed
+        metrics[f"throughput/{entry['path']}/jobs={entry['jobs']} x realtime"] = (entry["realtime_factor"], True)
+    return metrics
+
+
+def compare(args):
+    """Print every metric of two results files side by side, flagging regressions"""
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+
+    if old.get("environment", {}).get("cpu_count") != new.get("environment", {}).get("cpu_count"):
+        print("Warning: the results come from machines with different CPU counts", file=sys.stderr)
+
+    old_metrics = _metrics(old)
+    regressions = 0
+    for name, (value, higher_is_better) in _metrics(new).items():
+        if name not in old_metrics or not old_metrics[name][0] or value is None:
+            continue
+        change = (value - old_metrics[name][0]) / old_metrics[name][0]
+        worse = -change if higher_is_better else change
+        flag = ""
+        if worse > args.threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(f"{name}: {old_metrics[name][0]} -> {value} ({change:+.1%}){flag}")
+    for entry in new.get("throughput", []):
+        if entry.get("failed"):
+            print(f"throughput/{entry['path']}/jobs={entry['jobs']}: {entry['failed']} of {entry['files']} "
+                  "files failed  FAILED")
+            regressions += 1
+    return 1 if regressions else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="VideoConverter performance benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="generate test inputs and measure")
+    run_parser.add_argument("-o", "--output", default=None, help="results file (default: bench-<time>.json)")
+    run_parser.add_argument("--media-dir", default=os.path.join(tempfile.gettempdir(), "videoconverter-bench-media"),
+                            help="where generated inputs are kept between runs")
+    run_parser.add_argument("--quick", action="store_true", help="one short 720p input, 1 and 2 jobs, one repeat")
+    run_parser.add_argument("--resolutions", nargs="+", default=None, help="input resolutions, e.g. 1920x1080")
+    run_parser.add_argument("--durations", nargs="+", type=float, default=None, help="input durations in seconds")
+    run_parser.add_argument("--jobs", nargs="+", type=int, default=None,
+                            help="concurrency levels (default: 1, 2 and the number of CPU cores)")
+    run_parser.add_argument("--repeats", type=int, default=0, help="repeats of the latency measurements")
+    run_parser.add_argument("--paths", nargs="+", choices=PATHS, default=list(PATHS),
+                            help="conversion paths to measure (default: all)")
+    run_parser.add_argument("--profile", choices=list(PROFILES_BY_NAME), default=DEFAULT_PROFILE,
+                            help="encoding profile of the rotate path")
+
+    compare_parser = commands.add_parser("compare", help="compare two results files")
+    compare_parser.add_argument("old")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument("--threshold", type=float, default=0.1,
+                                help="relative slowdown reported as a regression (default: 0.1)")
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        return run(args)
+    return compare(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
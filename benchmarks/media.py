@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""Synthetic AVCHD-like test inputs generated locally with ffmpeg's lavfi sources"""
+import os
+import sys
+import subprocess
+
+# H.264 with short GOPs and AC-3 audio in MPEG-TS, like camcorder recordings
+FRAME_RATE = "30000/1001"
+GOP_SIZE = 15
+
+
+def input_name(resolution, duration):
+    return f"testsrc-{resolution}-{duration:g}s.MTS"
+
+
+def generate_input(path, resolution, duration):
+    """Encode a testsrc2 pattern with a sine tone into an MPEG-TS file"""
+    tmp_path = path + ".tmp"
+    cmd = [
+        "ffmpeg", "-v", "error", "-nostdin",
+        "-f", "lavfi", "-i", f"testsrc2=size={resolution}:rate={FRAME_RATE}",
+        "-f", "lavfi", "-i", "sine=frequency=440:sample_rate=48000",
+        "-t", f"{duration:g}", "-map", "0:v", "-map", "1:a",
+        "-c:v", "libx264", "-preset", "veryfast", "-g", str(GOP_SIZE), "-pix_fmt", "yuv420p",
+        "-c:a", "ac3", "-b:a", "256k", "-ac", "2",
+        "-f", "mpegts", "-y", tmp_path
+    ]
+    subprocess.run(cmd, check=True)
+    os.replace(tmp_path, path)
+
+
+def generate_inputs(media_dir, resolutions, durations):
+    """Return the paths of every resolution/duration combination, generating missing files
+
+    Inputs are reused between runs, so repeated runs measure the same files.
+    """
+    os.makedirs(media_dir, exist_ok=True)
+    paths = []
+    for resolution in resolutions:
+        for duration in durations:
+            path = os.path.join(media_dir, input_name(resolution, duration))
+            if not os.path.exists(path):
+                print(f"Generating {path}", file=sys.stderr)
+                generate_input(path, resolution, duration)
+            paths.append(path)
+    return paths
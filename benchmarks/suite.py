@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""Benchmark measurements: GUI startup, probe latency, time to first preview fragment and conversion throughput"""
+import os
+import sys
+import json
+import time
+import shutil
+import struct
+import platform
+import statistics
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from probe import MetadataCache, probe_file
+from preview import build_preview_command, PREVIEW_DURATION
+from engine import BatchConverter, ConversionOptions, ROTATE_BURN, ROTATE_FAST
+from telemetry import TelemetryLog
+from startup import MILESTONES
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Conversion paths that can be measured
+PATHS = ("copy", "rotate", "fast-rotate", "preview")
+
+
+def _summary(samples):
+    """Median, min and max of a list of timings, in milliseconds"""
+    return {
+        "median_ms": round(statistics.median(samples) * 1000, 2),
+        "min_ms": round(min(samples) * 1000, 2),
+        "max_ms": round(max(samples) * 1000, 2),
+        "samples": len(samples),
+    }
+
+
+def environment():
+    """Describe the machine and versions, so only comparable results are compared"""
+    def first_line(cmd):
+        try:
+            return subprocess.run(cmd, capture_output=True, universal_newlines=True,
+                                  cwd=REPO_DIR).stdout.splitlines()[0]
+        except (OSError, IndexError):
+            return None
+
+    return {
+        "git_revision": first_line(["git", "rev-parse", "HEAD"]),
+        "ffmpeg": first_line(["ffmpeg", "-version"]),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": time.time(),
+    }
+
+
+def measure_startup(repeats):
+    """Cold-start milestones of the GUI (see startup.py), from fresh processes
+
+    The app runs offscreen (unless QT_QPA_PLATFORM says otherwise) with an
+    empty job queue, and quits as soon as it is interactive. Returns None if
+    the GUI cannot start here (for example without PyQt6).
+    """
+    work_dir = tempfile.mkdtemp(prefix="videoconverter-bench-")
+    env = dict(os.environ, VIDEOCONVERTER_EXIT_AFTER_STARTUP="1",
+               VIDEOCONVERTER_QUEUE_DB=os.path.join(work_dir, "jobs.sqlite3"),
+               VIDEOCONVERTER_STARTUP_LOG=os.path.join(work_dir, "startup.jsonl"))
+    env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    samples = {milestone: [] for milestone in MILESTONES}
+    try:
+        for _ in range(repeats):
+            result = subprocess.run([sys.executable, "app.py"], cwd=REPO_DIR, env=env, stdin=subprocess.DEVNULL,
+                                    capture_output=True, universal_newlines=True, timeout=120)
+            try:
+                record = json.loads(result.stdout.strip().splitlines()[-1])
+            except (ValueError, IndexError):
+                print(f"GUI startup could not be measured: {result.stderr.strip()[-500:]}", file=sys.stderr)
+                return None
+            for milestone in MILESTONES:
+                samples[milestone].append(record[f"{milestone}_ms"] / 1000)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return {milestone: _summary(values) for milestone, values in samples.items()}
+
+
+def measure_probe(paths, repeats):
+    """Latency of a cold ffprobe call and of a warm metadata cache lookup, per file"""
+    results = {}
+    cache = MetadataCache(os.path.join(tempfile.mkdtemp(prefix="videoconverter-bench-"), "metadata.json"))
+    try:
+        for path in paths:
+            cold = []
+            for _ in range(repeats):
+                started = time.perf_counter()
+                probe_file(path)
+                cold.append(time.perf_counter() - started)
+
+            cache.get(path)
+            warm = []
+            for _ in range(repeats):
+                started = time.perf_counter()
+                cache.lookup(path)
+                warm.append(time.perf_counter() - started)
+            results[os.path.basename(path)] = {"ffprobe": _summary(cold), "cache_lookup": _summary(warm)}
+    finally:
+        shutil.rmtree(os.path.dirname(cache.path), ignore_errors=True)
+    return results
+
+
+def _first_fragment_time(cmd):
+    """Run a streamed preview and return (first byte, first complete fragment) times in seconds
+
+    A fragment is playable once its moof box and the following mdat box have
+    both arrived, which is when the player can show the first frame.
+    """
+    started = time.perf_counter()
+    process = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    buffer = b""
+    first_byte = None
+    seen_moof = False
+    try:
+        while True:
+            chunk = process.stdout.read1(65536)
+            if not chunk:
+                return first_byte, None
+            if first_byte is None:
+                first_byte = time.perf_counter() - started
+            buffer += chunk
+
+            # Walk the complete top-level boxes received so far
+            while len(buffer) >= 8:
+                size, box_type = struct.unpack(">I4s", buffer[:8])
+                if size < 8 or len(buffer) < size:
+                    break
+                buffer = buffer[size:]
+                if box_type == b"moof":
+                    seen_moof = True
+                elif box_type == b"mdat" and seen_moof:
+                    return first_byte, time.perf_counter() - started
+    finally:
+        process.kill()
+        process.wait()
+
+
+def measure_first_preview(paths, repeats):
+    """Time from starting a preview until its first fragment can be played, per file"""
+    results = {}
+    for path in paths:
+        metadata = probe_file(path)
+        first_bytes, first_fragments = [], []
+        for _ in range(repeats):
+            first_byte, first_fragment = _first_fragment_time(build_preview_command(path, metadata))
+            if first_fragment is None:
+                raise RuntimeError(f"Preview of {path} produced no fragment")
+            first_bytes.append(first_byte)
+            first_fragments.append(first_fragment)
+        results[os.path.basename(path)] = {
+            "first_byte": _summary(first_bytes),
+            "first_fragment": _summary(first_fragments),
+        }
+    return results
+
+
+def _run_previews(paths, metadata, jobs, output_dir):
+    """Write complete previews of every file with `jobs` ffmpeg processes at once; returns the failures"""
+    def run(path):
+        output = os.path.join(output_dir, os.path.basename(path) + ".mp4")
+        result = subprocess.run(build_preview_command(path, metadata[path], output=output),
+                                stdin=subprocess.DEVNULL)
+        return result.returncode != 0
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        return sum(pool.map(run, paths))
+
+
+def _run_conversions(paths, options, output_dir, metadata_cache):
+    # Benchmark jobs stay out of the user's telemetry log
+    telemetry = TelemetryLog(os.path.join(output_dir, ".telemetry.jsonl"))
+    converter = BatchConverter(paths, output_dir, options, metadata_cache, join_spanned=False, telemetry=telemetry)
+    return len(converter.run())
+
+
+def measure_throughput(paths, conversion_paths, concurrency, profile):
+    """Wall time and media-seconds per second for each path at each concurrency level"""
+    work_dir = tempfile.mkdtemp(prefix="videoconverter-bench-")
+    metadata_cache = MetadataCache(os.path.join(work_dir, "metadata.json"))
+    metadata = {path: metadata_cache.get(path) for path in paths}
+    results = []
+    try:
+        for conversion_path in conversion_paths:
+            for jobs in concurrency:
+                output_dir = os.path.join(work_dir, f"{conversion_path}-{jobs}")
+                os.makedirs(output_dir)
+                if conversion_path == "preview":
+                    media_seconds = sum(min(m.duration, PREVIEW_DURATION) for m in metadata.values())
+                    run = lambda: _run_previews(paths, metadata, jobs, output_dir)
+                else:
+                    options = ConversionOptions(
+                        rotate=conversion_path != "copy",
+                        rotate_method=ROTATE_FAST if conversion_path == "fast-rotate" else ROTATE_BURN,
+                        max_workers=jobs, incremental=False, profile=profile,
+                    )
+                    media_seconds = sum(m.duration for m in metadata.values())
+                    run = lambda: _run_conversions(paths, options, output_dir, metadata_cache)
+
+                print(f"Measuring {conversion_path} with {jobs} parallel jobs", file=sys.stderr)
+                started = time.perf_counter()
+                failed = run()
+                elapsed = time.perf_counter() - started
+                shutil.rmtree(output_dir, ignore_errors=True)
+
+                if failed:
+                    print(f"{failed} of {len(paths)} files failed; {conversion_path} with {jobs} jobs is "
+                          "not measured", file=sys.stderr)
+                results.append({
+                    "path": conversion_path,
+                    "jobs": jobs,
+                    "files": len(paths),
+                    "seconds": round(elapsed, 3),
+                    "media_seconds": round(media_seconds, 3),
+                    # A run with failures converted less than the whole input, so it has no speed
+                    "realtime_factor": round(media_seconds / elapsed, 3) if elapsed > 0 and not failed else None,
+                    "failed": failed,
+                })
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return results
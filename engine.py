@@ -0,0 +1,821 @@
+#!/usr/bin/env python3
+"""Headless conversion engine: probing, command building, running ffmpeg and progress
+
+Nothing in this module depends on Qt, so it can run on machines without a
+display. convert_job() converts one job; it is run by the queue workers
+(`python -m jobqueue work`, see jobqueue.py), which the GUI in app.py and the
+HTTP API in api.py start and feed through the job queue. BatchConverter runs
+a whole batch in this process for the command line:
+
+    python -m engine -o OUTPUT_DIR [--rotate [--rotate-method fast]] [-j JOBS] FILE_OR_GLOB...
+"""
+import os
+import sys
+import glob
+import json
+import argparse
+import functools
+import tempfile
+import threading
+import time
+import uuid
+import subprocess
+from contextlib import nullcontext
+from dataclasses import dataclass, field, asdict, replace
+from concurrent.futures import ThreadPoolExecutor
+
+from probe import MetadataCache
+from runner import ConversionError, ConversionCancelled, run_ffmpeg
+from segmented import encode_segmented, concat_line
+from trim import smart_trim, can_smart_trim, parse_time
+from spanned import group_spanned
+from manifest import OutputManifest
+from ingest import AVCHD_STREAM_DIR, collect_files
+from staging import StagingArea, DEFAULT_SCRATCH_MB
+from governor import ResourceGovernor, BATCH, PRIORITY_CLASSES, DEFAULT_MAX_LOAD, set_priority
+from telemetry import TelemetryLog, job_record
+from planner import plan_streams, fallback_args
+from profiles import AUTO, DEFAULT_PROFILE, PROFILE_NAMES, SAMPLE_SECONDS, benchmark, choose_profile, get_profile
+
+
+# How a 90° counterclockwise rotation is applied
+ROTATE_BURN = "burn"  # Re-encode the rotated pixels (works in every player)
+ROTATE_FAST = "fast"  # Stream copy and only set the display matrix (remux speed)
+ROTATE_METHODS = (ROTATE_BURN, ROTATE_FAST)
+
+
+@dataclass
+class ConversionOptions:
+    """Options shared by every job in a batch"""
+    rotate: bool = False
+    rotate_method: str = ROTATE_BURN
+    max_workers: int = 0  # 0 means one job per CPU core
+    segments: int = 0  # Split rotate re-encodes into this many parallel chunks (0 or 1: off)
+    incremental: bool = True  # Skip jobs whose output is already up to date
+    profile: str = DEFAULT_PROFILE  # Encoding profile for re-encoded video, or "auto"
+    target_fps: float = 0.0  # Auto profile: required encoding speed (0: real time)
+    deadline: float = 0.0  # Auto profile: seconds the whole batch may take (0: no deadline)
+    threads: int = 0  # ffmpeg threads per job (0: ffmpeg's default, every core)
+    trim_start: float = 0.0  # Seconds cut from the start of each clip
+    trim_end: float = 0.0  # Where each clip ends, in seconds from its start (0: at its end)
+    requested_profile: str = ""  # "auto" once `profile` has been resolved from it
+
+    # Fields that only affect how a batch is scheduled, not what the output looks like
+    SCHEDULING_FIELDS = ("max_workers", "segments", "incremental", "target_fps", "deadline", "threads")
+
+    @property
+    def burn_rotation(self):
+        return self.rotate and self.rotate_method != ROTATE_FAST
+
+    @property
+    def fast_rotation(self):
+        return self.rotate and self.rotate_method == ROTATE_FAST
+
+    @property
+    def trimmed(self):
+        return self.trim_start > 0 or self.trim_end > 0
+
+    @property
+    def workers(self):
+        return max(1, self.max_workers or os.cpu_count() or 1)
+
+    def output_key(self, encodes_video=True):
+        """The options that determine the output, as recorded in the output manifest
+
+        The profile is only recorded if the job re-encodes video (see
+        job_output_key()), and as "auto" if it was chosen automatically, since
+        the benchmark may choose differently on the next run.
+        """
+        key = {k: v for k, v in asdict(self).items() if k not in self.SCHEDULING_FIELDS}
+        requested_profile = key.pop("requested_profile")
+        if encodes_video:
+            key["profile"] = requested_profile or self.profile
+        else:
+            del key["profile"]
+        if not self.trimmed:
+            # Untrimmed outputs keep the key they were recorded with before trimming existed
+            del key["trim_start"], key["trim_end"]
+        return key
+
+
+@dataclass
+class ConversionJob:
+    """An input file (or spanned sequence of files) and where its converted output goes"""
+    input_path: str
+    output_path: str
+    metadata: object = None  # VideoMetadata, or None if the file could not be probed
+    parts: list = field(default_factory=list)  # VideoMetadata of every file of a spanned sequence
+
+    @property
+    def filename(self):
+        return os.path.basename(self.input_path)
+
+    @property
+    def input_paths(self):
+        return [part.path for part in self.parts] if self.parts else [self.input_path]
+
+    @property
+    def duration(self):
+        if self.parts:
+            return sum(part.duration for part in self.parts)
+        return self.metadata.duration if self.metadata else 0
+
+
+def output_path_for(input_path, output_dir, last_input_path=None):
+    """Output MP4 path for an input file, or for a spanned sequence ending in last_input_path"""
+    output_name = os.path.splitext(os.path.basename(input_path))[0]
+    if last_input_path and last_input_path != input_path:
+        output_name += "-" + os.path.splitext(os.path.basename(last_input_path))[0]
+    return os.path.join(output_dir, output_name + ".mp4")
+
+
+def source_label(input_path):
+    """Name of the folder a clip came from, or of the card for clips in a card's STREAM folder"""
+    directory = os.path.dirname(os.path.abspath(input_path))
+    if os.path.normcase(directory).endswith(os.sep + os.path.normcase(AVCHD_STREAM_DIR)):
+        directory = directory[:-len(AVCHD_STREAM_DIR) - 1]
+    return os.path.basename(directory) or "clip"
+
+
+def unique_output_paths(groups, output_dir):
+    """Output paths for groups of input files, made unique when clips share a name
+
+    Camcorders restart their numbering on every card, so clips from different
+    folders often have the same names. Such outputs are prefixed with the name
+    of their folder (or card), with a counter as a last resort. Names are
+    compared ignoring case, as on the FAT and exFAT cards they often go to.
+    """
+    paths = [output_path_for(group[0], output_dir, group[-1]) for group in groups]
+    counts = {}
+    for path in paths:
+        counts[path.lower()] = counts.get(path.lower(), 0) + 1
+
+    unique = []
+    taken = set()
+    for group, path in zip(groups, paths):
+        if counts[path.lower()] > 1:
+            path = os.path.join(output_dir, f"{source_label(group[0])}-{os.path.basename(path)}")
+        root, ext = os.path.splitext(path)
+        number = 2
+        while path.lower() in taken:
+            path = f"{root}-{number}{ext}"
+            number += 1
+        taken.add(path.lower())
+        unique.append(path)
+    return unique
+
+
+@functools.lru_cache(maxsize=None)
+def ffmpeg_supports_display_rotation():
+    """True if ffmpeg has the -display_rotation input option (FFmpeg 6.1 and later)"""
+    try:
+        result = subprocess.run(["ffmpeg", "-hide_banner", "-h", "full"],
+                                stdin=subprocess.DEVNULL, capture_output=True, universal_newlines=True)
+    except OSError:
+        return False
+    return "-display_rotation" in result.stdout
+
+
+def input_options(options):
+    """Return the ffmpeg options that go before the input"""
+    if options.fast_rotation and ffmpeg_supports_display_rotation():
+        # Rotate 90 degrees counterclockwise through the display matrix; the 16:9 frame
+        # is shown as 9:16 by the player without touching the encoded pixels
+        return ["-display_rotation:v:0", "90"]
+    return []
+
+
+def stream_plan(job, options):
+    """Return the per-stream copy/transcode plan for a job, or None if it was not probed"""
+    return plan_streams(job.metadata, options)
+
+
+def codec_args(job, options):
+    """Return the (map, video, audio) arguments for a job
+
+    Streams are copied wherever MP4 can hold them and transcoded only when
+    needed (see planner.py). The frame rate is never forced.
+    """
+    plan = stream_plan(job, options)
+    if plan is None:
+        # Unknown streams: let ffmpeg pick the default video and audio stream
+        map_args = []
+        video_args, audio_args = fallback_args(options)
+    else:
+        map_args = plan.map_args()
+        video_args, audio_args = plan.video_args(), plan.audio_args()
+
+    if options.fast_rotation and not ffmpeg_supports_display_rotation():
+        # Older ffmpeg versions turn the legacy (clockwise) rotate tag into a display matrix
+        video_args.extend(["-metadata:s:v:0", "rotate=270"])
+    return map_args, video_args, audio_args
+
+
+def trim_range(job, options):
+    """The (start, end) of a job's output in seconds from the start of its input; end is None if unknown
+
+    Raises ConversionError if the range is empty.
+    """
+    start = options.trim_start
+    end = options.trim_end or job.duration or None
+    if end is not None and job.duration:
+        end = min(end, job.duration)
+    if end is not None and end <= start:
+        raise ConversionError(f"Nothing left to convert: the clip is {job.duration:.1f} s long "
+                              f"and the trim range starts at {start:.1f} s")
+    return start, end
+
+
+def job_trim(job, trims):
+    """The (start, end) trim of a job from trim points set per clip; end 0 means the end
+
+    `trims` maps clip paths to (start, end) in seconds from the start of the
+    clip. The In and Out points set on the clips of a spanned recording are
+    moved onto the joined recording. Raises ValueError if its clips have more
+    than one In or Out point between them, or the Out point comes first.
+    """
+    if not job.parts:
+        return trims.get(job.input_path, (0.0, 0.0))
+    in_points, out_points = [], []
+    offset = 0.0
+    for part in job.parts:
+        start, end = trims.get(part.path, (0.0, 0.0))
+        if start:
+            in_points.append(offset + start)
+        if end:
+            out_points.append(offset + (min(end, part.duration) if part.duration else end))
+        offset += part.duration
+    name = os.path.basename(job.input_path)
+    if len(in_points) > 1 or len(out_points) > 1:
+        raise ValueError(f"{name} starts a recording spanning {len(job.parts)} clips, which are joined into one "
+                         "output; set at most one In and one Out point across them")
+    start = in_points[0] if in_points else 0.0
+    end = out_points[0] if out_points else 0.0
+    if end and end <= start:
+        raise ValueError(f"In the recording starting at {name}, the Out point comes before the In point")
+    return start, end
+
+
+def encoded_video_args(video_args, options):
+    """Video arguments with stream copy replaced by the profile's encoder (cuts need exact frames)"""
+    args = []
+    for i, arg in enumerate(video_args):
+        if arg == "copy" and i > 0 and video_args[i - 1].startswith("-c:v"):
+            args.extend(get_profile(options.profile).video_encoder_args())
+        else:
+            args.append(arg)
+    return args
+
+
+def thread_args(threads):
+    """Output options that limit the encoder and the filters to a thread budget (0: no limit)"""
+    return ["-threads", str(threads), "-filter_threads", str(threads)] if threads > 0 else []
+
+
+def build_command(job, options, input_args=None):
+    """Build the single-process ffmpeg command for a job
+
+    A trimmed job seeks its input to the start of the range and re-encodes
+    the video (see trim.py for the smart-render path, which avoids that).
+    """
+    map_args, video_args, audio_args = codec_args(job, options)
+    input_args = input_args or ["-i", job.input_path]
+    trim_args = []
+    if options.trimmed:
+        start, end = trim_range(job, options)
+        input_args = ["-ss", f"{start:.6f}", *input_args]
+        trim_args = ["-t", f"{end - start:.6f}"] if end is not None else []
+        video_args = encoded_video_args(video_args, options)
+    return [
+        "ffmpeg", "-nostdin", *input_options(options), *input_args,
+        *map_args,
+        *trim_args,
+        *video_args,
+        *audio_args,
+        *thread_args(options.threads),
+        # Add progress and output parameters
+        "-progress", "pipe:1",  # Output progress to stdout
+        "-y", job.output_path
+    ]
+
+
+def run_job(job, options, on_progress=None, stats=None, control=None):
+    """Run ffmpeg for one job, calling on_progress(fraction) as it advances
+
+    Spanned sequences are joined with the concat demuxer in a single ffmpeg
+    run. Long rotate re-encodes of single files are split into parallel chunks
+    when options.segments is set. Returns how the job was run ("single",
+    "segmented" or "spanned") and appends the ProcessStats of its ffmpeg
+    processes to `stats` if it is a list. Raises ConversionError with ffmpeg's
+    error output if the conversion fails, or ConversionCancelled if `control`
+    (a JobControl) cancelled it.
+    """
+    if options.trimmed:
+        return run_trimmed_job(job, options, on_progress, stats, control)
+
+    if len(job.input_paths) > 1:
+        run_spanned_job(job, options, on_progress, stats, control)
+        return "spanned"
+
+    if options.burn_rotation and options.segments > 1 and job.metadata:
+        _, video_args, audio_args = codec_args(job, options)
+        plan = stream_plan(job, options)
+        # The chunks run at the same time, so they share the job's thread budget
+        video_args += thread_args(max(1, options.threads // options.segments) if options.threads else 0)
+        if encode_segmented(
+            job.input_path, job.output_path, job.duration, video_args, audio_args,
+            options.segments, start_time=job.metadata.start_time, fps=job.metadata.fps,
+            on_progress=on_progress, stats=stats, control=control,
+            video_map=plan.map_args("video"), audio_map=plan.map_args("audio")
+        ):
+            return "segmented"
+
+    run_ffmpeg(build_command(job, options), job.duration, on_progress, stats, control=control)
+    return "single"
+
+
+def convert_job(job, options, on_progress=None, telemetry=None, control=None, staging=None,
+                governor=None, on_wait=None):
+    """Convert a job unless its output is already current; returns False if it was skipped
+
+    ffmpeg writes to a hidden temporary file next to the output, which is only
+    renamed to the output path once it is complete, so a crash or a failed or
+    cancelled job (see JobControl) never leaves a truncated MP4 behind.
+    Successful conversions are recorded in the output directory's manifest, so
+    re-running a batch only converts new or changed inputs. If a TelemetryLog
+    is given, the job's performance record is appended to it. With a
+    StagingArea, inputs are read from their local copies, which are released
+    when the job ends. With a ResourceGovernor, the job waits until the
+    machine has room for it (on_wait(reason) says why it waits) and runs
+    within its thread budget.
+    """
+    started = time.monotonic()
+    processes = []
+
+    def record(status, mode=None, error=None):
+        if telemetry:
+            plan = stream_plan(job, options)
+            codec_path = [f"{d.codec_type} {d.codec_name} {d.action}" for d in plan.streams] if plan else None
+            telemetry.append(job_record(
+                job.input_paths, job.output_path, status, started, processes, mode, codec_path,
+                options.profile, job.duration, error
+            ))
+
+    try:
+        if output_is_current(job, options):
+            record("skipped")
+            return False
+
+        partial_path = partial_output_path(job.output_path)
+        try:
+            with governor.admit(control, on_wait) if governor else nullcontext(options.threads) as threads:
+                mode = run_job(_staged_job(job, staging, partial_path), replace(options, threads=threads),
+                               on_progress, processes, control)
+            os.replace(partial_path, job.output_path)
+        except BaseException as e:
+            _remove(partial_path)
+            if isinstance(e, ConversionCancelled):
+                record("cancelled")
+            elif isinstance(e, Exception):
+                record("failed", error=str(e))
+            raise
+    finally:
+        if staging:
+            for input_path in job.input_paths:
+                staging.release(input_path)
+    manifest = OutputManifest(os.path.dirname(os.path.abspath(job.output_path)))
+    manifest.record(job.output_path, job.input_paths, job_output_key(job, options))
+    record("converted", mode)
+    return True
+
+
+def job_output_key(job, options):
+    """The output key of a job's options; the profile only counts if the job re-encodes video"""
+    plan = stream_plan(job, options)
+    # Trims re-encode at least the frames around the cuts
+    encodes_video = plan.transcodes_video() if plan else options.burn_rotation
+    return options.output_key(encodes_video or options.trimmed)
+
+
+def output_is_current(job, options):
+    """True if incremental conversion is on and the job's output is already up to date"""
+    manifest = OutputManifest(os.path.dirname(os.path.abspath(job.output_path)))
+    return options.incremental and manifest.is_current(job.output_path, job.input_paths,
+                                                       job_output_key(job, options))
+
+
+def partial_output_path(output_path):
+    """Hidden temporary name that ffmpeg writes an output to until it is complete"""
+    directory, name = os.path.split(output_path)
+    stem, ext = os.path.splitext(name)
+    return os.path.join(directory, f".{stem}.{uuid.uuid4().hex[:8]}.part{ext}")
+
+
+def _staged_job(job, staging, output_path):
+    """The job as ffmpeg runs it: inputs from the staging area and output to `output_path`"""
+    if staging is None:
+        return replace(job, output_path=output_path)
+    return replace(job, input_path=staging.acquire(job.input_path), output_path=output_path,
+                   parts=[replace(part, path=staging.acquire(part.path)) for part in job.parts])
+
+
+def _remove(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+def smart_trim_applies(job, options):
+    """True if a trimmed job can copy whole GOPs and only re-encode the edges (see trim.py)"""
+    plan = stream_plan(job, options)
+    return (len(job.input_paths) == 1 and plan is not None and not plan.transcodes_video()
+            and can_smart_trim(job.metadata))
+
+
+def run_trimmed_job(job, options, on_progress=None, stats=None, control=None):
+    """Convert the trim range of a job; returns "smart-trim" or "trimmed" (see run_job)
+
+    H.264 video that would be copied is smart-rendered: only the partial GOPs
+    at the cuts are re-encoded. Anything else is decoded and encoded over the
+    trim range.
+    """
+    start, end = trim_range(job, options)
+    if end is not None and smart_trim_applies(job, options):
+        _, video_args, audio_args = codec_args(job, options)
+        if smart_trim(
+            job.input_path, job.output_path, job.metadata, start, end, thread_args(options.threads), audio_args,
+            video_args=video_args, mux_input_args=input_options(options), profile=options.profile,
+            on_progress=on_progress, stats=stats, control=control
+        ):
+            return "smart-trim"
+
+    if len(job.input_paths) > 1:
+        run_spanned_job(job, options, on_progress, stats, control)
+    else:
+        run_ffmpeg(build_command(job, options), (end or job.duration) - start, on_progress, stats,
+                   control=control)
+    return "trimmed"
+
+
+def run_spanned_job(job, options, on_progress=None, stats=None, control=None):
+    """Convert a spanned sequence into one output with the concat demuxer (one encode at most)"""
+    fd, list_path = tempfile.mkstemp(prefix="videoconverter-concat-", suffix=".txt")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.writelines(concat_line(os.path.abspath(p)) for p in job.input_paths)
+        input_args = ["-f", "concat", "-safe", "0", "-i", list_path]
+        start, end = trim_range(job, options) if options.trimmed else (0.0, job.duration)
+        run_ffmpeg(build_command(job, options, input_args), (end or 0) - start, on_progress, stats,
+                   control=control)
+    finally:
+        os.unlink(list_path)
+
+
+def resolve_profile(jobs, options, deadline=None):
+    """Replace an "auto" profile with the best profile that is fast enough for these jobs
+
+    A short sample of the longest job that re-encodes video is encoded with
+    each profile, from the highest quality down. The required speed comes from
+    the deadline (seconds left for the whole batch, default options.deadline),
+    else options.target_fps, else real time. Batches that only stream-copy
+    video are never benchmarked. Returns the options with the chosen profile
+    and the measured speed of every profile that was tried.
+    """
+    if options.profile != AUTO:
+        return options, {}
+
+    encoded = []
+    for job in jobs:
+        plan = stream_plan(job, options)
+        if plan and plan.transcodes_video():
+            encoded.append(job)
+    if not encoded:
+        return replace(options, profile=DEFAULT_PROFILE, requested_profile=AUTO), {}
+
+    sample = max(encoded, key=lambda job: job.duration)
+    deadline = options.deadline if deadline is None else deadline
+    if deadline:
+        total_frames = sum(job.duration * (job.metadata.fps or 30.0) for job in encoded)
+        required_fps = total_frames / max(deadline, 1.0)
+    elif options.target_fps > 0:
+        required_fps = options.target_fps
+    else:
+        required_fps = sample.metadata.fps or 30.0
+
+    # Sample the middle of the clip, where the content is most representative
+    start = max(0.0, sample.metadata.duration / 2 - SAMPLE_SECONDS / 2)
+
+    def measure(profile):
+        _, video_args, _ = codec_args(sample, replace(options, profile=profile.name))
+        return benchmark(sample.input_path, video_args, start)
+
+    name, measurements = choose_profile(measure, required_fps)
+    return replace(options, profile=name, requested_profile=AUTO), measurements
+
+
+def plan_jobs(video_files, output_dir, metadata, join_spanned=True):
+    """Turn input files into jobs, joining spanned sequences into single jobs
+
+    `metadata` maps each path to its VideoMetadata (or None if unknown).
+    Output names are made unique, see unique_output_paths().
+    """
+    groups = group_spanned(video_files, metadata) if join_spanned else [[f] for f in video_files]
+    jobs = []
+    for group, output_path in zip(groups, unique_output_paths(groups, output_dir)):
+        first = group[0]
+        parts = [metadata[p] for p in group] if len(group) > 1 else []
+        jobs.append(ConversionJob(first, output_path, metadata.get(first), parts))
+    return jobs
+
+
+class BatchConverter:
+    """Converts a batch of files on a pool of parallel ffmpeg jobs
+
+    Progress of the individual files is combined into one overall percentage,
+    weighted by each file's duration. Callbacks are invoked from worker threads:
+
+        on_progress(percent)                  overall progress, 0-100
+        on_status(text)                       human readable status
+        on_file_progress(input_path, fraction)
+        on_error(filename, error)
+
+    Jobs whose outputs are already current are skipped and listed in `skipped`.
+    Every job's performance record goes to `telemetry` (a TelemetryLog). With a
+    `staging` area, the inputs of upcoming jobs are copied to local scratch
+    space while the current ones encode. Jobs start when the `governor` (a
+    ResourceGovernor, by default one that splits the CPU cores between the
+    parallel jobs) lets them.
+    """
+
+    def __init__(self, video_files, output_dir, options=None, metadata_cache=None,
+                 on_progress=None, on_status=None, on_file_progress=None, on_error=None,
+                 join_spanned=True, telemetry=None, staging=None, governor=None):
+        self.video_files = list(video_files)
+        self.output_dir = output_dir
+        self.options = options or ConversionOptions()
+        self.join_spanned = join_spanned
+        self.metadata_cache = metadata_cache or MetadataCache()
+        self.telemetry = telemetry or TelemetryLog()
+        self.staging = staging
+        self.governor = governor
+        self.on_progress = on_progress
+        self.on_status = on_status
+        self.on_file_progress = on_file_progress
+        self.on_error = on_error
+
+        # Shared progress state, updated from the worker threads
+        self._lock = threading.Lock()
+        self._weights = {}
+        self._file_progress = {}
+        self._completed = 0
+        self.total_jobs = 0
+        self.failed = []
+        self.skipped = []
+
+    def _emit(self, callback, *args):
+        if callback:
+            callback(*args)
+
+    def _get_metadata(self, input_file):
+        """Get cached or freshly probed metadata for a file, or None if it cannot be read"""
+        try:
+            return self.metadata_cache.get(input_file)
+        except Exception as e:
+            print(f"Error probing {input_file}: {str(e)}", file=sys.stderr)
+            return None  # Without metadata the file only reports progress when it finishes
+
+    def plan(self):
+        """Probe every input and return the list of jobs"""
+        metadata = {f: self._get_metadata(f) for f in self.video_files}
+        return plan_jobs(self.video_files, self.output_dir, metadata, self.join_spanned)
+
+    def run(self):
+        """Convert every file; returns the list of filenames that failed"""
+        if not self.video_files:
+            return self.failed
+
+        # Get every file's metadata up front so each file's progress can be weighted by its length
+        self._emit(self.on_status, "Reading video properties...")
+        jobs = self.plan()
+        self.total_jobs = total_files = len(jobs)
+
+        if self.options.profile == AUTO:
+            # Up-to-date outputs are skipped whatever the profile, so they are not benchmarked;
+            # with none left, nothing is
+            self._emit(self.on_status, "Benchmarking encoding profiles...")
+            outdated = [job for job in jobs if not output_is_current(job, self.options)]
+            self.options, measurements = resolve_profile(outdated, self.options)
+            speeds = ", ".join(f"{name} {fps:.0f} fps" for name, fps in measurements.items())
+            self._emit(self.on_status, f"Using the {self.options.profile} profile ({speeds or 'no re-encoding'})")
+
+        # Files with an unknown duration count as an average-length file
+        known = [job.duration for job in jobs if job.duration > 0]
+        fallback = (sum(known) / len(known)) if known else 1.0
+        self._weights = {job.input_path: (job.duration if job.duration > 0 else fallback) for job in jobs}
+        self._file_progress = {job.input_path: 0.0 for job in jobs}
+        self._completed = 0
+        self.failed = []
+        self.skipped = []
+
+        workers = min(self.options.workers, total_files)
+        self._emit(self.on_status, f"Converting {total_files} files with {workers} parallel jobs...")
+        governor = self.governor or ResourceGovernor(workers, self.options.threads)
+
+        # Jobs start in order, so their inputs are staged in the same order
+        if self.staging:
+            self.staging.stage([path for job in jobs if not output_is_current(job, self.options)
+                                for path in job.input_paths])
+
+        # Each job reports its own errors, so one failing file never blocks the others
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for job in jobs:
+                pool.submit(self._convert_job, job, governor)
+
+        self.metadata_cache.save()
+        self._emit(self.on_progress, 100)
+        return self.failed
+
+    def _report_progress(self, input_file, file_progress, finished=False):
+        """Combine per-file progress into the overall progress, weighted by duration"""
+        with self._lock:
+            self._file_progress[input_file] = file_progress
+            if finished:
+                self._completed += 1
+
+            total_weight = sum(self._weights.values())
+            done_weight = sum(self._weights[f] * p for f, p in self._file_progress.items())
+            overall_progress = int((done_weight / total_weight) * 100) if total_weight > 0 else 0
+            completed = self._completed
+
+        self._emit(self.on_file_progress, input_file, file_progress)
+        self._emit(self.on_progress, min(100, overall_progress))
+
+        self._emit(self.on_status, f"Converting... {completed}/{self.total_jobs} files done, {overall_progress}%")
+
+    def _convert_job(self, job, governor):
+        """Convert a single file (runs on a pool worker thread)"""
+        def on_wait(reason):
+            self._emit(self.on_status, f"Waiting to start {job.filename}: {reason}")
+
+        try:
+            if not convert_job(job, self.options, lambda fraction: self._report_progress(job.input_path, fraction),
+                               self.telemetry, staging=self.staging, governor=governor, on_wait=on_wait):
+                with self._lock:
+                    self.skipped.append(job.filename)
+        except Exception as e:
+            with self._lock:
+                self.failed.append(job.filename)
+            self._emit(self.on_error, job.filename, str(e))
+
+        # A finished (or failed) file counts as fully processed
+        self._report_progress(job.input_path, 1.0, finished=True)
+
+
+def expand_inputs(patterns):
+    """Expand file names, folders and glob patterns into a de-duplicated list of clips
+
+    Folders (and AVCHD cards) are searched recursively, and copies of the same
+    clip are only converted once (see ingest.collect_files).
+    """
+    inputs = []
+    for pattern in patterns:
+        inputs.extend(sorted(glob.glob(pattern, recursive=True)) or [pattern])
+    result = collect_files(inputs)
+    for duplicate, original in result.duplicates.items():
+        print(f"Skipping {duplicate}: same clip as {original}", file=sys.stderr)
+    return result.files
+
+
+def _print_event(event, **fields):
+    """Print one machine-readable progress event as a JSON line"""
+    print(json.dumps({"event": event, **fields}), flush=True)
+
+
+def _describe_trim(job, options):
+    try:
+        start, end = trim_range(job, options)
+    except ConversionError as e:
+        return {"error": str(e)}
+    return {"start": start, "end": end, "smart": smart_trim_applies(job, options)}
+
+
+def print_plan(jobs, options):
+    """Print the stream plan of every job as JSON lines (used by --dry-run)"""
+    for job in jobs:
+        plan = stream_plan(job, options)
+        _print_event(
+            "plan", file=job.input_path, inputs=job.input_paths, output=job.output_path,
+            profile=options.profile,
+            up_to_date=output_is_current(job, options),
+            streams=plan.describe() if plan else None,
+            trim=_describe_trim(job, options) if options.trimmed else None,
+            command=build_command(job, options)
+            if len(job.input_paths) == 1 and not (options.trimmed and smart_trim_applies(job, options)) else None,
+        )
+
+
+def main(argv=None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(
+        prog="python -m engine",
+        description="Convert MTS videos to MP4 without the GUI. "
+                    "Progress is printed to stdout as one JSON object per line."
+    )
+    parser.add_argument("inputs", nargs="+",
+                        help="input files, folders (searched recursively, e.g. a mounted AVCHD card) "
+                             "or glob patterns (quote globs)")
+    parser.add_argument("-o", "--output-dir", required=True, help="directory for the converted MP4 files")
+    parser.add_argument("--rotate", action="store_true", help="rotate video 90° counterclockwise")
+    parser.add_argument("--rotate-method", choices=ROTATE_METHODS, default=ROTATE_BURN,
+                        help="'burn' re-encodes the rotated video (default); 'fast' stream-copies "
+                             "and only sets the display rotation, at remux speed")
+    parser.add_argument("-j", "--jobs", type=int, default=0,
+                        help="number of parallel ffmpeg jobs (default: number of CPU cores)")
+    parser.add_argument("--segments", type=int, default=0,
+                        help="with --rotate (burn), split long clips at keyframes into this many "
+                             "chunks encoded in parallel (default: off)")
+    parser.add_argument("--no-join-spanned", dest="join_spanned", action="store_false",
+                        help="convert spanned AVCHD clips (00000.MTS, 00001.MTS, ...) separately "
+                             "instead of joining each recording into one MP4")
+    parser.add_argument("--force", action="store_true",
+                        help="convert every file, even if its output is already up to date")
+    parser.add_argument("--profile", choices=PROFILE_NAMES, default=DEFAULT_PROFILE,
+                        help="speed/quality profile for re-encoded video (default: archive); 'auto' "
+                             "benchmarks a sample and picks the best profile that meets --target-fps "
+                             "or --deadline (default: real time)")
+    parser.add_argument("--target-fps", type=float, default=0.0,
+                        help="with --profile auto, the encoding speed to reach in frames per second")
+    parser.add_argument("--deadline", type=float, default=0.0,
+                        help="with --profile auto, minutes the whole batch may take")
+    parser.add_argument("--telemetry-log", default=None,
+                        help="JSONL file that receives one performance record per job "
+                             "(default: $VIDEOCONVERTER_TELEMETRY_LOG or the state directory)")
+    parser.add_argument("--prometheus-file", default=None,
+                        help="also export telemetry totals to this Prometheus textfile")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="print what would be done with every stream of every file, without converting")
+    parser.add_argument("--stage-ahead", type=int, default=0, metavar="N",
+                        help="copy the inputs of the next N jobs to local scratch space while converting "
+                             "(for slow cards and USB camcorders; default: off)")
+    parser.add_argument("--scratch-dir", default=None,
+                        help="where staged inputs are copied (default: $VIDEOCONVERTER_SCRATCH_DIR or the temp dir)")
+    parser.add_argument("--scratch-max-mb", type=int, default=None,
+                        help=f"cap for staged inputs (default: $VIDEOCONVERTER_SCRATCH_MB or {DEFAULT_SCRATCH_MB})")
+    parser.add_argument("--start", type=parse_time, default=0.0, metavar="TIME",
+                        help="trim: start each clip at this time (SS, MM:SS or HH:MM:SS)")
+    parser.add_argument("--end", type=parse_time, default=0.0, metavar="TIME",
+                        help="trim: end each clip at this time (default: at its end). Stream-copied "
+                             "H.264 only re-encodes the partial GOPs at the cuts")
+    parser.add_argument("--threads", type=int, default=0,
+                        help="ffmpeg threads per job (default: CPU cores divided by --jobs)")
+    parser.add_argument("--max-load", type=float, default=None,
+                        help="do not start another job while the load average per CPU core is above this "
+                             f"(default: $VIDEOCONVERTER_MAX_LOAD or {DEFAULT_MAX_LOAD:g}; 0: no limit)")
+    parser.add_argument("--priority", choices=PRIORITY_CLASSES, default=BATCH,
+                        help="CPU and I/O priority of the conversions (default: batch, below previews "
+                             "and interactive programs)")
+    args = parser.parse_args(argv)
+    set_priority(args.priority)
+
+    video_files = expand_inputs(args.inputs)
+    if not video_files:
+        parser.error("no input files found")
+
+    options = ConversionOptions(rotate=args.rotate, rotate_method=args.rotate_method,
+                                max_workers=args.jobs, segments=args.segments,
+                                incremental=not args.force, profile=args.profile,
+                                target_fps=args.target_fps, deadline=args.deadline * 60,
+                                threads=args.threads, trim_start=args.start, trim_end=args.end)
+    converter = BatchConverter(
+        video_files, args.output_dir, options,
+        on_progress=lambda percent: _print_event("progress", progress=percent),
+        on_file_progress=lambda path, fraction: _print_event(
+            "file_progress", file=path, progress=round(fraction * 100, 1)),
+        on_error=lambda filename, error: _print_event("error", file=filename, error=error),
+        join_spanned=args.join_spanned,
+        telemetry=TelemetryLog(args.telemetry_log, args.prometheus_file),
+        governor=ResourceGovernor(min(options.workers, len(video_files)), args.threads, args.max_load),
+    )
+    if args.dry_run:
+        print_plan(converter.plan(), options)
+        converter.metadata_cache.save()
+        return 0
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    _print_event("start", files=video_files, output_dir=args.output_dir, jobs=options.workers)
+    if args.stage_ahead > 0:
+        max_bytes = args.scratch_max_mb * 1024 * 1024 if args.scratch_max_mb else None
+        converter.staging = StagingArea(args.stage_ahead, max_bytes, args.scratch_dir)
+    try:
+        failed = converter.run()
+    finally:
+        if converter.staging:
+            converter.staging.close()
+    _print_event("complete", converted=converter.total_jobs - len(failed) - len(converter.skipped),
+                 skipped=converter.skipped, failed=failed, profile=converter.options.profile)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""Table model for the file list: an indexed store of clips with lazily filled columns
+
+The store keeps one small entry per file plus a path -> row index, so adding,
+de-duplicating and updating files are O(1) per file even for thousands of
+clips. Metadata columns are only filled when the view asks for a row, from
+the metadata cache; rows without metadata ask for a probe once, and rows
+without a poster frame ask for one once. Sorting is
+done by the model itself with one key per row, instead of by a proxy that
+compares rows through data() calls. It only uses values that are already
+known, so it never touches the disk on the GUI thread: rows whose value is
+still unknown go last, and the rows are sorted again once the background
+probes stop delivering metadata.
+"""
+import os
+
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex, QSortFilterProxyModel, QTimer, pyqtSignal
+
+# Columns of the file table
+NAME, SIZE, RESOLUTION, FPS, DURATION, STATUS = range(6)
+HEADERS = ["Name", "Size", "Resolution", "FPS", "Duration", "Status"]
+
+# Role with the raw value used for sorting (bytes, pixels, seconds, ...)
+SORT_ROLE = Qt.ItemDataRole.UserRole
+# Role with the full path of a row
+PATH_ROLE = Qt.ItemDataRole.UserRole + 1
+# A metadata column is sorted again once no metadata has arrived for this long (ms)
+RESORT_DELAY_MS = 300
+
+# Status shown for each job queue state
+JOB_STATUS = {
+    "pending": "Queued",
+    "done": "Done",
+    "skipped": "Up to date",
+    "failed": "Failed",
+    "cancelled": "Cancelled",
+    "paused": "Paused",
+}
+
+
+def format_size(size):
+    if size < 1024 * 1024:  # Less than 1MB
+        return f"{size / 1024:.1f} KB"
+    return f"{size / (1024 * 1024):.2f} MB"
+
+
+def format_duration(duration):
+    return f"{int(duration // 60)}m {int(duration % 60)}s"
+
+
+class FileEntry:
+    """One clip in the list; size and metadata are filled in on first use"""
+    __slots__ = ("path", "name", "size", "metadata", "status", "looked_up", "thumbnail", "thumbnail_requested")
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.size = None
+        self.metadata = None
+        self.status = ""
+        self.looked_up = False
+        self.thumbnail = None
+        self.thumbnail_requested = False
+
+
+class FileTableModel(QAbstractTableModel):
+    """Clips with their size, resolution, fps, duration and conversion status
+
+    metadata_needed(path) is emitted the first time a row without metadata is
+    displayed, so visible rows can be probed before the rest, and
+    thumbnail_needed(path) the first time its name cell is drawn without a
+    poster frame.
+    """
+    metadata_needed = pyqtSignal(str)
+    thumbnail_needed = pyqtSignal(str)
+
+    def __init__(self, metadata_cache, parent=None):
+        super().__init__(parent)
+        self.metadata_cache = metadata_cache
+        self._entries = []
+        self._rows = {}  # path -> row
+        self._sort_column = None
+        self._sort_order = Qt.SortOrder.AscendingOrder
+        self._resort_timer = QTimer(self)
+        self._resort_timer.setSingleShot(True)
+        self._resort_timer.setInterval(RESORT_DELAY_MS)
+        self._resort_timer.timeout.connect(lambda: self.sort(self._sort_column, self._sort_order))
+
+    # Store
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, path):
+        return path in self._rows
+
+    def paths(self):
+        return [entry.path for entry in self._entries]
+
+    def row_of(self, path):
+        return self._rows.get(path, -1)
+
+    def path_at(self, row):
+        return self._entries[row].path if 0 <= row < len(self._entries) else None
+
+    def add_files(self, paths):
+        """Append the files that are not in the list yet; returns the added paths"""
+        new_paths = []
+        seen = set()
+        for path in paths:
+            if path not in self._rows and path not in seen:
+                seen.add(path)
+                new_paths.append(path)
+        if not new_paths:
+            return []
+
+        first = len(self._entries)
+        self.beginInsertRows(QModelIndex(), first, first + len(new_paths) - 1)
+        for path in new_paths:
+            self._rows[path] = len(self._entries)
+            self._entries.append(FileEntry(path))
+        self.endInsertRows()
+
+        # Keep the list in the chosen order
+        if self._sort_column is not None:
+            self.sort(self._sort_column, self._sort_order)
+        return new_paths
+
+    def remove_files(self, paths):
+        """Remove files from the list"""
+        rows = sorted((self._rows[p] for p in set(paths) if p in self._rows), reverse=True)
+        if not rows:
+            return
+        self.beginResetModel()
+        for row in rows:
+            del self._entries[row]
+        self._rows = {entry.path: row for row, entry in enumerate(self._entries)}
+        self.endResetModel()
+
+    def clear(self):
+        self.beginResetModel()
+        self._entries = []
+        self._rows = {}
+        self.endResetModel()
+
+    def _row_changed(self, row):
+        self.dataChanged.emit(self.index(row, 0), self.index(row, len(HEADERS) - 1))
+
+    def update_metadata(self, path, metadata):
+        """Store probe results for a file"""
+        row = self._rows.get(path)
+        if row is not None:
+            self._entries[row].metadata = metadata
+            self._row_changed(row)
+            if self._sort_column not in (None, NAME, STATUS):
+                self._resort_timer.start()
+
+    def set_thumbnail(self, path, thumbnail):
+        """Store the poster frame shown next to a file's name (a QPixmap or QIcon)"""
+        row = self._rows.get(path)
+        if row is not None:
+            self._entries[row].thumbnail = thumbnail
+            self.dataChanged.emit(self.index(row, NAME), self.index(row, NAME),
+                                  [Qt.ItemDataRole.DecorationRole])
+
+    def set_status(self, path, status):
+        row = self._rows.get(path)
+        if row is not None and self._entries[row].status != status:
+            self._entries[row].status = status
+            self.dataChanged.emit(self.index(row, STATUS), self.index(row, STATUS))
+
+    def set_job_state(self, path, state, progress):
+        """Show a conversion job's state in the status column"""
+        if state == "running":
+            self.set_status(path, f"Converting {int(progress * 100)}%")
+        else:
+            self.set_status(path, JOB_STATUS.get(state, state))
+
+    # Qt model interface
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._entries)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return HEADERS[section]
+        return None
+
+    def _fill(self, entry):
+        """Fill in the size and cached metadata of a row the first time it is shown"""
+        if entry.size is None:
+            try:
+                entry.size = os.path.getsize(entry.path)
+            except OSError:
+                entry.size = -1
+        if not entry.looked_up:
+            entry.looked_up = True
+            if entry.metadata is None:
+                entry.metadata = self.metadata_cache.lookup(entry.path)
+                if entry.metadata is None:
+                    self.metadata_needed.emit(entry.path)
+
+    def _sort_key(self, entry, column):
+        """The value a row is sorted by, from what is already known (None if unknown)"""
+        if column == NAME:
+            return entry.name.lower()
+        if column == STATUS:
+            return entry.status
+        metadata = entry.metadata
+        if column == SIZE:
+            return entry.size if entry.size is not None else metadata.size if metadata else None
+        if metadata is None:
+            return None
+        if column == RESOLUTION:
+            return metadata.width * metadata.height
+        if column == FPS:
+            return metadata.fps
+        return metadata.duration
+
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+        """Reorder the rows by one column, keeping selections on the same files"""
+        self._sort_column, self._sort_order = column, order
+        self.layoutAboutToBeChanged.emit()
+        persistent = self.persistentIndexList()
+        persistent_paths = [(self._entries[index.row()].path, index.column()) for index in persistent]
+
+        # Rows whose value is not known yet go last in either order
+        known, unknown = [], []
+        for entry in self._entries:
+            (unknown if self._sort_key(entry, column) is None else known).append(entry)
+        known.sort(key=lambda entry: (self._sort_key(entry, column), entry.name),
+                   reverse=order == Qt.SortOrder.DescendingOrder)
+        unknown.sort(key=lambda entry: entry.name)
+        self._entries = known + unknown
+        self._rows = {entry.path: row for row, entry in enumerate(self._entries)}
+
+        self.changePersistentIndexList(
+            persistent, [self.index(self._rows[path], column) for path, column in persistent_paths])
+        self.layoutChanged.emit()
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        entry = self._entries[index.row()]
+        column = index.column()
+
+        if role == PATH_ROLE:
+            return entry.path
+        if role == Qt.ItemDataRole.ToolTipRole and column == NAME:
+            return entry.path
+        if role == SORT_ROLE:
+            return self._sort_key(entry, column)
+        if role == Qt.ItemDataRole.DecorationRole and column == NAME:
+            if entry.thumbnail is None and not entry.thumbnail_requested:
+                entry.thumbnail_requested = True
+                self.thumbnail_needed.emit(entry.path)
+            return entry.thumbnail
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+
+        if column == NAME:
+            return entry.name
+        if column == STATUS:
+            return entry.status
+
+        self._fill(entry)
+        metadata = entry.metadata
+        if column == SIZE:
+            return format_size(entry.size) if entry.size >= 0 else "Error"
+        if metadata is None:
+            return "..."
+        if column == RESOLUTION:
+            return f"{metadata.width}x{metadata.height}" if metadata.width and metadata.height else "Unknown"
+        if column == FPS:
+            return f"{metadata.fps:.2f}" if metadata.fps > 0 else "Unknown"
+        if column == DURATION:
+            return format_duration(metadata.duration) if metadata.duration > 0 else "Unknown"
+        return None
+
+
+class FileFilterProxy(QSortFilterProxyModel):
+    """Filters rows by a case-insensitive name match; sorting is passed on to the FileTableModel"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setFilterKeyColumn(NAME)
+        self.setFilterCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
+
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+        self.sourceModel().sort(column, order)
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""Cheap content fingerprints for large media files
+
+Hashing whole camcorder clips is far too slow for batches of thousands of
+files, so a fingerprint combines the size with a hash of the first and last
+megabyte. That is enough to recognise a clip that was copied elsewhere and to
+notice a file that was replaced by a different recording.
+"""
+import os
+import hashlib
+
+PARTIAL_HASH_BYTES = 1024 * 1024
+
+
+def partial_hash(path, size=None, block_size=PARTIAL_HASH_BYTES):
+    """SHA-1 of the size plus the first and last `block_size` bytes of a file"""
+    size = os.path.getsize(path) if size is None else size
+    digest = hashlib.sha1(str(size).encode("ascii"))
+    with open(path, "rb") as f:
+        digest.update(f.read(block_size))
+        if size > block_size:
+            f.seek(max(block_size, size - block_size))
+            digest.update(f.read(block_size))
+    return digest.hexdigest()
+
+
+def file_fingerprint(path):
+    """Size, modification time and partial hash of a file, as a JSON-friendly dict"""
+    stat = os.stat(path)
+    return {
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "partial_hash": partial_hash(path, stat.st_size),
+    }
+
+
+def matches_fingerprint(path, fingerprint):
+    """True if a file still matches a recorded fingerprint
+
+    Size and mtime are checked first; the partial hash is only computed when
+    the mtime changed (e.g. the same clip copied to a new place).
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return False
+    if stat.st_size != fingerprint.get("size"):
+        return False
+    if stat.st_mtime_ns == fingerprint.get("mtime_ns"):
+        return True
+    return partial_hash(path, stat.st_size) == fingerprint.get("partial_hash")
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""Sharing the machine between conversions, previews and everything else
+
+Every ffmpeg process runs in one of three priority classes, each with its own
+nice value and I/O scheduling class (ionice), so the preview the user is
+watching always wins over batch work:
+
+    interactive  the streamed preview (normal priority)
+    batch        conversions (nice 10, best-effort I/O at the lowest level)
+    background   preview prefetch and thumbnails (nice 15, idle I/O)
+
+A ResourceGovernor gives every conversion a -threads budget (the CPU cores
+split between the jobs allowed to run at once) and only starts another job
+while the load average and memory pressure leave room for it. As with
+`make -l`, a job is always started when none is running, so an overloaded
+machine slows a batch down but never stalls it.
+"""
+import os
+import ctypes
+import platform
+import threading
+from contextlib import contextmanager
+
+# Priority classes
+INTERACTIVE = "interactive"
+BATCH = "batch"
+BACKGROUND = "background"
+PRIORITY_CLASSES = (INTERACTIVE, BATCH, BACKGROUND)
+
+# I/O scheduling classes of ioprio_set(2)
+IOPRIO_CLASS_BE = 2
+IOPRIO_CLASS_IDLE = 3
+IOPRIO_CLASS_SHIFT = 13
+IOPRIO_WHO_PROCESS = 1
+# ioprio_set has no libc wrapper, so it is called by syscall number
+IOPRIO_SET_SYSCALLS = {"x86_64": 251, "i386": 289, "i686": 289, "aarch64": 30, "armv7l": 314, "ppc64le": 273}
+
+# nice value, I/O class and I/O level of each priority class
+PRIORITIES = {
+    INTERACTIVE: (0, IOPRIO_CLASS_BE, 4),
+    BATCH: (10, IOPRIO_CLASS_BE, 7),
+    BACKGROUND: (15, IOPRIO_CLASS_IDLE, 0),
+}
+
+# No new job while the 1 minute load average per CPU core is above this,
+# overridable with VIDEOCONVERTER_MAX_LOAD (0 turns the check off)
+DEFAULT_MAX_LOAD = 1.5
+# No new job while less memory than this is available (VIDEOCONVERTER_MIN_FREE_MB)
+DEFAULT_MIN_FREE_MB = 512
+# No new job while tasks spent more than this share of the last 10 s stalled on memory (PSI)
+MAX_MEMORY_PRESSURE = 10.0
+# How often a waiting job looks at the load again
+ADMIT_POLL = 2.0
+
+
+_libc = None
+
+
+def _load_libc():
+    """The C library, for syscall() (None where ioprio_set is not available)"""
+    global _libc
+    if _libc is None and platform.system() == "Linux" and platform.machine() in IOPRIO_SET_SYSCALLS:
+        try:
+            _libc = ctypes.CDLL(None, use_errno=True)
+        except OSError:
+            pass
+    return _libc
+
+
+def _ioprio_set(io_class, level, pid=0):
+    """Set the I/O priority of a process, 0 for the calling one (does nothing where that is not supported)"""
+    libc = _load_libc()
+    if libc is not None:
+        libc.syscall(IOPRIO_SET_SYSCALLS[platform.machine()], IOPRIO_WHO_PROCESS, pid,
+                     (io_class << IOPRIO_CLASS_SHIFT) | level)
+
+
+def set_priority(priority, pid=0):
+    """Move a process (by default the calling one) to a priority class
+
+    Priorities are only ever lowered: an unprivileged process could not raise
+    them back anyway. On Linux both apply per thread and are inherited by new
+    threads and child processes, so call it before the process starts threads:
+    in the worker at startup, or on a child right after it was started (see
+    ProcessSupervisor). Nothing may be run between fork and exec in the
+    threaded GUI process, so no preexec_fn is used.
+    """
+    nice, io_class, io_level = PRIORITIES[priority]
+    try:
+        if os.getpriority(os.PRIO_PROCESS, pid) < nice:
+            os.setpriority(os.PRIO_PROCESS, pid, nice)
+    except (AttributeError, OSError):
+        pass
+    if priority != INTERACTIVE:
+        _ioprio_set(io_class, io_level, pid)
+
+
+def load_per_cpu():
+    """The 1 minute load average divided by the number of CPU cores, or None if unknown"""
+    try:
+        return os.getloadavg()[0] / (os.cpu_count() or 1)
+    except (AttributeError, OSError):
+        return None
+
+
+def memory_status():
+    """(available bytes, memory pressure in %) from /proc; either is None where unknown"""
+    available = pressure = None
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    available = int(line.split()[1]) * 1024
+                    break
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        # Pressure stall information: "some avg10=1.23 avg60=... total=..."
+        with open("/proc/pressure/memory") as f:
+            fields = dict(item.split("=") for item in f.readline().split()[1:])
+        pressure = float(fields["avg10"])
+    except (OSError, ValueError, KeyError):
+        pass
+    return available, pressure
+
+
+class ResourceGovernor:
+    """Decides when a conversion may start and how many threads it gets
+
+        with governor.admit(control) as threads:
+            ...run ffmpeg with "-threads", threads...
+
+    At most max_jobs conversions run at once. A job waits for its turn while
+    another job is running and the machine is overloaded (see pressure()).
+    """
+
+    def __init__(self, max_jobs=1, threads=0, max_load=None, min_free_mb=None):
+        self.cpus = os.cpu_count() or 1
+        self.max_jobs = max(1, max_jobs)
+        # Split the cores between the jobs that may run at once
+        self.threads = threads or max(1, self.cpus // self.max_jobs)
+        if max_load is None:
+            max_load = float(os.environ.get("VIDEOCONVERTER_MAX_LOAD", DEFAULT_MAX_LOAD))
+        self.max_load = max_load
+        if min_free_mb is None:
+            min_free_mb = int(os.environ.get("VIDEOCONVERTER_MIN_FREE_MB", DEFAULT_MIN_FREE_MB))
+        self.min_free_bytes = min_free_mb * 1024 * 1024
+
+        self._condition = threading.Condition()
+        self._running = 0
+
+    def pressure(self):
+        """Why the machine cannot take another job right now, or None if it can"""
+        if self.max_load:
+            load = load_per_cpu()
+            if load is not None and load > self.max_load:
+                return f"load average {load:.2f} per CPU core"
+        available, pressure = memory_status()
+        if available is not None and available < self.min_free_bytes:
+            return f"only {available // (1024 * 1024)} MB of memory available"
+        if pressure is not None and pressure > MAX_MEMORY_PRESSURE:
+            return f"memory pressure {pressure:.0f}%"
+        return None
+
+    @contextmanager
+    def admit(self, control=None, on_wait=None):
+        """Wait until a job may start, and hold its slot until the block ends
+
+        Yields the job's thread budget. on_wait(reason) is called when the job
+        has to wait for the load to drop. A JobControl given as `control` keeps
+        a paused job waiting and raises ConversionCancelled if it is cancelled.
+        """
+        reported = None
+        with self._condition:
+            while True:
+                if control:
+                    control.check()
+                if self._running < self.max_jobs and not (control and control.paused):
+                    # Like make -l: a job is always started when nothing else runs
+                    reason = self.pressure() if self._running else None
+                    if reason is None:
+                        break
+                    if on_wait and reason != reported:
+                        on_wait(reason)
+                    reported = reason
+                self._condition.wait(ADMIT_POLL)
+            self._running += 1
+        try:
+            yield self.threads
+        finally:
+            with self._condition:
+                self._running -= 1
+                self._condition.notify_all()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""Importing clips from files, folders and mounted AVCHD cards
+
+Every importer (the file dialog, the folder dialog and the command line) goes
+through collect_files(), so they all produce the same list:
+
+- Folders are walked in parallel, one directory listing per task, and files
+  are kept by extension. A card (or a copy of one) is only searched below its
+  PRIVATE/AVCHD/BDMV/STREAM folder, where the camcorder stores the clips.
+- Files found while walking are sniffed for a known container, so stray
+  files with a video extension are not imported.
+- A clip copied to several places is imported once. Files are grouped by
+  size first; only files sharing a size are read, to compare a partial hash.
+"""
+import os
+import sys
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
+
+from fingerprint import partial_hash
+
+# Extensions of the clips camcorders write (AVCHD, HDV and plain transport streams)
+VIDEO_EXTENSIONS = {".mts", ".m2ts", ".m2t", ".ts"}
+# Where clips live on an AVCHD card, relative to the card's root
+AVCHD_STREAM_DIR = os.path.join("PRIVATE", "AVCHD", "BDMV", "STREAM")
+
+# Transport stream packets: 188 bytes, or 192 with a timestamp prefix (M2TS/AVCHD)
+TS_SYNC_BYTE = 0x47
+SNIFF_PACKETS = 4
+# ISO base media (MP4/MOV) files start with a box such as ftyp
+ISO_BOX_TYPES = {b"ftyp", b"moov", b"mdat", b"free", b"wide"}
+# Directory listings and sniffs are I/O bound; slow cards don't like too many readers at once
+SCAN_WORKERS = 8
+
+
+@dataclass
+class IngestResult:
+    """Files found by an import, in a stable order"""
+    files: list = field(default_factory=list)
+    duplicates: dict = field(default_factory=dict)  # skipped path -> path of the same clip that was kept
+    rejected: list = field(default_factory=list)  # files with a video extension but no known container
+
+
+def is_video_name(path):
+    return os.path.splitext(path)[1].lower() in VIDEO_EXTENSIONS
+
+
+def sniff_container(path):
+    """Recognise a file's container from its first bytes: "mpegts", "m2ts", "mp4" or None"""
+    try:
+        with open(path, "rb") as f:
+            head = f.read(192 * SNIFF_PACKETS)
+    except OSError:
+        return None
+    for container, packet_size, offset in (("mpegts", 188, 0), ("m2ts", 192, 4)):
+        # Short files only need the packets they contain to line up
+        sync_positions = [offset + i * packet_size for i in range(SNIFF_PACKETS)
+                          if offset + i * packet_size < len(head)]
+        if len(head) >= packet_size and all(head[p] == TS_SYNC_BYTE for p in sync_positions):
+            return container
+    if head[4:8] in ISO_BOX_TYPES:
+        return "mp4"
+    return None
+
+
+def card_stream_dir(directory):
+    """The clip folder of an AVCHD card (or card copy) rooted at `directory`, or None"""
+    stream_dir = os.path.join(directory, AVCHD_STREAM_DIR)
+    return stream_dir if os.path.isdir(stream_dir) else None
+
+
+def _list_directory(directory):
+    """Video files and subdirectories of one directory (hidden entries are skipped)"""
+    files, subdirs = [], []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.name.startswith("."):
+                    continue
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(card_stream_dir(entry.path) or entry.path)
+                    elif entry.is_file() and is_video_name(entry.name):
+                        files.append(entry.path)
+                except OSError:
+                    pass
+    except OSError as e:
+        print(f"Error scanning {directory}: {str(e)}", file=sys.stderr)
+    return files, subdirs
+
+
+def scan_directories(directories, pool):
+    """Walk directory trees level by level, listing every directory of a level in parallel"""
+    files = []
+    seen = set()
+    level = []
+    for directory in directories:
+        directory = os.path.abspath(card_stream_dir(directory) or directory)
+        if directory not in seen:
+            seen.add(directory)
+            level.append(directory)
+    while level:
+        next_level = []
+        for level_files, subdirs in pool.map(_list_directory, level):
+            files.extend(level_files)
+            for subdir in subdirs:
+                real = os.path.realpath(subdir)
+                if real not in seen:
+                    seen.add(real)
+                    next_level.append(subdir)
+        level = next_level
+    return sorted(files)
+
+
+def find_duplicates(paths, known=(), pool=None):
+    """Map each path that repeats an earlier clip (or one of `known`) to the clip it repeats
+
+    Only files of equal size are hashed, so a batch without copies reads nothing.
+    """
+    by_size = {}
+    for path in [*known, *paths]:
+        try:
+            by_size.setdefault(os.path.getsize(path), []).append(path)
+        except OSError:
+            pass
+
+    candidates = [group for group in by_size.values() if len(group) > 1]
+    to_hash = sorted({path for group in candidates for path in group})
+
+    def hash_file(path):
+        try:
+            return partial_hash(path)
+        except OSError:
+            return None
+
+    hashes = dict(zip(to_hash, (pool.map if pool else map)(hash_file, to_hash)))
+    known = set(known)
+    duplicates = {}
+    for group in candidates:
+        first_by_hash = {}
+        for path in group:
+            digest = hashes.get(path)
+            if digest is None:
+                continue
+            original = first_by_hash.setdefault(digest, path)
+            if original != path and path not in known:
+                duplicates[path] = original
+    return duplicates
+
+
+def collect_files(inputs, known=(), max_workers=SCAN_WORKERS):
+    """Expand files and folders into the clips to import
+
+    Files named explicitly are taken as they are; folders are searched for
+    clips. Files already in the list (`known`) are left out, as are copies of
+    them.
+    """
+    known = [os.path.abspath(path) for path in known]
+    explicit, directories = [], []
+    for path in inputs:
+        path = os.path.abspath(path)
+        if os.path.isdir(path):
+            directories.append(path)
+        elif os.path.isfile(path):
+            explicit.append(path)
+
+    result = IngestResult()
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        found = scan_directories(directories, pool) if directories else []
+        containers = pool.map(sniff_container, found)
+        for path, container in zip(found, containers):
+            if container is None:
+                result.rejected.append(path)
+
+        rejected = set(result.rejected)
+        seen = set(known)
+        paths = []
+        for path in explicit + found:
+            if path not in seen and path not in rejected:
+                seen.add(path)
+                paths.append(path)
+
+        result.duplicates = find_duplicates(paths, known, pool)
+    result.files = [path for path in paths if path not in result.duplicates]
+    return result
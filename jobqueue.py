@@ -0,0 +1,710 @@
+#!/usr/bin/env python3
+"""Durable SQLite job queue shared by any number of worker processes
+
+Jobs record their input, output, conversion options, state, attempts and
+timings, so a batch survives the GUI being closed or crashing. Workers on the
+same machine, or on machines sharing the database over a network filesystem,
+claim jobs atomically and convert them one at a time:
+
+    python -m jobqueue work [--db PATH] [--exit-when-idle]
+    python -m jobqueue status [--db PATH] [--batch ID]
+
+Jobs can be cancelled, paused and resumed, and pending jobs moved to the front
+of the queue, while a batch runs:
+
+    python -m jobqueue cancel|pause|resume|prioritize [--db PATH] (--batch ID | JOB_ID...)
+
+These only write a request into the job's row; the worker running the job
+picks it up with its heartbeat and stops (SIGKILL, removing the partial
+output) or suspends (SIGSTOP/SIGCONT) its ffmpeg processes.
+
+Workers run at batch priority (below previews, see governor.py) and give
+ffmpeg a thread budget (--threads). A worker does not claim another job while
+the machine is overloaded and other jobs are running on it, so several
+workers back off together when the load average or memory pressure is high.
+
+A worker started with --stage-ahead N reserves the next N pending jobs and
+copies their inputs to local scratch space while it converts; it claims the
+jobs it reserved before others of the same priority.
+"""
+import os
+import sys
+import json
+import time
+import socket
+import sqlite3
+import argparse
+import threading
+import dataclasses
+
+from probe import MetadataCache, state_dir
+from engine import ConversionJob, ConversionOptions, convert_job, output_is_current, resolve_profile
+from runner import ConversionCancelled, JobControl
+from staging import StagingArea
+from governor import ResourceGovernor, BATCH, PRIORITY_CLASSES, DEFAULT_MAX_LOAD, set_priority
+from profiles import AUTO
+from telemetry import TelemetryLog
+
+# Job states
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+SKIPPED = "skipped"  # The output was already up to date
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (DONE, SKIPPED, FAILED, CANCELLED)
+
+# Requests written to a job's control column
+PAUSE = "pause"
+CANCEL = "cancel"
+
+DEFAULT_MAX_ATTEMPTS = 3
+# A running job whose worker has not reported for this long is handed to another worker
+STALE_SECONDS = 120
+# How often a worker writes progress (and its heartbeat) to the database
+HEARTBEAT_INTERVAL = 1.0
+# How often a worker checks whether another worker has chosen its batch's "auto" profile
+PROFILE_POLL_INTERVAL = 1.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    batch TEXT,
+    input_path TEXT NOT NULL,
+    inputs TEXT,
+    output_path TEXT NOT NULL,
+    options TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    progress REAL NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    worker TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    heartbeat REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, id);
+CREATE INDEX IF NOT EXISTS jobs_batch ON jobs (batch);
+CREATE TABLE IF NOT EXISTS batch_profiles (
+    batch TEXT PRIMARY KEY,
+    job_id INTEGER NOT NULL,
+    profile TEXT
+);
+"""
+
+# Columns added after the first release, with their definitions, for upgrading old databases
+MIGRATIONS = [
+    ("inputs", "TEXT"),
+    ("priority", "INTEGER NOT NULL DEFAULT 0"),  # Higher runs first
+    ("control", "TEXT"),  # PAUSE or CANCEL requested by the user, else NULL
+    ("staged_by", "TEXT"),  # Worker that copies the job's inputs to its scratch space
+    ("weight", "REAL"),  # Seconds of media the job converts (its share of a batch's progress)
+]
+
+
+def default_db_path():
+    return os.environ.get("VIDEOCONVERTER_QUEUE_DB") or os.path.join(state_dir(), "jobs.sqlite3")
+
+
+def options_to_json(options):
+    return json.dumps(dataclasses.asdict(options))
+
+
+def options_from_json(text):
+    """Rebuild ConversionOptions, ignoring fields this version does not know about"""
+    data = json.loads(text)
+    known = {f.name for f in dataclasses.fields(ConversionOptions)}
+    return ConversionOptions(**{k: v for k, v in data.items() if k in known})
+
+
+def job_weight(job, options):
+    """Seconds of media a ConversionJob converts (1 if unknown), for weighting progress"""
+    duration = job.duration
+    if options.trimmed:
+        end = options.trim_end or duration
+        if duration:
+            end = min(end, duration)
+        duration = end - options.trim_start
+    return duration if duration > 0 else 1.0
+
+
+class JobQueue:
+    """SQLite-backed job queue
+
+    Every operation is a short transaction, so many processes can share the
+    database. A JobQueue can also be shared by the threads of one process.
+    """
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or default_db_path()
+        db_dir = os.path.dirname(os.path.abspath(self.db_path))
+        os.makedirs(db_dir, exist_ok=True)
+        # Autocommit mode; write transactions are opened explicitly with BEGIN IMMEDIATE
+        self.conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self._lock = threading.RLock()
+        with self._lock:
+            self.conn.executescript(SCHEMA)
+            self._migrate()
+
+    def _migrate(self):
+        """Add columns that databases created by older versions are missing"""
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(jobs)")}
+        for name, definition in MIGRATIONS:
+            if name not in columns:
+                self.conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {definition}")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (state, priority DESC, id)")
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+    def _write(self, sql, params=()):
+        """Run a single write statement in its own immediate transaction"""
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = self.conn.execute(sql, params)
+                self.conn.execute("COMMIT")
+                return cursor
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def _read(self, sql, params=()):
+        with self._lock:
+            return [dict(row) for row in self.conn.execute(sql, params).fetchall()]
+
+    def enqueue(self, input_path, output_path, options, batch=None, max_attempts=DEFAULT_MAX_ATTEMPTS,
+                inputs=None, weight=None):
+        """Add a job and return its id
+
+        `inputs` lists every file of a spanned sequence (starting with input_path).
+        """
+        cursor = self._write(
+            "INSERT INTO jobs (batch, input_path, inputs, output_path, options, max_attempts, created_at, weight) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (batch, input_path, json.dumps(inputs or [input_path]), output_path, options_to_json(options),
+             max_attempts, time.time(), weight)
+        )
+        return cursor.lastrowid
+
+    def enqueue_many(self, jobs, batch=None, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        """Add (ConversionJob, ConversionOptions) pairs in a single transaction and return their ids
+
+        Each job's weight (see job_weight()) is stored with it.
+        """
+        now = time.time()
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                job_ids = [
+                    self.conn.execute(
+                        "INSERT INTO jobs (batch, input_path, inputs, output_path, options, max_attempts, created_at, "
+                        "weight) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (batch, job.input_path, json.dumps(job.input_paths), job.output_path,
+                         options_to_json(options), max_attempts, now, job_weight(job, options))
+                    ).lastrowid
+                    for job, options in jobs
+                ]
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        return job_ids
+
+    def claim(self, worker):
+        """Atomically take the pending job with the highest priority (oldest first), or None
+
+        Paused jobs are left in the queue until they are resumed. Among jobs of
+        the same priority, those whose inputs this worker staged come first.
+        """
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute(
+                    "SELECT * FROM jobs WHERE state = ? AND control IS NULL "
+                    "ORDER BY priority DESC, COALESCE(staged_by = ?, 0) DESC, id LIMIT 1",
+                    (PENDING, worker)
+                ).fetchone()
+                if row is None:
+                    self.conn.execute("COMMIT")
+                    return None
+                now = time.time()
+                self.conn.execute(
+                    "UPDATE jobs SET state = ?, worker = ?, attempts = attempts + 1, progress = 0, "
+                    "error = NULL, started_at = ?, heartbeat = ? WHERE id = ?",
+                    (RUNNING, worker, now, now, row["id"])
+                )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+            return self.get(row["id"])
+
+    def reserve_upcoming(self, worker, limit):
+        """Reserve up to `limit` of the next pending jobs that no other worker is staging
+
+        Returns them in the order this worker will claim them.
+        """
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self.conn.execute(
+                    "SELECT * FROM jobs WHERE state = ? AND control IS NULL "
+                    "AND (staged_by IS NULL OR staged_by = ?) "
+                    "ORDER BY priority DESC, COALESCE(staged_by = ?, 0) DESC, id LIMIT ?",
+                    (PENDING, worker, worker, limit)
+                ).fetchall()
+                self.conn.execute(
+                    f"UPDATE jobs SET staged_by = ? WHERE id IN ({', '.join('?' * len(rows))})",
+                    [worker, *(row["id"] for row in rows)]
+                )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+            return [dict(row) for row in rows]
+
+    def update_progress(self, job_id, progress):
+        """Record a running job's progress (also serves as the worker's heartbeat)"""
+        self._write(
+            "UPDATE jobs SET progress = ?, heartbeat = ? WHERE id = ? AND state = ?",
+            (progress, time.time(), job_id, RUNNING)
+        )
+
+    def finish(self, job_id, state=DONE):
+        """Mark a job as done (or skipped)"""
+        self._write(
+            "UPDATE jobs SET state = ?, progress = 1, finished_at = ? WHERE id = ?",
+            (state, time.time(), job_id)
+        )
+
+    def fail(self, job_id, error):
+        """Record a failure; the job is retried until it runs out of attempts"""
+        self._write(
+            "UPDATE jobs SET state = CASE WHEN attempts < max_attempts THEN ? ELSE ? END, "
+            "error = ?, finished_at = ? WHERE id = ?",
+            (PENDING, FAILED, error[-4000:], time.time(), job_id)
+        )
+
+    def mark_cancelled(self, job_id):
+        """Record that a job's worker stopped it"""
+        self._write(
+            "UPDATE jobs SET state = ?, control = NULL, finished_at = ? WHERE id = ?",
+            (CANCELLED, time.time(), job_id)
+        )
+
+    def _selection(self, job_ids=None, batch=None):
+        """WHERE clause and parameters for a list of jobs or a whole batch"""
+        if job_ids is not None:
+            job_ids = list(job_ids)
+            return f"id IN ({', '.join('?' * len(job_ids))})", job_ids
+        return "batch = ?", [batch]
+
+    def cancel(self, job_ids=None, batch=None):
+        """Cancel jobs: pending ones at once, running ones by asking their worker to stop them"""
+        where, params = self._selection(job_ids, batch)
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.conn.execute(
+                    f"UPDATE jobs SET state = ?, control = NULL, finished_at = ? WHERE state = ? AND {where}",
+                    [CANCELLED, time.time(), PENDING, *params]
+                )
+                self.conn.execute(
+                    f"UPDATE jobs SET control = ? WHERE state = ? AND {where}", [CANCEL, RUNNING, *params]
+                )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def pause(self, job_ids=None, batch=None):
+        """Pause jobs: pending ones are not claimed, running ones are suspended by their worker"""
+        where, params = self._selection(job_ids, batch)
+        self._write(
+            f"UPDATE jobs SET control = ? WHERE state IN (?, ?) AND control IS NULL AND {where}",
+            [PAUSE, PENDING, RUNNING, *params]
+        )
+
+    def resume(self, job_ids=None, batch=None):
+        """Undo pause()"""
+        where, params = self._selection(job_ids, batch)
+        self._write(f"UPDATE jobs SET control = NULL WHERE control = ? AND {where}", [PAUSE, *params])
+
+    def prioritize(self, job_ids):
+        """Move pending jobs to the front of the queue, in the given order"""
+        job_ids = list(job_ids)
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                top = self.conn.execute("SELECT COALESCE(MAX(priority), 0) FROM jobs").fetchone()[0]
+                for offset, job_id in enumerate(job_ids):
+                    self.conn.execute(
+                        "UPDATE jobs SET priority = ? WHERE id = ? AND state = ?",
+                        (top + len(job_ids) - offset, job_id, PENDING)
+                    )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def control(self, job_id):
+        """The pause or cancel request of a job, or None"""
+        rows = self._read("SELECT control FROM jobs WHERE id = ?", (job_id,))
+        return rows[0]["control"] if rows else None
+
+    def claim_batch_profile(self, batch, job_id):
+        """Take on choosing the "auto" profile of a batch, unless another job already has
+
+        Returns (profile, claimed): the profile name once it has been chosen,
+        else whether the worker running `job_id` should choose it now. A claim
+        lapses when its job stops running (see requeue_stale()), so another
+        worker takes over from one that crashed.
+        """
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute(
+                    "SELECT p.job_id, p.profile, j.state FROM batch_profiles p LEFT JOIN jobs j ON j.id = p.job_id "
+                    "WHERE p.batch = ?", (batch,)
+                ).fetchone()
+                if row is not None and (row["profile"] or (row["job_id"] != job_id and row["state"] == RUNNING)):
+                    self.conn.execute("COMMIT")
+                    return row["profile"], False
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO batch_profiles (batch, job_id, profile) VALUES (?, ?, NULL)",
+                    (batch, job_id)
+                )
+                self.conn.execute("COMMIT")
+                return None, True
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def store_batch_profile(self, batch, profile):
+        """Record the profile chosen for a batch and set it on the batch's pending jobs"""
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.conn.execute("UPDATE batch_profiles SET profile = ? WHERE batch = ?", (profile, batch))
+                self.conn.execute(
+                    "UPDATE jobs SET options = json_set(options, '$.profile', ?, '$.requested_profile', ?) "
+                    "WHERE batch = ? AND state = ?",
+                    (profile, AUTO, batch, PENDING)
+                )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def release_batch_profile(self, batch, job_id):
+        """Give up a claim from claim_batch_profile() without choosing a profile"""
+        self._write(
+            "DELETE FROM batch_profiles WHERE batch = ? AND job_id = ? AND profile IS NULL", (batch, job_id)
+        )
+
+    def requeue_stale(self, stale_seconds=STALE_SECONDS):
+        """Hand jobs of workers that stopped reporting (crashed or killed) back to the queue
+
+        Jobs that were being cancelled are cancelled instead; paused jobs stay paused.
+        """
+        cutoff = time.time() - stale_seconds
+        self._write(
+            "UPDATE jobs SET state = CASE WHEN control = ? THEN ? WHEN attempts < max_attempts THEN ? ELSE ? END, "
+            "control = CASE WHEN control = ? THEN NULL ELSE control END, "
+            "error = 'worker stopped responding' WHERE state = ? AND heartbeat < ?",
+            (CANCEL, CANCELLED, PENDING, FAILED, CANCEL, RUNNING, cutoff)
+        )
+
+    def get(self, job_id):
+        rows = self._read("SELECT * FROM jobs WHERE id = ?", (job_id,))
+        return rows[0] if rows else None
+
+    def jobs(self, batch=None):
+        """All jobs (of one batch, if given) in the order they were queued"""
+        if batch is None:
+            return self._read("SELECT * FROM jobs ORDER BY id")
+        return self._read("SELECT * FROM jobs WHERE batch = ? ORDER BY id", (batch,))
+
+    def recent_jobs(self, since):
+        """Jobs that are pending or running, or finished at or after `since`
+
+        Finished jobs do not change any more, so this is all that can have
+        changed since a poll at that time (see api.py).
+        """
+        return self._read(
+            "SELECT * FROM jobs WHERE state IN (?, ?) OR finished_at >= ? ORDER BY id", (PENDING, RUNNING, since)
+        )
+
+    def unfinished_batches(self):
+        """Batches that still have pending or running jobs"""
+        rows = self._read(
+            "SELECT DISTINCT batch FROM jobs WHERE state IN (?, ?) ORDER BY batch", (PENDING, RUNNING)
+        )
+        return [row["batch"] for row in rows]
+
+    def count(self, state):
+        return self._read("SELECT COUNT(*) AS n FROM jobs WHERE state = ?", (state,))[0]["n"]
+
+    def running_on(self, host):
+        """Number of jobs running on a machine (workers are named host:pid)"""
+        return self._read("SELECT COUNT(*) AS n FROM jobs WHERE state = ? AND worker LIKE ?",
+                          (RUNNING, host + ":%"))[0]["n"]
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def job_inputs(job):
+    """Every input file of a queue row"""
+    return json.loads(job["inputs"] or "null") or [job["input_path"]]
+
+
+def conversion_job(job, metadata_cache):
+    """Build the ConversionJob for a queue row
+
+    Raises if a file of a spanned sequence cannot be probed, since the
+    sequence cannot be joined without the metadata of every file.
+    """
+    inputs = job_inputs(job)
+    try:
+        metadata = metadata_cache.get(job["input_path"])
+    except Exception as e:
+        print(f"Error probing {job['input_path']}: {str(e)}", file=sys.stderr)
+        metadata = None
+
+    parts = [metadata_cache.get(path) for path in inputs] if len(inputs) > 1 else []
+    return ConversionJob(job["input_path"], job["output_path"], metadata, parts)
+
+
+def resolve_batch_profile(queue, job, options, metadata_cache, control=None):
+    """Resolve an "auto" profile once for the job's whole batch and store it for the other jobs
+
+    Only one worker benchmarks a batch; workers running its other jobs wait
+    for that choice, so concurrent benchmarks do not compete for the machine
+    and the batch is not converted with a mix of profiles. The deadline counts
+    from when the batch was queued, so workers that start late choose faster
+    profiles.
+    """
+    batch = job["batch"]
+    if batch is None:
+        return _resolve_profile_for([job], job, options, metadata_cache)
+    while True:
+        profile, claimed = queue.claim_batch_profile(batch, job["id"])
+        if profile is not None:
+            return dataclasses.replace(options, profile=profile, requested_profile=AUTO)
+        if claimed:
+            break
+        if control is not None:
+            control.check()
+        time.sleep(PROFILE_POLL_INTERVAL)
+
+    try:
+        batch_jobs = [row for row in queue.jobs(batch) if row["state"] in (PENDING, RUNNING)]
+        resolved = _resolve_profile_for(batch_jobs, job, options, metadata_cache)
+    except Exception:
+        queue.release_batch_profile(batch, job["id"])
+        raise
+    queue.store_batch_profile(batch, resolved.profile)
+    return resolved
+
+
+def _resolve_profile_for(batch_jobs, job, options, metadata_cache):
+    """Benchmark the profiles on the given queue rows and return `options` with the chosen one
+
+    Jobs whose output is up to date are skipped whatever the profile, so they are left out.
+    """
+    jobs = []
+    for row in batch_jobs:
+        try:
+            conversion = conversion_job(row, metadata_cache)
+        except Exception as e:
+            print(f"Error probing {row['input_path']}: {str(e)}", file=sys.stderr)
+            continue
+        if not output_is_current(conversion, options_from_json(row["options"])):
+            jobs.append(conversion)
+
+    deadline = None
+    if options.deadline:
+        started = min(row["created_at"] for row in batch_jobs)
+        deadline = options.deadline - (time.time() - started)
+    resolved, measurements = resolve_profile(jobs, options, deadline)
+    print(json.dumps({"event": "profile", "batch": job["batch"], "profile": resolved.profile,
+                      "measured_fps": {k: round(v, 1) for k, v in measurements.items()}}), flush=True)
+    return resolved
+
+
+def process_job(queue, job, metadata_cache, telemetry=None, staging=None, governor=None):
+    """Convert one claimed job and record the outcome"""
+    options = options_from_json(job["options"])
+    try:
+        job_to_run = conversion_job(job, metadata_cache)
+    except Exception as e:
+        queue.fail(job["id"], f"Error probing spanned sequence: {str(e)}")
+        return False
+
+    # A separate heartbeat thread keeps the job alive even while ffmpeg reports no progress
+    # (or is paused), and carries out the pause, resume and cancel requests stored in the queue
+    progress = [0.0]
+    stop_heartbeat = threading.Event()
+    control = JobControl()
+
+    def on_progress(fraction):
+        progress[0] = fraction
+
+    def heartbeat():
+        while not stop_heartbeat.wait(HEARTBEAT_INTERVAL):
+            try:
+                queue.update_progress(job["id"], progress[0])
+                request = queue.control(job["id"])
+            except sqlite3.Error as e:
+                print(f"Error updating job {job['id']}: {str(e)}", file=sys.stderr)
+                continue
+            if request == CANCEL and not control.cancelled:
+                control.cancel()
+            elif request == PAUSE and not control.paused:
+                control.pause()
+            elif request is None and control.paused:
+                control.resume()
+
+    heartbeat_thread = threading.Thread(target=heartbeat, daemon=True)
+    heartbeat_thread.start()
+    try:
+        # Resolved with the heartbeat running, so the job is not taken for stale while it benchmarks or waits
+        if options.profile == AUTO and not output_is_current(job_to_run, options):
+            options = resolve_batch_profile(queue, job, options, metadata_cache, control)
+        os.makedirs(os.path.dirname(os.path.abspath(job["output_path"])), exist_ok=True)
+        converted = convert_job(job_to_run, options, on_progress, telemetry, control, staging, governor)
+    except ConversionCancelled:
+        queue.mark_cancelled(job["id"])
+        return False
+    except Exception as e:
+        queue.fail(job["id"], str(e))
+        return False
+    finally:
+        stop_heartbeat.set()
+        heartbeat_thread.join()
+    queue.finish(job["id"], DONE if converted else SKIPPED)
+    return True
+
+
+def work(db_path=None, exit_when_idle=False, poll_interval=2.0, prometheus_path=None,
+         stage_ahead=0, scratch_dir=None, scratch_max_bytes=None, threads=0, max_load=None, priority=BATCH):
+    """Worker loop: claim and convert jobs until stopped (or until the queue is empty)
+
+    With stage_ahead > 0, the inputs of the next jobs are copied to local
+    scratch space while the current job converts. No job is claimed while
+    the machine is overloaded and other jobs are running on it.
+    """
+    set_priority(priority)
+    governor = ResourceGovernor(1, threads, max_load)
+    queue = JobQueue(db_path)
+    metadata_cache = MetadataCache()
+    telemetry = TelemetryLog(prometheus_path=prometheus_path)
+    name = worker_name()
+    staging = StagingArea(stage_ahead, scratch_max_bytes, scratch_dir) if stage_ahead > 0 else None
+    waiting_for = None
+    try:
+        while True:
+            queue.requeue_stale()
+            # Like the governor within a process: never wait when nothing else runs here
+            reason = governor.pressure() if queue.running_on(socket.gethostname()) else None
+            if reason is not None:
+                if reason != waiting_for:
+                    print(json.dumps({"event": "waiting", "reason": reason}), flush=True)
+                waiting_for = reason
+                time.sleep(poll_interval)
+                continue
+            waiting_for = None
+
+            job = queue.claim(name)
+            if job is None:
+                if exit_when_idle:
+                    return
+                time.sleep(poll_interval)
+                continue
+
+            print(json.dumps({"event": "claimed", "job": job["id"], "file": job["input_path"]}), flush=True)
+            if staging:
+                upcoming = queue.reserve_upcoming(name, stage_ahead)
+                staging.stage([*job_inputs(job), *(path for row in upcoming for path in job_inputs(row))])
+            ok = process_job(queue, job, metadata_cache, telemetry, staging, governor)
+            metadata_cache.save()
+            event = "done" if ok else "cancelled" if queue.get(job["id"])["state"] == CANCELLED else "failed"
+            print(json.dumps({"event": event, "job": job["id"]}), flush=True)
+    finally:
+        if staging:
+            staging.close()
+        queue.close()
+
+
+def main(argv=None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(prog="python -m jobqueue", description="Video conversion job queue")
+    parser.add_argument("--db", default=None, help=f"queue database (default: {default_db_path()})")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    work_parser = commands.add_parser("work", help="run a worker that converts queued jobs")
+    work_parser.add_argument("--exit-when-idle", action="store_true", help="exit once no jobs are pending")
+    work_parser.add_argument("--poll-interval", type=float, default=2.0, help="seconds between polls when idle")
+    work_parser.add_argument("--prometheus-file", default=None,
+                             help="export telemetry totals to this Prometheus textfile "
+                                  "(default: $VIDEOCONVERTER_PROMETHEUS_FILE)")
+    work_parser.add_argument("--stage-ahead", type=int, default=0, metavar="N",
+                             help="copy the inputs of the next N jobs to local scratch space while converting")
+    work_parser.add_argument("--scratch-dir", default=None,
+                             help="where staged inputs are copied (default: $VIDEOCONVERTER_SCRATCH_DIR "
+                                  "or the temp dir)")
+    work_parser.add_argument("--scratch-max-mb", type=int, default=None,
+                             help="cap for staged inputs (default: $VIDEOCONVERTER_SCRATCH_MB or 8192)")
+    work_parser.add_argument("--threads", type=int, default=0,
+                             help="ffmpeg threads per job (default: every CPU core)")
+    work_parser.add_argument("--max-load", type=float, default=None,
+                             help="do not claim a job while the load average per CPU core is above this "
+                                  f"(default: $VIDEOCONVERTER_MAX_LOAD or {DEFAULT_MAX_LOAD:g}; 0: no limit)")
+    work_parser.add_argument("--priority", choices=PRIORITY_CLASSES, default=BATCH,
+                             help="CPU and I/O priority of the conversions (default: batch)")
+
+    status_parser = commands.add_parser("status", help="print jobs as JSON lines")
+    status_parser.add_argument("--batch", default=None, help="only show jobs from this batch")
+
+    for command, help_text in (
+        ("cancel", "cancel jobs (running ones are stopped and their partial output removed)"),
+        ("pause", "pause jobs (running ones are suspended, pending ones are not started)"),
+        ("resume", "resume paused jobs"),
+        ("prioritize", "move pending jobs to the front of the queue, in the order given"),
+    ):
+        control_parser = commands.add_parser(command, help=help_text)
+        target = control_parser.add_mutually_exclusive_group(required=True)
+        target.add_argument("--batch", default=None, help="every job of this batch")
+        target.add_argument("job_ids", nargs="*", type=int, default=[], metavar="JOB_ID", help="job ids")
+
+    args = parser.parse_args(argv)
+    if args.command == "work":
+        work(args.db, args.exit_when_idle, args.poll_interval, args.prometheus_file, args.stage_ahead,
+             args.scratch_dir, args.scratch_max_mb * 1024 * 1024 if args.scratch_max_mb else None,
+             args.threads, args.max_load, args.priority)
+    elif args.command == "status":
+        queue = JobQueue(args.db)
+        for job in queue.jobs(args.batch):
+            print(json.dumps(job))
+        queue.close()
+    else:
+        queue = JobQueue(args.db)
+        if args.command == "prioritize":
+            job_ids = args.job_ids or [job["id"] for job in queue.jobs(args.batch) if job["state"] == PENDING]
+            queue.prioritize(job_ids)
+        else:
+            selection = {"batch": args.batch} if args.batch else {"job_ids": args.job_ids}
+            getattr(queue, args.command)(**selection)
+        queue.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
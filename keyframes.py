@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""Per-file keyframe index, cached on disk by content fingerprint
+
+Splitting a clip into parallel chunks and trimming it without re-encoding
+both need to know where its keyframes are. ffprobe finds them with a
+packet-level scan (no decoding), but that still reads the whole file, so the
+result is kept in ~/.cache/VideoConverter/keyframes, one small JSON file per
+clip. Entries are keyed by the clip's size and partial hash (see
+fingerprint.py), like thumbnails, so a renamed or staged copy of a clip finds
+its index too.
+"""
+import os
+import sys
+import json
+import hashlib
+import threading
+import functools
+import subprocess
+
+from probe import cache_dir
+from fingerprint import partial_hash
+
+# Bump whenever the index layout changes so old entries are not reused
+KEYFRAME_INDEX_VERSION = 1
+
+
+def probe_keyframes(video_path):
+    """Return the presentation times of the video keyframes (packet-level scan, no decoding)"""
+    cmd = [
+        "ffprobe", "-v", "error", "-select_streams", "v:0",
+        "-show_entries", "packet=pts_time,flags", "-of", "csv=p=0", video_path
+    ]
+    output = subprocess.check_output(cmd, universal_newlines=True)
+
+    keyframes = set()
+    for line in output.splitlines():
+        parts = line.strip().split(",")
+        if len(parts) >= 2 and "K" in parts[1]:
+            try:
+                keyframes.add(float(parts[0]))
+            except ValueError:
+                pass  # pts_time can be N/A
+    return sorted(keyframes)
+
+
+class KeyframeIndex:
+    """Keyframe times of clips, scanned once per clip and kept on disk
+
+    The index is safe to use from several threads; a clip that two threads
+    ask for at once may be scanned twice, but both get the same answer.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory or os.path.join(cache_dir(), "keyframes")
+        os.makedirs(self.directory, exist_ok=True)
+        # Keyframe lists by (path, size, mtime), so a clip is only read once per session
+        self._keyframes = {}
+        self._lock = threading.Lock()
+
+    def _entry_path(self, video_path, stat):
+        content = f"{stat.st_size}:{partial_hash(video_path, stat.st_size)}:{KEYFRAME_INDEX_VERSION}"
+        return os.path.join(self.directory, hashlib.sha1(content.encode("ascii")).hexdigest() + ".json")
+
+    def get(self, video_path):
+        """Return the keyframe times (in seconds, as ffprobe reports them) of a clip's first video stream
+
+        Raises subprocess.CalledProcessError or OSError if the clip cannot be read.
+        """
+        stat = os.stat(video_path)
+        identity = (os.path.abspath(video_path), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            keyframes = self._keyframes.get(identity)
+        if keyframes is not None:
+            return keyframes
+
+        entry_path = self._entry_path(video_path, stat)
+        try:
+            with open(entry_path, "r") as f:
+                keyframes = json.load(f)["keyframes"]
+        except (OSError, ValueError, KeyError, TypeError):
+            keyframes = probe_keyframes(video_path)
+            tmp_path = f"{entry_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                with open(tmp_path, "w") as f:
+                    json.dump({"keyframes": keyframes}, f)
+                os.replace(tmp_path, entry_path)
+            except OSError as e:
+                print(f"Error saving keyframe index: {str(e)}", file=sys.stderr)
+
+        with self._lock:
+            self._keyframes[identity] = keyframes
+        return keyframes
+
+
+@functools.lru_cache(maxsize=None)
+def default_index():
+    """The keyframe index shared by everything in this process"""
+    return KeyframeIndex()
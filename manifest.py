@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""Output manifest for incremental batch conversion
+
+Every output directory gets a small JSON manifest that records, per output
+file, the fingerprints of its inputs and the conversion options it was made
+with. Re-running a batch skips every job whose output is still current.
+"""
+import os
+import json
+import time
+import contextlib
+
+from fingerprint import file_fingerprint, matches_fingerprint
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; the manifest is then updated without locking
+    fcntl = None
+
+MANIFEST_NAME = ".videoconverter-manifest.json"
+MANIFEST_VERSION = 1
+
+
+class OutputManifest:
+    """Manifest of the outputs in one directory
+
+    Several worker processes may convert into the same directory, so every
+    update re-reads the manifest under an exclusive lock before writing it back.
+    """
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, MANIFEST_NAME)
+
+    def _load(self):
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if data.get("version") != MANIFEST_VERSION:
+            return {}
+        return data.get("entries", {})
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """Hold an exclusive lock on the manifest while updating it"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        with open(self.path + ".lock", "a") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def is_current(self, output_path, input_paths, options_key):
+        """True if output_path exists and was made from these inputs with these options"""
+        entry = self._load().get(os.path.basename(output_path))
+        if not entry or entry.get("options") != options_key:
+            return False
+
+        try:
+            stat = os.stat(output_path)
+        except OSError:
+            return False
+        if stat.st_size != entry.get("output_size") or stat.st_mtime_ns != entry.get("output_mtime_ns"):
+            return False
+
+        fingerprints = entry.get("inputs", [])
+        if len(fingerprints) != len(input_paths):
+            return False
+        return all(matches_fingerprint(p, fp) for p, fp in zip(input_paths, fingerprints))
+
+    def record(self, output_path, input_paths, options_key):
+        """Record a freshly converted output"""
+        fingerprints = [file_fingerprint(p) for p in input_paths]
+        stat = os.stat(output_path)
+        entry = {
+            "inputs": fingerprints,
+            "input_paths": [os.path.abspath(p) for p in input_paths],
+            "options": options_key,
+            "output_size": stat.st_size,
+            "output_mtime_ns": stat.st_mtime_ns,
+            "converted_at": time.time(),
+        }
+
+        with self._locked():
+            entries = self._load()
+            entries[os.path.basename(output_path)] = entry
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"version": MANIFEST_VERSION, "entries": entries}, f, indent=1)
+            os.replace(tmp_path, self.path)
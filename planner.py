@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""Stream-aware codec decisions: copy what MP4 can hold, transcode only what it cannot
+
+The planner looks at every stream from the probe data (codec, profile, frame
+rate) and decides per stream whether to copy it, transcode it, or drop it
+because MP4 cannot carry it. The frame rate is never forced: copied streams
+keep their timestamps, and encoded streams keep the source rate.
+"""
+from dataclasses import dataclass, field
+
+from profiles import get_profile
+
+# Video codecs that MP4 holds and common players decode
+MP4_VIDEO_CODECS = {"h264", "hevc", "av1", "mpeg4"}
+# Audio codecs that can be copied into MP4 without hurting player compatibility.
+# AC-3 (the usual AVCHD audio) is allowed by the muxer, but many players cannot decode it.
+MP4_AUDIO_CODECS = {"aac", "mp3", "alac"}
+
+# Audio settings used whenever an audio stream has to be transcoded (video uses the job's profile)
+AUDIO_ENCODER_ARGS = ["aac"]
+AUDIO_BITRATE = "192k"  # Better audio quality
+
+COPY = "copy"
+TRANSCODE = "transcode"
+DROP = "drop"
+
+
+@dataclass
+class StreamDecision:
+    """What happens to one input stream"""
+    index: int
+    codec_type: str
+    codec_name: str
+    action: str
+    reason: str
+    args: list = field(default_factory=list)  # Output options, with output stream specifiers
+
+    def describe(self):
+        return {
+            "stream": self.index,
+            "type": self.codec_type,
+            "codec": self.codec_name,
+            "action": self.action,
+            "reason": self.reason,
+        }
+
+
+@dataclass
+class ConversionPlan:
+    """Per-stream decisions for one job"""
+    streams: list = field(default_factory=list)
+
+    @property
+    def kept(self):
+        return [d for d in self.streams if d.action != DROP]
+
+    def map_args(self, codec_type=None):
+        """-map options selecting the streams that are kept (only those of one type, if given)"""
+        args = []
+        for decision in self.kept:
+            if codec_type is None or decision.codec_type == codec_type:
+                args.extend(["-map", f"0:{decision.index}"])
+        return args
+
+    def video_args(self):
+        return [arg for d in self.kept if d.codec_type == "video" for arg in d.args]
+
+    def audio_args(self):
+        return [arg for d in self.kept if d.codec_type == "audio" for arg in d.args]
+
+    def has_audio(self):
+        return any(d.codec_type == "audio" for d in self.kept)
+
+    def transcodes_video(self):
+        return any(d.codec_type == "video" and d.action == TRANSCODE for d in self.kept)
+
+    def describe(self):
+        return [d.describe() for d in self.streams]
+
+
+def _video_decision(stream, output_index, options):
+    spec = f"v:{output_index}"
+    details = f"{stream.codec_name}"
+    if stream.profile:
+        details += f" ({stream.profile})"
+    if stream.fps > 0:
+        details += f" at {stream.fps:.3f} fps"
+
+    if options.burn_rotation:
+        args = [f"-c:{spec}", *get_profile(options.profile).video_encoder_args(),
+                # Rotate 90 degrees counterclockwise and change aspect ratio from 16:9 to 9:16
+                "-vf", "transpose=2", "-aspect", "9:16"]
+        return StreamDecision(stream.index, "video", stream.codec_name, TRANSCODE,
+                               f"{details}: rotation is burned in", args)
+    if stream.codec_name in MP4_VIDEO_CODECS:
+        # Copy the video stream without re-encoding to preserve original quality
+        return StreamDecision(stream.index, "video", stream.codec_name, COPY,
+                              f"{details}: MP4 compatible, copied", [f"-c:{spec}", "copy"])
+    return StreamDecision(stream.index, "video", stream.codec_name, TRANSCODE,
+                          f"{details}: not MP4 compatible", [f"-c:{spec}", *get_profile(options.profile).video_encoder_args()])
+
+
+def _audio_decision(stream, output_index):
+    spec = f"a:{output_index}"
+    details = f"{stream.codec_name}"
+    if stream.profile:
+        details += f" ({stream.profile})"
+    if stream.codec_name in MP4_AUDIO_CODECS:
+        return StreamDecision(stream.index, "audio", stream.codec_name, COPY,
+                              f"{details}: MP4 compatible, copied", [f"-c:{spec}", "copy"])
+    args = [f"-c:{spec}", *AUDIO_ENCODER_ARGS, f"-b:{spec}", AUDIO_BITRATE]
+    return StreamDecision(stream.index, "audio", stream.codec_name, TRANSCODE,
+                          f"{details}: converted to AAC for compatibility", args)
+
+
+def plan_streams(metadata, options):
+    """Decide copy/transcode/drop for every stream of a probed file
+
+    `options` is the job's ConversionOptions. Returns None without metadata;
+    fallback_args() then covers ffmpeg's default stream selection.
+    """
+    if metadata is None:
+        return None
+
+    plan = ConversionPlan()
+    video_count = audio_count = 0
+    for stream in metadata.streams:
+        if stream.codec_type == "video" and video_count == 0:
+            plan.streams.append(_video_decision(stream, video_count, options))
+            video_count += 1
+        elif stream.codec_type == "audio":
+            plan.streams.append(_audio_decision(stream, audio_count))
+            audio_count += 1
+        else:
+            reason = "extra video stream" if stream.codec_type == "video" else \
+                f"{stream.codec_type or 'unknown'} stream not supported in MP4"
+            plan.streams.append(StreamDecision(stream.index, stream.codec_type, stream.codec_name, DROP, reason))
+    return plan
+
+
+def fallback_args(options):
+    """(video, audio) arguments used when a file has no probe data"""
+    if options.burn_rotation:
+        video_args = ["-c:v", *get_profile(options.profile).video_encoder_args(), "-vf", "transpose=2", "-aspect", "9:16"]
+    else:
+        video_args = ["-c:v", "copy"]
+    return video_args, ["-c:a", *AUDIO_ENCODER_ARGS, "-b:a", AUDIO_BITRATE]
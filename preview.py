@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""Preview command building, on-disk LRU preview cache and neighbor prefetch"""
+import os
+import sys
+import json
+import time
+import glob
+import hashlib
+import threading
+import uuid
+from collections import deque
+
+from probe import cache_dir
+from profiles import PREVIEW_PROFILE
+from supervisor import ProcessSupervisor, SupervisorError
+from governor import BACKGROUND
+
+# Bump whenever the preview encoding changes so old cache entries are not reused
+PREVIEW_VERSION = 1
+PREVIEW_DURATION = 30
+# A background preview that takes longer than this is stuck
+GENERATE_TIMEOUT = 300
+# Temporary files older than this were left by a preview encode that was killed or crashed
+STALE_PART_SECONDS = GENERATE_TIMEOUT * 2
+
+# Default cap for the preview cache, overridable with VIDEOCONVERTER_PREVIEW_CACHE_MB
+DEFAULT_CACHE_MB = 1024
+
+
+def build_preview_command(video_path, metadata=None, duration=PREVIEW_DURATION, output="pipe:1"):
+    """Build the ffmpeg command that writes a fragmented MP4 preview
+
+    H.264 video is remuxed without re-encoding; anything else (or a file we
+    have no metadata for yet) gets a fast libx264 encode. By default the
+    preview is streamed to stdout.
+    """
+    video_stream = metadata.video_stream if metadata else None
+    if video_stream and video_stream.codec_name == "h264":
+        video_args = ["-c:v", "copy"]
+    else:
+        video_args = ["-c:v", *PREVIEW_PROFILE.video_encoder_args()]
+
+    return [
+        "ffmpeg", "-v", "error", "-nostdin", "-i", video_path,
+        "-t", str(duration),  # Only the first part of the clip is previewed
+        "-map", "0:v:0", "-map", "0:a:0?",
+        *video_args,
+        "-c:a", "aac", "-b:a", "192k",  # Higher audio bitrate
+        "-ar", "48000",  # Standard audio sample rate
+        # Fragmented MP4 can be played while it is still being written
+        "-f", "mp4", "-movflags", "frag_keyframe+empty_moov+default_base_moof",
+        "-y", output
+    ]
+
+
+class PreviewCache:
+    """Size-capped LRU cache of preview MP4s on disk
+
+    Entries are keyed by the source file's identity (path, size, mtime) and the
+    preview parameters. A file's modification time doubles as its LRU stamp, and
+    the least recently used entries are evicted once the cache exceeds max_bytes.
+    """
+
+    def __init__(self, directory=None, max_bytes=None):
+        self.directory = directory or os.path.join(cache_dir(), "previews")
+        os.makedirs(self.directory, exist_ok=True)
+        if max_bytes is None:
+            max_mb = int(os.environ.get("VIDEOCONVERTER_PREVIEW_CACHE_MB", DEFAULT_CACHE_MB))
+            max_bytes = max_mb * 1024 * 1024
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def key(self, video_path, duration=PREVIEW_DURATION):
+        """Cache key for a source file and the preview parameters"""
+        stat = os.stat(video_path)
+        identity = [os.path.abspath(video_path), stat.st_size, stat.st_mtime_ns, duration, PREVIEW_VERSION]
+        return hashlib.sha1(json.dumps(identity).encode("utf-8")).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.directory, key + ".mp4")
+
+    def get(self, video_path, duration=PREVIEW_DURATION):
+        """Return the cached preview for a file (marking it as recently used), or None"""
+        try:
+            entry = self._entry_path(self.key(video_path, duration))
+            os.utime(entry)
+            return entry
+        except OSError:
+            return None
+
+    def new_temp_path(self, video_path, duration=PREVIEW_DURATION):
+        """Return a temporary path to write a new entry to before commit()"""
+        key = self.key(video_path, duration)
+        return os.path.join(self.directory, f"{key}.{uuid.uuid4().hex}.part")
+
+    def commit(self, temp_path):
+        """Move a finished temporary file into the cache and enforce the size cap"""
+        key = os.path.basename(temp_path).split(".")[0]
+        try:
+            os.replace(temp_path, self._entry_path(key))
+        except OSError as e:
+            print(f"Error storing preview {temp_path}: {str(e)}", file=sys.stderr)
+            return
+        self.evict()
+
+    def discard(self, temp_path):
+        """Remove an unfinished temporary file"""
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits in max_bytes
+
+        Temporary files of previews still being written count towards the cap;
+        those left by encodes that were killed or crashed are deleted.
+        """
+        with self._lock:
+            entries = []
+            total = 0
+            for entry in glob.glob(os.path.join(self.directory, "*.mp4")) + \
+                    glob.glob(os.path.join(self.directory, "*.part")):
+                try:
+                    stat = os.stat(entry)
+                except OSError:
+                    continue
+                if entry.endswith(".part"):
+                    if time.time() - stat.st_mtime > STALE_PART_SECONDS:
+                        self.discard(entry)
+                    else:
+                        total += stat.st_size
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry))
+                total += stat.st_size
+
+            for _, size, entry in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.unlink(entry)
+                    total -= size
+                except OSError as e:
+                    print(f"Error evicting preview {entry}: {str(e)}", file=sys.stderr)
+
+    def generate(self, video_path, metadata=None, duration=PREVIEW_DURATION, low_priority=True):
+        """Encode a preview straight into the cache and return its path (None on failure)"""
+        temp_path = self.new_temp_path(video_path, duration)
+        cmd = build_preview_command(video_path, metadata, duration, output=temp_path)
+        supervisor = ProcessSupervisor(
+            cmd, timeout=GENERATE_TIMEOUT,
+            priority=BACKGROUND if low_priority else None
+        )
+        try:
+            ok = supervisor.run() == 0
+        except SupervisorError as e:
+            ok = False
+            supervisor.stderr_lines.append(str(e))
+        if not ok:
+            self.discard(temp_path)
+            print(f"Preview generation failed for {video_path}: {supervisor.stderr_tail.strip()}", file=sys.stderr)
+            return None
+        self.commit(temp_path)
+        return self.get(video_path, duration)
+
+
+class PreviewPrefetcher:
+    """Low-priority background thread that fills the preview cache ahead of the user
+
+    Only the most recent request matters while browsing, so queueing new
+    neighbors replaces anything that has not started yet.
+    """
+
+    def __init__(self, preview_cache, metadata_cache):
+        self.preview_cache = preview_cache
+        self.metadata_cache = metadata_cache
+        self._queue = deque()
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._thread = None
+
+    def prefetch(self, video_paths):
+        """Replace the pending work with previews for the given files"""
+        with self._condition:
+            self._queue.clear()
+            self._queue.extend(p for p in video_paths if p.lower().endswith(".mts"))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._work, daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def clear(self):
+        """Drop pending prefetches"""
+        with self._condition:
+            self._queue.clear()
+
+    def stop(self):
+        """Stop the prefetch thread once the current preview finishes"""
+        with self._condition:
+            self._stopped = True
+            self._queue.clear()
+            self._condition.notify()
+
+    def _work(self):
+        """Prefetch thread loop"""
+        while True:
+            with self._condition:
+                while not self._queue and not self._stopped:
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                video_path = self._queue.popleft()
+
+            try:
+                if self.preview_cache.get(video_path):
+                    continue
+                try:
+                    metadata = self.metadata_cache.get(video_path)
+                except Exception:
+                    metadata = None  # Still worth generating an encoded preview
+                self.preview_cache.generate(video_path, metadata)
+            except Exception as e:
+                print(f"Preview prefetch error for {video_path}: {str(e)}", file=sys.stderr)
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""Single-pass ffprobe metadata engine with a persistent on-disk cache"""
+import os
+import sys
+import json
+import subprocess
+import threading
+import time
+from dataclasses import dataclass, field, asdict
+
+# Bump whenever the record layout (or how a field is derived) changes so stale caches are discarded
+CACHE_VERSION = 2
+
+
+class ProbeError(Exception):
+    """Raised when ffprobe cannot read a file"""
+
+
+def cache_dir():
+    """Return (and create) the directory used for VideoConverter's on-disk caches"""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    path = os.path.join(base, "VideoConverter")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def state_dir():
+    """Return (and create) the directory used for VideoConverter's persistent state"""
+    base = os.environ.get("XDG_STATE_HOME") or os.path.expanduser("~/.local/state")
+    path = os.path.join(base, "VideoConverter")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def parse_rate(value):
+    """Parse an ffprobe frame rate such as "30000/1001" or "25" into a float (0 if unknown)"""
+    try:
+        if '/' in value:
+            num, den = value.split('/')
+            return float(num) / float(den) if float(den) else 0.0
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _to_int(value, default=0):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _to_float(value, default=0.0):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+@dataclass
+class StreamInfo:
+    """A single audio/video/data stream as reported by ffprobe"""
+    index: int
+    codec_type: str
+    codec_name: str = ""
+    profile: str = ""
+    width: int = 0
+    height: int = 0
+    fps: float = 0.0
+    pix_fmt: str = ""
+    field_order: str = ""
+    sample_rate: int = 0
+    channels: int = 0
+    bit_rate: int = 0
+    start_time: float = 0.0
+    duration: float = 0.0
+    rotation: int = 0
+
+    @classmethod
+    def from_ffprobe(cls, data):
+        """Build a StreamInfo from one entry of ffprobe's "streams" list"""
+        # r_frame_rate is the lowest rate that represents every timestamp, which for interlaced
+        # H.264 (AVCHD) is the field rate, twice the frame rate. avg_frame_rate is the real frame
+        # rate, but 0/0 for some streams; it can never exceed r_frame_rate
+        base_rate = parse_rate(data.get("r_frame_rate", ""))
+        average_rate = parse_rate(data.get("avg_frame_rate", ""))
+        fps = average_rate if 0 < average_rate <= (base_rate or average_rate) * 1.01 else base_rate
+
+        # Rotation may come from the display matrix side data or the legacy "rotate" tag
+        rotation = _to_int(data.get("tags", {}).get("rotate"))
+        for side_data in data.get("side_data_list", []):
+            if "rotation" in side_data:
+                rotation = _to_int(side_data["rotation"])
+
+        return cls(
+            index=_to_int(data.get("index")),
+            codec_type=data.get("codec_type", ""),
+            codec_name=data.get("codec_name", ""),
+            profile=data.get("profile", ""),
+            width=_to_int(data.get("width")),
+            height=_to_int(data.get("height")),
+            fps=fps if data.get("codec_type") == "video" else 0.0,
+            pix_fmt=data.get("pix_fmt", ""),
+            field_order=data.get("field_order", ""),
+            sample_rate=_to_int(data.get("sample_rate")),
+            channels=_to_int(data.get("channels")),
+            bit_rate=_to_int(data.get("bit_rate")),
+            start_time=_to_float(data.get("start_time")),
+            duration=_to_float(data.get("duration")),
+            rotation=rotation,
+        )
+
+
+@dataclass
+class VideoMetadata:
+    """Everything the app needs to know about one input file, from a single ffprobe run"""
+    path: str
+    size: int
+    mtime_ns: int
+    duration: float = 0.0
+    start_time: float = 0.0
+    format_name: str = ""
+    bit_rate: int = 0
+    streams: list = field(default_factory=list)
+
+    @property
+    def video_stream(self):
+        """The first video stream, or None"""
+        for stream in self.streams:
+            if stream.codec_type == "video":
+                return stream
+        return None
+
+    @property
+    def audio_stream(self):
+        """The first audio stream, or None"""
+        for stream in self.streams:
+            if stream.codec_type == "audio":
+                return stream
+        return None
+
+    @property
+    def width(self):
+        return self.video_stream.width if self.video_stream else 0
+
+    @property
+    def height(self):
+        return self.video_stream.height if self.video_stream else 0
+
+    @property
+    def fps(self):
+        return self.video_stream.fps if self.video_stream else 0.0
+
+    def to_dict(self):
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data):
+        data = dict(data)
+        data["streams"] = [StreamInfo(**s) for s in data.get("streams", [])]
+        return cls(**data)
+
+
+def probe_file(path, stat=None):
+    """Run ffprobe once on a file and parse the result into a VideoMetadata record"""
+    stat = stat or os.stat(path)
+    cmd = [
+        "ffprobe", "-v", "error", "-show_format", "-show_streams",
+        "-of", "json", path
+    ]
+    try:
+        output = subprocess.check_output(cmd, stderr=subprocess.PIPE, universal_newlines=True)
+        data = json.loads(output)
+    except subprocess.CalledProcessError as e:
+        raise ProbeError(e.stderr.strip() or f"ffprobe exited with code {e.returncode}")
+    except (OSError, ValueError) as e:
+        raise ProbeError(str(e))
+
+    fmt = data.get("format", {})
+    return VideoMetadata(
+        path=path,
+        size=stat.st_size,
+        mtime_ns=stat.st_mtime_ns,
+        duration=_to_float(fmt.get("duration")),
+        start_time=_to_float(fmt.get("start_time")),
+        format_name=fmt.get("format_name", ""),
+        bit_rate=_to_int(fmt.get("bit_rate")),
+        streams=[StreamInfo.from_ffprobe(s) for s in data.get("streams", [])],
+    )
+
+
+class MetadataCache:
+    """Persistent metadata cache keyed by path, size and mtime
+
+    Records are kept in memory and written back to a JSON file, so reopening a
+    card or restarting the app does not cost any probes for unchanged files.
+    The cache is safe to use from several threads.
+    """
+
+    # Minimum delay between automatic saves while a batch is being probed
+    AUTOSAVE_INTERVAL = 2.0
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(cache_dir(), "metadata.json")
+        self._lock = threading.Lock()
+        self._records = {}
+        self._dirty = False
+        self._last_save = 0.0
+        self.load()
+
+    def load(self):
+        """Load records from disk, ignoring missing or outdated cache files"""
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            if data.get("version") != CACHE_VERSION:
+                return
+            records = {p: VideoMetadata.from_dict(r) for p, r in data.get("records", {}).items()}
+        except (OSError, ValueError, TypeError) as e:
+            if not isinstance(e, FileNotFoundError):
+                print(f"Ignoring unreadable metadata cache: {str(e)}", file=sys.stderr)
+            return
+        with self._lock:
+            self._records = records
+
+    def save(self):
+        """Write the cache to disk atomically"""
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {
+                "version": CACHE_VERSION,
+                "records": {p: r.to_dict() for p, r in self._records.items()},
+            }
+            self._dirty = False
+            self._last_save = time.monotonic()
+
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Error saving metadata cache: {str(e)}", file=sys.stderr)
+
+    def lookup(self, path):
+        """Return the cached record for a file if it is still current, without probing"""
+        path = os.path.abspath(path)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        with self._lock:
+            record = self._records.get(path)
+        if record and record.size == stat.st_size and record.mtime_ns == stat.st_mtime_ns:
+            return record
+        return None
+
+    def get(self, path):
+        """Return metadata for a file, probing it only if the cached record is missing or stale"""
+        record = self.lookup(path)
+        if record:
+            return record
+
+        path = os.path.abspath(path)
+        record = probe_file(path, os.stat(path))
+        with self._lock:
+            self._records[path] = record
+            self._dirty = True
+            autosave = time.monotonic() - self._last_save >= self.AUTOSAVE_INTERVAL
+        if autosave:
+            self.save()
+        return record
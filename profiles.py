@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""Named speed/quality encoding profiles and benchmark-driven auto-selection
+
+A profile is the libx264 preset and CRF used whenever video has to be
+re-encoded. "auto" encodes a short sample of an actual input with each
+profile, from the highest quality down, and picks the first one that is fast
+enough for the batch's target throughput or deadline.
+"""
+import sys
+import time
+import subprocess
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class EncodingProfile:
+    """libx264 settings for one speed/quality trade-off"""
+    name: str
+    label: str
+    preset: str
+    crf: int
+    tune: str = None
+
+    def video_encoder_args(self):
+        args = ["libx264", "-preset", self.preset, "-crf", str(self.crf)]
+        if self.tune:
+            args.extend(["-tune", self.tune])
+        return args
+
+
+# Ordered from the highest quality to the fastest
+PROFILES = [
+    EncodingProfile("archive", "Archive (best quality, slow)", "slow", 18),  # Higher quality encoding
+    EncodingProfile("balanced", "Balanced", "medium", 20),
+    EncodingProfile("fast", "Fast turnaround", "veryfast", 23),
+]
+PROFILES_BY_NAME = {profile.name: profile for profile in PROFILES}
+
+# Streamed previews must encode faster than they play
+PREVIEW_PROFILE = EncodingProfile("preview", "Preview", "ultrafast", 23, tune="zerolatency")
+
+AUTO = "auto"
+DEFAULT_PROFILE = "archive"
+PROFILE_NAMES = [profile.name for profile in PROFILES] + [AUTO]
+
+# Length of the sample encoded for each candidate profile in auto mode
+SAMPLE_SECONDS = 5.0
+
+
+def get_profile(name):
+    """Return a profile by name; unknown names and an unresolved "auto" give the default"""
+    return PROFILES_BY_NAME.get(name) or PROFILES_BY_NAME[DEFAULT_PROFILE]
+
+
+def benchmark(input_path, video_args, start=0.0, seconds=SAMPLE_SECONDS):
+    """Encode `seconds` of video from `start` and return the encoding speed in frames per second"""
+    cmd = [
+        "ffmpeg", "-nostdin", "-v", "error", "-ss", f"{start:.3f}", "-t", f"{seconds:.3f}",
+        "-i", input_path, "-map", "0:v:0", "-an", *video_args,
+        "-progress", "pipe:1", "-f", "null", "-"
+    ]
+    started = time.monotonic()
+    result = subprocess.run(cmd, stdin=subprocess.DEVNULL, capture_output=True, universal_newlines=True)
+    elapsed = time.monotonic() - started
+    if result.returncode != 0:
+        raise RuntimeError(f"Benchmark failed: {result.stderr.strip()[-500:]}")
+
+    frames = 0
+    for line in result.stdout.splitlines():
+        if line.startswith("frame="):
+            try:
+                frames = int(line.split("=", 1)[1])
+            except ValueError:
+                pass
+    return frames / elapsed if elapsed > 0 else 0.0
+
+
+def choose_profile(measure, required_fps):
+    """Pick the highest-quality profile whose measured speed meets required_fps
+
+    `measure(profile)` returns the encoding speed in frames per second.
+    Profiles are tried from the highest quality down, so a fast machine only
+    benchmarks one of them. Falls back to the fastest profile. Returns the
+    chosen profile name and the {name: fps} measurements.
+    """
+    measurements = {}
+    for profile in PROFILES:
+        try:
+            measurements[profile.name] = measure(profile)
+        except Exception as e:
+            print(f"Error benchmarking {profile.name}: {str(e)}", file=sys.stderr)
+            continue
+        if measurements[profile.name] >= required_fps:
+            return profile.name, measurements
+    return PROFILES[-1].name, measurements
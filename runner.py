@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""Running ffmpeg processes and turning their -progress output into progress callbacks"""
+import threading
+from dataclasses import dataclass, field
+
+from supervisor import ProcessSupervisor, SupervisorError
+
+# ffmpeg writes -progress output every half second, so a minute of silence means it is stuck
+STALL_SECONDS = 60.0
+
+
+class ConversionError(Exception):
+    """Raised when ffmpeg fails to convert a file"""
+
+
+class ConversionCancelled(ConversionError):
+    """Raised when a conversion was stopped through its JobControl"""
+
+
+class JobControl:
+    """Pauses, resumes or cancels every ffmpeg process of one job, from any thread
+
+    run_ffmpeg attaches each process it starts, so a job made of several
+    processes (chunks, audio, concat) is controlled as a whole. Processes
+    started while the job is paused start suspended; processes started after
+    it was cancelled are stopped at once.
+
+    A JobControl with a `parent` controls a group of the job's processes (e.g.
+    the chunks of a segmented encode): cancelling it stops only that group,
+    while the parent still pauses, resumes and cancels every process.
+    """
+
+    def __init__(self, parent=None):
+        self._lock = threading.Lock()
+        self._supervisors = set()
+        self.parent = parent
+        self.paused = False
+        self.cancelled = False
+
+    def attach(self, supervisor):
+        if self.parent:
+            self.parent.attach(supervisor)
+        with self._lock:
+            self._supervisors.add(supervisor)
+            if self.cancelled:
+                supervisor.kill()
+            elif self.paused:
+                supervisor.suspend()
+
+    def detach(self, supervisor):
+        with self._lock:
+            self._supervisors.discard(supervisor)
+        if self.parent:
+            self.parent.detach(supervisor)
+
+    def pause(self):
+        with self._lock:
+            self.paused = True
+            for supervisor in self._supervisors:
+                supervisor.suspend()
+
+    def resume(self):
+        with self._lock:
+            self.paused = False
+            for supervisor in self._supervisors:
+                supervisor.resume()
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            for supervisor in self._supervisors:
+                supervisor.kill()
+
+    def check(self):
+        """Raise ConversionCancelled if the job was cancelled"""
+        if self.parent:
+            self.parent.check()
+        if self.cancelled:
+            raise ConversionCancelled("Conversion cancelled")
+
+
+@dataclass
+class ProcessStats:
+    """What one ffmpeg process reported through -progress, plus its resource usage"""
+    wall_seconds: float = 0.0
+    cpu_user: float = 0.0
+    cpu_system: float = 0.0
+    max_rss_kb: int = 0
+    frames: int = 0
+    out_time: float = 0.0
+    total_size: int = 0
+    bitrate_kbps: float = 0.0
+    fps_samples: list = field(default_factory=list)
+    speed_samples: list = field(default_factory=list)
+    returncode: int = None
+
+    def parse_progress(self, line):
+        """Record one "key=value" line of -progress output; returns out_time in seconds if it changed"""
+        key, _, value = line.partition("=")
+        try:
+            if key == "out_time_ms":
+                # Extract time in microseconds (despite the name)
+                self.out_time = int(value) / 1000000
+                return self.out_time
+            elif key == "frame":
+                self.frames = int(value)
+            elif key == "fps":
+                fps = float(value)
+                if fps > 0:  # Reported as 0 until the first second has been encoded
+                    self.fps_samples.append(fps)
+            elif key == "speed":
+                self.speed_samples.append(float(value.rstrip("x")))
+            elif key == "bitrate":
+                self.bitrate_kbps = float(value.replace("kbits/s", ""))
+            elif key == "total_size":
+                self.total_size = int(value)
+        except ValueError:
+            pass  # N/A before the first output packet
+        return None
+
+
+def run_ffmpeg(cmd, duration=0, on_progress=None, stats=None, timeout=None, stall_timeout=STALL_SECONDS,
+               control=None):
+    """Run an ffmpeg command that writes "-progress pipe:1" output
+
+    on_progress(fraction) is called as ffmpeg advances through `duration`
+    seconds of media. The process's ProcessStats is returned and, if `stats`
+    is a list, appended to it. ffmpeg is stopped if it runs longer than
+    `timeout` seconds, or reports nothing for `stall_timeout` seconds. Raises
+    ConversionError with the end of ffmpeg's error output if the command fails,
+    or ConversionCancelled if the job's `control` cancelled it.
+    """
+    if control:
+        control.check()
+    process_stats = ProcessStats()
+
+    def on_line(output_line):
+        current_time = process_stats.parse_progress(output_line.strip())
+        if current_time is not None and duration > 0 and on_progress:
+            # Calculate progress based on video duration
+            on_progress(min(1.0, current_time / duration))
+
+    # Statistics arrive through -progress, so keep them out of the stderr kept for error reports
+    cmd = [cmd[0], "-nostats", *cmd[1:]]
+    supervisor = ProcessSupervisor(cmd, on_line=on_line, timeout=timeout, stall_timeout=stall_timeout)
+    try:
+        supervisor.start()
+        if control:
+            control.attach(supervisor)
+        supervisor.wait()
+    except SupervisorError as e:
+        raise ConversionError(f"{str(e)}\n{supervisor.stderr_tail}".strip())
+    finally:
+        if control:
+            control.detach(supervisor)
+        process_stats.wall_seconds = supervisor.wall_seconds
+        process_stats.returncode = supervisor.returncode
+        if supervisor.rusage:
+            process_stats.cpu_user = supervisor.rusage.ru_utime
+            process_stats.cpu_system = supervisor.rusage.ru_stime
+            process_stats.max_rss_kb = supervisor.rusage.ru_maxrss
+        if stats is not None:
+            stats.append(process_stats)
+
+    if control:
+        control.check()
+    if supervisor.returncode != 0:
+        raise ConversionError(supervisor.stderr_tail.strip() or f"ffmpeg exited with code {supervisor.returncode}")
+    return process_stats
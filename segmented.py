@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""Segmented re-encoding: split at keyframes, encode chunks in parallel, join losslessly
+
+Used for the rotate (re-encode) path on long clips. The input is cut at
+keyframes into roughly equal chunks, every chunk is encoded by its own ffmpeg
+process with identical settings, the audio is encoded once in a separate
+process, and the pieces are joined with the concat demuxer using stream copy.
+If any encode fails, the others are stopped at once.
+"""
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from runner import JobControl, run_ffmpeg
+from keyframes import default_index
+
+# Chunks shorter than this are not worth the extra process and keyframe overhead
+MIN_CHUNK_SECONDS = 20.0
+
+
+def plan_chunks(keyframes, start_time, duration, count, min_seconds=MIN_CHUNK_SECONDS):
+    """Pick chunk boundaries at the keyframes closest to an even split
+
+    Returns a list of (start, end) positions in seconds from the start of the
+    file. A single chunk means the file should not be split.
+    """
+    count = min(count, int(duration // min_seconds))
+    positions = [t - start_time for t in keyframes if 0 < t - start_time < duration]
+    if count < 2 or not positions:
+        return [(0.0, duration)]
+
+    boundaries = [0.0]
+    for i in range(1, count):
+        target = duration * i / count
+        candidates = [p for p in positions if p > boundaries[-1]]
+        if not candidates:
+            break
+        boundary = min(candidates, key=lambda p: abs(p - target))
+        # Skip boundaries that would leave a tiny chunk at either side
+        if boundary - boundaries[-1] >= min_seconds / 2 and duration - boundary >= min_seconds / 2:
+            boundaries.append(boundary)
+    boundaries.append(duration)
+
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def concat_line(path):
+    """Escape a path for a concat demuxer list file"""
+    return "file '" + path.replace("'", "'\\''") + "'\n"
+
+
+def encode_segmented(input_path, output_path, duration, video_args, audio_args,
+                     segments, start_time=0.0, fps=0.0, on_progress=None, stats=None,
+                     control=None, video_map=None, audio_map=None):
+    """Encode a file in parallel keyframe-aligned chunks
+
+    video_args and audio_args are the encoder arguments of the single-process
+    path, so the output is encoded with identical settings, and video_map and
+    audio_map its -map options for the video and the audio streams (default:
+    the first video stream and every audio stream), so the output has the
+    same streams. Returns False
+    (without doing any work) if the file is too short or has too few keyframes
+    to be split; raises ConversionError if any step fails. The ProcessStats of
+    every ffmpeg process are appended to `stats` if it is a list. A JobControl
+    given as `control` pauses or cancels all of them together.
+    """
+    chunks = plan_chunks(default_index().get(input_path), start_time, duration, segments)
+    if len(chunks) < 2:
+        return False
+
+    # Start each chunk half a frame early so rounding in the keyframe times can
+    # never drop or duplicate the frame that sits exactly on a boundary
+    half_frame = 0.5 / fps if fps > 0 else 0.01
+    video_map = video_map or ["-map", "0:v:0"]
+    audio_map = ["-map", "0:a"] if audio_map is None else audio_map
+    has_audio = bool(audio_map and audio_args)
+    # Lets a failed encode stop the others, while `control` still pauses or cancels them all
+    group = JobControl(parent=control)
+
+    work_dir = tempfile.mkdtemp(prefix=".segments-", dir=os.path.dirname(os.path.abspath(output_path)))
+    try:
+        # Progress is shared by the chunk encodes and the (much cheaper) audio encode
+        weights = [end - start for start, end in chunks]
+        if has_audio:
+            weights.append(duration * 0.05)
+        progress = [0.0] * len(weights)
+        lock = threading.Lock()
+
+        def report(index, fraction):
+            with lock:
+                progress[index] = fraction
+                overall = sum(w * p for w, p in zip(weights, progress)) / sum(weights)
+            if on_progress:
+                on_progress(overall)
+
+        def encode_chunk(index, start, end):
+            seek = max(0.0, start - half_frame)
+            cmd = ["ffmpeg", "-nostdin", "-ss", f"{seek:.6f}", "-i", input_path]
+            if index < len(chunks) - 1:
+                cmd.extend(["-t", f"{end - half_frame - seek:.6f}"])
+            cmd.extend([
+                *video_map, "-an",
+                *video_args,
+                "-progress", "pipe:1", "-y", chunk_paths[index]
+            ])
+            run_ffmpeg(cmd, end - start, lambda fraction: report(index, fraction), stats, control=group)
+
+        def encode_audio():
+            cmd = [
+                "ffmpeg", "-nostdin", "-i", input_path, *audio_map, "-vn",
+                *audio_args,
+                "-progress", "pipe:1", "-y", audio_path
+            ]
+            run_ffmpeg(cmd, duration, lambda fraction: report(len(chunks), fraction), stats, control=group)
+
+        chunk_paths = [os.path.join(work_dir, f"chunk{i:04d}.mp4") for i in range(len(chunks))]
+        audio_path = os.path.join(work_dir, "audio.mp4")
+
+        with ThreadPoolExecutor(max_workers=segments) as pool:
+            futures = [pool.submit(encode_chunk, i, start, end) for i, (start, end) in enumerate(chunks)]
+            if has_audio:
+                futures.append(pool.submit(encode_audio))
+            for future in as_completed(futures):
+                if future.exception() is not None:
+                    # Stop the other encodes instead of waiting for them, and report the first failure
+                    group.cancel()
+                    for other in futures:
+                        other.cancel()
+                    future.result()
+
+        # Join the chunks without re-encoding
+        list_path = os.path.join(work_dir, "chunks.txt")
+        with open(list_path, "w") as f:
+            f.writelines(concat_line(p) for p in chunk_paths)
+
+        cmd = ["ffmpeg", "-nostdin", "-f", "concat", "-safe", "0", "-i", list_path]
+        if has_audio:
+            cmd.extend(["-i", audio_path, "-map", "0:v:0", "-map", "1:a"])
+        cmd.extend(["-c", "copy", "-progress", "pipe:1", "-y", output_path])
+        run_ffmpeg(cmd, stats=stats, control=control)
+        return True
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""Detection of spanned AVCHD recordings
+
+Camcorders split long recordings into consecutive 00000.MTS, 00001.MTS, ...
+files whose timestamps simply continue from one file to the next. Such a
+sequence is converted into a single output instead of one output per file.
+"""
+import os
+
+# Largest gap (in seconds) between the end of one file and the start of the next
+SPAN_GAP_TOLERANCE = 1.0
+
+# MPEG-TS timestamps are 33 bits at 90 kHz and wrap around after ~26.5 hours
+TS_WRAP_SECONDS = (1 << 33) / 90000
+
+
+def clip_number(path):
+    """Return the numeric clip number of a file such as 00012.MTS, or None"""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return int(stem) if stem.isdigit() else None
+
+
+def _stream_signature(metadata):
+    """The stream properties that must match for clips to be joined with stream copy"""
+    video = metadata.video_stream
+    audio = metadata.audio_stream
+    return (
+        (video.codec_name, video.width, video.height, round(video.fps, 3)) if video else None,
+        (audio.codec_name, audio.sample_rate, audio.channels) if audio else None,
+    )
+
+
+def is_continuation(previous, following):
+    """True if `following` is the next file of the same recording as `previous`"""
+    if os.path.dirname(previous.path) != os.path.dirname(following.path):
+        return False
+    if os.path.splitext(previous.path)[1].lower() != os.path.splitext(following.path)[1].lower():
+        return False
+
+    previous_number = clip_number(previous.path)
+    following_number = clip_number(following.path)
+    if previous_number is None or following_number != previous_number + 1:
+        return False
+
+    if previous.duration <= 0 or _stream_signature(previous) != _stream_signature(following):
+        return False
+
+    # The timestamps of a spanned recording continue where the previous file ended
+    gap = (following.start_time - (previous.start_time + previous.duration)) % TS_WRAP_SECONDS
+    return min(gap, TS_WRAP_SECONDS - gap) <= SPAN_GAP_TOLERANCE
+
+
+def group_spanned(video_files, metadata):
+    """Group files into spanned sequences
+
+    `metadata` maps paths to VideoMetadata; files without metadata are never
+    joined. Returns a list of groups (lists of paths in recording order),
+    ordered by the position of each group's first file in `video_files`.
+    """
+    position = {path: i for i, path in enumerate(video_files)}
+    candidates = sorted(
+        (p for p in video_files if metadata.get(p) and clip_number(p) is not None),
+        key=lambda p: (os.path.dirname(p), clip_number(p))
+    )
+
+    group_of = {}
+    groups = []
+    for path in candidates:
+        if groups and is_continuation(metadata[groups[-1][-1]], metadata[path]):
+            groups[-1].append(path)
+        else:
+            groups.append([path])
+        group_of[path] = groups[-1]
+
+    result = []
+    seen = set()
+    for path in video_files:
+        group = group_of.get(path, [path])
+        if id(group) not in seen:
+            seen.add(id(group))
+            result.append(group)
+    return sorted(result, key=lambda group: min(position[p] for p in group))
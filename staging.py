@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""Staging inputs from slow removable media to fast local scratch space
+
+Reading a clip from an SD card or a camcorder over USB while ffmpeg encodes it
+lets the card's slow reads throttle the encoder. A StagingArea copies the next
+few inputs of a batch to local scratch space on a background thread, with
+large sequential reads, while the current file encodes. Jobs then read their
+input from the local copy.
+
+The scratch space is bounded: the copier waits while more than `lookahead`
+copies are waiting to be used or the copies would exceed max_bytes. Every copy
+is deleted once its job is done, and the scratch directory when the staging
+area is closed.
+"""
+import os
+import sys
+import shutil
+import tempfile
+import threading
+from collections import deque
+
+# Large reads keep a card streaming instead of seeking
+COPY_BUFFER = 8 * 1024 * 1024
+DEFAULT_LOOKAHEAD = 2
+# Default cap for the scratch space, overridable with VIDEOCONVERTER_SCRATCH_MB
+DEFAULT_SCRATCH_MB = 8192
+
+# States of a staged file
+QUEUED = "queued"
+COPYING = "copying"
+READY = "ready"
+IN_USE = "in_use"
+FAILED = "failed"
+
+
+def default_scratch_root():
+    return os.environ.get("VIDEOCONVERTER_SCRATCH_DIR") or tempfile.gettempdir()
+
+
+class _StagedFile:
+    __slots__ = ("state", "local_path", "size")
+
+    def __init__(self):
+        self.state = QUEUED
+        self.local_path = None
+        self.size = 0
+
+
+class StagingArea:
+    """Copies upcoming inputs to local scratch space ahead of the jobs that read them
+
+        staging.stage(paths)         files the next jobs will read, in order
+        path = staging.acquire(src)  local copy of src (or src itself if it was not staged)
+        staging.release(src)         delete the copy once the job is done
+        staging.close()              stop copying and remove the scratch directory
+
+    acquire() waits for a copy that is in progress, but never for one that has
+    not started: that file is then read from its source instead.
+    """
+
+    def __init__(self, lookahead=DEFAULT_LOOKAHEAD, max_bytes=None, scratch_root=None):
+        self.lookahead = max(1, lookahead)
+        if max_bytes is None:
+            max_mb = int(os.environ.get("VIDEOCONVERTER_SCRATCH_MB", DEFAULT_SCRATCH_MB))
+            max_bytes = max_mb * 1024 * 1024
+        self.max_bytes = max_bytes
+        scratch_root = scratch_root or default_scratch_root()
+        os.makedirs(scratch_root, exist_ok=True)
+        self.directory = tempfile.mkdtemp(prefix="videoconverter-staging-", dir=scratch_root)
+
+        self._condition = threading.Condition()
+        self._queue = deque()
+        self._files = {}  # source path -> _StagedFile
+        self._bytes = 0  # Bytes of scratch space taken by copies (finished or in progress)
+        self._copies = 0
+        self._closed = False
+        self._thread = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def stage(self, paths):
+        """Set the files to copy next, in the order they will be used
+
+        Copies of files that are no longer upcoming (and not in use) are dropped.
+        """
+        paths = list(dict.fromkeys(paths))
+        with self._condition:
+            if self._closed:
+                return
+            upcoming = set(paths)
+            for path in [p for p, f in self._files.items() if p not in upcoming and f.state != IN_USE]:
+                self._drop(path)
+            self._queue = deque(p for p in paths if p not in self._files)
+            for path in self._queue:
+                self._files[path] = _StagedFile()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._work, daemon=True)
+                self._thread.start()
+            self._condition.notify_all()
+
+    def acquire(self, path):
+        """Return the local copy of a file to read instead of the file itself"""
+        with self._condition:
+            staged = self._files.get(path)
+            if staged is None:
+                return path
+            if staged.state == QUEUED:
+                # Reading the source now beats waiting for the copier to get to it
+                self._queue.remove(path)
+                del self._files[path]
+                return path
+            while staged.state == COPYING:
+                self._condition.wait()
+            if staged.state in (READY, IN_USE):
+                staged.state = IN_USE
+                self._condition.notify_all()
+                return staged.local_path
+            return path
+
+    def release(self, path):
+        """Delete the local copy of a file (if there is one)"""
+        with self._condition:
+            if path in self._files:
+                self._drop(path)
+                self._condition.notify_all()
+
+    def close(self):
+        """Stop copying and remove every copy"""
+        with self._condition:
+            self._closed = True
+            self._queue.clear()
+            self._condition.notify_all()
+        if self._thread:
+            self._thread.join()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _drop(self, path):
+        """Forget a file and delete its copy (called with the condition held)"""
+        staged = self._files.pop(path)
+        if staged.state == QUEUED:
+            self._queue.remove(path)
+        elif staged.state in (READY, IN_USE):
+            # (A file being copied is deleted by the copier once it sees the file is gone)
+            self._bytes -= staged.size
+            try:
+                os.unlink(staged.local_path)
+            except OSError:
+                pass
+
+    def _waiting(self):
+        return sum(1 for f in self._files.values() if f.state == READY)
+
+    def _next(self):
+        """Wait for a file to copy and reserve space for it; returns (path, staged) or None when closed"""
+        with self._condition:
+            while True:
+                if self._closed:
+                    return None
+                if self._queue and self._waiting() < self.lookahead:
+                    path = self._queue[0]
+                    staged = self._files[path]
+                    try:
+                        staged.size = os.path.getsize(path)
+                    except OSError:
+                        staged.size = -1
+                    if staged.size < 0 or staged.size > self.max_bytes:
+                        # Unreadable or bigger than the whole scratch space: jobs read the source
+                        self._queue.popleft()
+                        staged.state = FAILED
+                        continue
+                    if self._bytes + staged.size <= self.max_bytes:
+                        self._queue.popleft()
+                        staged.state = COPYING
+                        self._copies += 1
+                        staged.local_path = os.path.join(self.directory, f"{self._copies}-{os.path.basename(path)}")
+                        self._bytes += staged.size
+                        return path, staged
+                self._condition.wait()
+
+    def _copy(self, source, staged):
+        """Copy a file with large sequential reads; returns False if the copy stopped being wanted"""
+        with open(source, "rb") as src, open(staged.local_path, "wb") as dst:
+            if hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(src.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            while True:
+                if self._closed or self._files.get(source) is not staged:
+                    return False
+                chunk = src.read(COPY_BUFFER)
+                if not chunk:
+                    break
+                dst.write(chunk)
+        shutil.copystat(source, staged.local_path)
+        return True
+
+    def _work(self):
+        """Copier thread loop"""
+        while True:
+            reserved = self._next()
+            if reserved is None:
+                return
+            path, staged = reserved
+            try:
+                ok = self._copy(path, staged)
+            except OSError as e:
+                print(f"Error staging {path}: {str(e)}", file=sys.stderr)
+                ok = False
+
+            with self._condition:
+                if ok and self._files.get(path) is staged:
+                    staged.state = READY
+                else:
+                    # Failed, closed, or no longer wanted while it was being copied
+                    staged.state = FAILED
+                    self._bytes -= staged.size
+                    try:
+                        os.unlink(staged.local_path)
+                    except OSError:
+                        pass
+                self._condition.notify_all()
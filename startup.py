@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""Cold-start timings of the GUI
+
+The app marks its startup milestones, in milliseconds since app.py started
+loading:
+
+    imports      every module is imported (Qt, the engine, ...)
+    window       the main window is built
+    first_paint  the window has painted for the first time
+    interactive  the event loop is idle after the first paint, so input is handled
+
+Each launch appends one JSON record to a log ($VIDEOCONVERTER_STARTUP_LOG, by
+default startup.jsonl in the state directory), so cold-start regressions show
+up over time. With VIDEOCONVERTER_EXIT_AFTER_STARTUP=1 the app prints the
+record and quits once it is interactive; `python -m benchmarks run` uses that
+to measure startup.
+"""
+import os
+import sys
+import json
+import time
+import platform
+
+from probe import state_dir
+
+# Milestones in the order they are reached
+MILESTONES = ("imports", "window", "first_paint", "interactive")
+
+
+def default_log_path():
+    return os.environ.get("VIDEOCONVERTER_STARTUP_LOG") or os.path.join(state_dir(), "startup.jsonl")
+
+
+def exit_after_startup():
+    return os.environ.get("VIDEOCONVERTER_EXIT_AFTER_STARTUP") == "1"
+
+
+class StartupTimer:
+    """Milestone times of one launch; `started` is the time.perf_counter() value of the start"""
+
+    def __init__(self, started):
+        self.started = started
+        self.marks = {}
+
+    def mark(self, milestone):
+        """Record a milestone the first time it is reached"""
+        if milestone not in self.marks:
+            self.marks[milestone] = round((time.perf_counter() - self.started) * 1000, 1)
+
+    def record(self):
+        record = {"time": time.time(), "python": platform.python_version(), "pid": os.getpid()}
+        record.update({f"{milestone}_ms": self.marks.get(milestone) for milestone in MILESTONES})
+        return record
+
+    def save(self, path=None):
+        """Append this launch's record to the startup log"""
+        path = path or default_log_path()
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, "a") as f:
+                f.write(json.dumps(self.record()) + "\n")
+        except OSError as e:
+            print(f"Error writing startup timings: {str(e)}", file=sys.stderr)
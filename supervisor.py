@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""Non-blocking supervision of ffmpeg processes
+
+A ProcessSupervisor reads a process's stdout and stderr together through
+`selectors`, so a chatty stderr can never fill its pipe and deadlock the
+process while we wait on stdout. Only the last lines of stderr are kept for
+error reports. The supervisor can also stop a process that runs past a
+timeout, or that stalls without producing any output, and suspend and resume
+it (SIGSTOP/SIGCONT) without the suspension counting against those limits.
+
+Selecting on pipes needs a POSIX system.
+"""
+import os
+import time
+import signal
+import selectors
+import threading
+import subprocess
+from collections import deque
+
+from governor import set_priority
+
+# Lines of stderr kept for error reports
+STDERR_LINES = 50
+# Longest partial line kept before it is cut
+MAX_LINE_BYTES = 64 * 1024
+READ_SIZE = 64 * 1024
+# How often timeouts are checked while the process is quiet
+POLL_INTERVAL = 0.5
+# How long output is still drained after a kill (a grandchild may hold the pipes open)
+KILL_GRACE = 1.0
+
+
+class SupervisorError(Exception):
+    """Raised when the supervisor had to stop a process"""
+
+
+class ProcessTimeout(SupervisorError):
+    """The process ran for longer than its timeout"""
+
+
+class ProcessStalled(SupervisorError):
+    """The process produced no output for longer than its stall timeout"""
+
+
+class _LineSplitter:
+    """Split a byte stream into text lines (ffmpeg ends status lines with \\r)"""
+
+    def __init__(self, on_line):
+        self.on_line = on_line
+        self._pending = b""
+
+    def feed(self, data):
+        self._pending += data.replace(b"\r", b"\n")
+        *lines, self._pending = self._pending.split(b"\n")
+        if len(self._pending) > MAX_LINE_BYTES:
+            lines.append(self._pending)
+            self._pending = b""
+        for line in lines:
+            if line:
+                self.on_line(line.decode("utf-8", errors="replace"))
+
+    def flush(self):
+        if self._pending:
+            self.on_line(self._pending.decode("utf-8", errors="replace"))
+            self._pending = b""
+
+
+class ProcessSupervisor:
+    """Runs one process and multiplexes its stdout and stderr
+
+    on_line(text) is called for every stdout line, or on_data(bytes) for every
+    raw stdout chunk (e.g. a streamed preview); with neither, stdout goes to
+    /dev/null. Callbacks run on the thread that calls wait(). kill() may be
+    called from any thread.
+    """
+
+    def __init__(self, cmd, on_line=None, on_data=None, timeout=None, stall_timeout=None,
+                 stderr_lines=STDERR_LINES, priority=None):
+        self.cmd = cmd
+        self.on_line = on_line
+        self.on_data = on_data
+        self.timeout = timeout
+        self.stall_timeout = stall_timeout
+        self.priority = priority  # Priority class the process is moved to once started (governor.py)
+        self.stderr_lines = deque(maxlen=stderr_lines)
+
+        self.process = None
+        self.returncode = None
+        self.rusage = None
+        self.wall_seconds = 0.0
+        self._started = None
+        self._lock = threading.Lock()
+        self._killed_at = None
+        self._suspended_at = None
+        self._suspended_seconds = 0.0
+
+    @property
+    def stderr_tail(self):
+        return "\n".join(self.stderr_lines)
+
+    def start(self):
+        capture_stdout = self.on_line is not None or self.on_data is not None
+        self._started = time.monotonic()
+        self.process = subprocess.Popen(
+            self.cmd,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE if capture_stdout else subprocess.DEVNULL,
+            stderr=subprocess.PIPE
+        )
+        if self.priority is not None:
+            set_priority(self.priority, self.process.pid)
+        return self
+
+    def kill(self):
+        """Stop the process (safe to call at any time, from any thread)"""
+        with self._lock:
+            if self._killed_at is None:
+                self._killed_at = time.monotonic()
+            if self.process is not None and self.returncode is None:
+                try:
+                    # Signal the pid directly: Popen.kill() would poll() and reap the
+                    # process before wait4() can collect its resource usage
+                    os.kill(self.process.pid, getattr(signal, "SIGKILL", signal.SIGTERM))
+                except OSError:
+                    pass
+
+    @property
+    def killed(self):
+        return self._killed_at is not None
+
+    def suspend(self):
+        """Stop the process with SIGSTOP until resume(); returns False where that is not possible"""
+        with self._lock:
+            if (self._suspended_at is not None or self.process is None or self.returncode is not None
+                    or not hasattr(signal, "SIGSTOP")):
+                return False
+            try:
+                os.kill(self.process.pid, signal.SIGSTOP)
+            except OSError:
+                return False
+            self._suspended_at = time.monotonic()
+            return True
+
+    def resume(self):
+        """Continue a suspended process"""
+        with self._lock:
+            if self._suspended_at is None:
+                return
+            try:
+                os.kill(self.process.pid, signal.SIGCONT)
+            except OSError:
+                pass
+            self._suspended_seconds += time.monotonic() - self._suspended_at
+            self._suspended_at = None
+
+    def _active_seconds(self, now):
+        """How long the process has been running, not counting suspensions"""
+        with self._lock:
+            suspended = self._suspended_seconds
+            if self._suspended_at is not None:
+                suspended += now - self._suspended_at
+        return now - self._started - suspended
+
+    def wait(self):
+        """Pump the process's output until it exits; returns its exit code
+
+        Raises ProcessTimeout or ProcessStalled (after the process has been
+        stopped and reaped) if one of the limits was hit.
+        """
+        stdout_lines = _LineSplitter(self.on_line) if self.on_line else None
+        stderr_lines = _LineSplitter(self.stderr_lines.append)
+        selector = selectors.DefaultSelector()
+        if self.process.stdout:
+            selector.register(self.process.stdout, selectors.EVENT_READ, "stdout")
+        selector.register(self.process.stderr, selectors.EVENT_READ, "stderr")
+
+        failure = None
+        last_activity = time.monotonic()
+        try:
+            while selector.get_map():
+                for key, _ in selector.select(POLL_INTERVAL):
+                    data = os.read(key.fd, READ_SIZE)
+                    if not data:
+                        selector.unregister(key.fileobj)
+                        continue
+                    last_activity = time.monotonic()
+                    if key.data == "stderr":
+                        stderr_lines.feed(data)
+                    elif stdout_lines:
+                        stdout_lines.feed(data)
+                    else:
+                        self.on_data(data)
+
+                now = time.monotonic()
+                if self._suspended_at is not None:
+                    last_activity = now  # A suspended process is silent on purpose
+                if failure is None and self.timeout and self._active_seconds(now) > self.timeout:
+                    failure = ProcessTimeout(f"Stopped after running for more than {self.timeout:g} s")
+                elif failure is None and self.stall_timeout and now - last_activity > self.stall_timeout:
+                    failure = ProcessStalled(f"Stopped after {self.stall_timeout:g} s without any output")
+                if failure is not None:
+                    self.kill()
+                if self._killed_at is not None and now - self._killed_at > KILL_GRACE:
+                    break
+        except BaseException:
+            self.kill()
+            raise
+        finally:
+            selector.close()
+            if stdout_lines:
+                stdout_lines.flush()
+            stderr_lines.flush()
+            for stream in (self.process.stdout, self.process.stderr):
+                if stream:
+                    stream.close()
+            self._reap()
+
+        if failure is not None:
+            raise failure
+        return self.returncode
+
+    def run(self):
+        """Start the process and wait for it"""
+        return self.start().wait()
+
+    def _reap(self):
+        """Wait for the process and collect its own resource usage (where wait4 is available)"""
+        if hasattr(os, "wait4") and self.process.returncode is None:
+            _, status, rusage = os.wait4(self.process.pid, 0)
+            if hasattr(os, "waitstatus_to_exitcode"):
+                returncode = os.waitstatus_to_exitcode(status)
+            else:
+                returncode = -(status & 0x7f) if status & 0x7f else status >> 8
+        else:
+            returncode, rusage = self.process.wait(), None
+        with self._lock:
+            self.returncode = self.process.returncode = returncode
+            self.rusage = rusage
+        self.wall_seconds = time.monotonic() - self._started
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""Per-job performance telemetry
+
+Every job (converted, skipped, failed or cancelled) produces one JSON record
+with its wall time, the CPU time of its ffmpeg processes, the encode fps and
+speed reported through -progress, input and output sizes and the codec path
+that was chosen. Records are appended to a JSONL log ($VIDEOCONVERTER_TELEMETRY_LOG,
+by default in the state directory) and can also be exported as a Prometheus
+textfile for node_exporter's textfile collector.
+"""
+import os
+import sys
+import json
+import time
+import socket
+import threading
+import contextlib
+
+from probe import state_dir
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; the log is then written without locking
+    fcntl = None
+
+
+def default_log_path():
+    return os.environ.get("VIDEOCONVERTER_TELEMETRY_LOG") or os.path.join(state_dir(), "telemetry.jsonl")
+
+
+def _mean(values):
+    return round(sum(values) / len(values), 3) if values else None
+
+
+def summarize_processes(processes):
+    """Combine the ProcessStats of every ffmpeg process of a job into one set of metrics"""
+    fps = [sample for p in processes for sample in p.fps_samples]
+    speed = [sample for p in processes for sample in p.speed_samples]
+    bitrates = [p.bitrate_kbps for p in processes if p.bitrate_kbps > 0]
+    cpu_user = sum(p.cpu_user for p in processes)
+    cpu_system = sum(p.cpu_system for p in processes)
+    return {
+        "processes": len(processes),
+        "cpu_seconds": round(cpu_user + cpu_system, 3),
+        "cpu_user": round(cpu_user, 3),
+        "cpu_system": round(cpu_system, 3),
+        "max_rss_kb": max((p.max_rss_kb for p in processes), default=0),
+        "frames": sum(p.frames for p in processes),
+        "avg_fps": _mean(fps),
+        "min_fps": round(min(fps), 3) if fps else None,
+        "avg_speed": _mean(speed),
+        "min_speed": round(min(speed), 3) if speed else None,
+        "bitrate_kbps": _mean(bitrates),
+    }
+
+
+def job_record(input_paths, output_path, status, started, processes=(), mode=None, codec_path=None,
+               profile=None, media_seconds=0.0, error=None):
+    """Build the telemetry record of one job
+
+    `started` is the time.monotonic() value taken when the job began.
+    """
+    def size(path):
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return 0
+
+    record = {
+        "time": time.time(),
+        "worker": f"{socket.gethostname()}:{os.getpid()}",
+        "input": input_paths[0],
+        "inputs": input_paths,
+        "output": output_path,
+        "status": status,
+        "mode": mode,
+        "codec_path": codec_path,
+        "profile": profile,
+        "wall_seconds": round(time.monotonic() - started, 3),
+        "media_seconds": round(media_seconds, 3),
+        "input_bytes": sum(size(p) for p in input_paths),
+        "output_bytes": size(output_path) if status != "failed" else 0,
+    }
+    record.update(summarize_processes(processes))
+    if error:
+        record["error"] = error[-1000:]
+    return record
+
+
+class TelemetryLog:
+    """Append-only JSONL log of job records, shared by threads and worker processes
+
+    If a Prometheus textfile path is given (or $VIDEOCONVERTER_PROMETHEUS_FILE
+    is set), it is rewritten after every record from running totals kept in a
+    small state file next to the log (LOG.totals.json). The totals record how
+    much of the log they cover and only the records appended since are read,
+    so the counters survive worker restarts and cover every process writing
+    the log without re-reading it.
+    """
+
+    def __init__(self, path=None, prometheus_path=None):
+        self.path = path or default_log_path()
+        self.prometheus_path = prometheus_path or os.environ.get("VIDEOCONVERTER_PROMETHEUS_FILE")
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """Hold an exclusive lock on the log while writing it"""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._lock, open(self.path + ".lock", "a") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def append(self, record):
+        """Append one job record (and refresh the Prometheus textfile)"""
+        try:
+            with self._locked():
+                with open(self.path, "a") as f:
+                    f.write(json.dumps(record) + "\n")
+                if self.prometheus_path:
+                    self._export_prometheus()
+        except OSError as e:
+            # Telemetry must never fail a conversion
+            print(f"Error writing telemetry: {str(e)}", file=sys.stderr)
+
+    def records(self):
+        """Every record in the log, oldest first"""
+        try:
+            with open(self.path, "r") as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        pass  # A line cut short by a crash
+        except OSError:
+            return
+
+    def _update_totals(self):
+        """Add the records appended to the log since the last update to the running totals (lock held)
+
+        Returns the totals: {"offset", "jobs", "modes", "last"}.
+        """
+        totals_path = self.path + ".totals.json"
+        try:
+            with open(totals_path, "r") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = None
+        try:
+            log_size = os.path.getsize(self.path)
+        except OSError:
+            log_size = 0
+        if not state or state.get("offset", 0) > log_size:
+            # First export, unreadable totals, or the log was rotated: count it from the start
+            state = {"offset": 0, "jobs": {}, "modes": {}, "last": None}
+
+        with open(self.path, "rb") as f:
+            f.seek(state["offset"])
+            data = f.read()
+        # Leave a line that is still being written (only possible without flock) for next time
+        data = data[:data.rfind(b"\n") + 1]
+        state["offset"] += len(data)
+        for line in data.splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # A line cut short by a crash
+            status = record.get("status") or "unknown"
+            state["jobs"][status] = state["jobs"].get(status, 0) + 1
+            if status != "converted":
+                continue
+            mode = record.get("mode") or "unknown"
+            mode_totals = state["modes"].setdefault(mode, dict.fromkeys(
+                ("wall_seconds", "cpu_seconds", "media_seconds", "input_bytes", "output_bytes"), 0))
+            for key in mode_totals:
+                mode_totals[key] += record.get(key) or 0
+            state["last"] = {key: record.get(key) for key in ("avg_fps", "avg_speed", "time")}
+
+        tmp_path = f"{totals_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, totals_path)
+        return state
+
+    def _export_prometheus(self):
+        """Write the log's totals in the Prometheus text exposition format"""
+        state = self._update_totals()
+        jobs, totals, last = state["jobs"], state["modes"], state["last"]
+
+        lines = [
+            "# HELP videoconverter_jobs_total Conversion jobs by outcome.",
+            "# TYPE videoconverter_jobs_total counter",
+        ]
+        lines += [f'videoconverter_jobs_total{{status="{status}"}} {count}' for status, count in sorted(jobs.items())]
+        for key, help_text in (
+            ("wall_seconds", "Wall-clock time spent converting."),
+            ("cpu_seconds", "CPU time used by ffmpeg processes."),
+            ("media_seconds", "Seconds of media converted."),
+            ("input_bytes", "Bytes of input converted."),
+            ("output_bytes", "Bytes of output written."),
+        ):
+            name = f"videoconverter_{key}_total"
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+            lines += [f'{name}{{mode="{mode}"}} {round(values[key], 3)}' for mode, values in sorted(totals.items())]
+        if last:
+            for key in ("avg_fps", "avg_speed", "time"):
+                name = "videoconverter_last_job_timestamp_seconds" if key == "time" else f"videoconverter_last_job_{key}"
+                lines += [f"# TYPE {name} gauge", f"{name} {last.get(key) or 0}"]
+
+        # node_exporter may read the file at any time, so it is replaced atomically
+        tmp_path = f"{self.prometheus_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, self.prometheus_path)
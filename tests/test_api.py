@@ -0,0 +1,111 @@
+"""Request checks and option parsing of the HTTP API"""
+import os
+import stat
+import tempfile
+import unittest
+
+from api import HttpError, Request, api_token, check_request, parse_options
+from engine import ROTATE_FAST, ConversionOptions
+
+TOKEN = "secret-token"
+HOSTS = ("localhost", "127.0.0.1", "::1")
+
+
+def request(method="GET", **headers):
+    headers = {name.replace("_", "-"): value for name, value in headers.items()}
+    return Request(method, "/jobs", {}, headers, b"", True)
+
+
+def local_request(method="GET", **headers):
+    headers.setdefault("host", "127.0.0.1:8765")
+    return request(method, authorization=f"Bearer {TOKEN}", **headers)
+
+
+class CheckRequestTest(unittest.TestCase):
+    def assertRefused(self, req, status, **kwargs):
+        kwargs.setdefault("token", TOKEN)
+        kwargs.setdefault("hosts", HOSTS)
+        with self.assertRaises(HttpError) as raised:
+            check_request(req, **kwargs)
+        self.assertEqual(raised.exception.status, status)
+
+    def test_local_client_with_token(self):
+        check_request(local_request(), TOKEN, HOSTS)
+        check_request(local_request("POST", content_type="application/json; charset=utf-8"), TOKEN, HOSTS)
+        check_request(request(host="[::1]:8765", authorization=f"bearer {TOKEN}"), TOKEN, HOSTS)
+
+    def test_missing_or_wrong_token(self):
+        self.assertRefused(request(host="127.0.0.1:8765"), 401)
+        self.assertRefused(request(host="127.0.0.1:8765", authorization="Bearer wrong"), 401)
+        self.assertRefused(request(host="127.0.0.1:8765", authorization=TOKEN), 401)
+
+    def test_other_host_names_are_refused(self):
+        # A DNS rebinding page reaches the loopback address under its own name
+        self.assertRefused(local_request(host="evil.example:8765"), 403)
+        self.assertRefused(request(authorization=f"Bearer {TOKEN}"), 403)
+
+    def test_cross_origin_requests_are_refused(self):
+        self.assertRefused(local_request(origin="https://evil.example"), 403)
+        self.assertRefused(local_request(origin="null"), 403)
+        check_request(local_request(origin="http://localhost:8765"), TOKEN, HOSTS)
+
+    def test_post_must_be_json(self):
+        self.assertRefused(local_request("POST"), 415)
+        self.assertRefused(local_request("POST", content_type="text/plain"), 415)
+        self.assertRefused(local_request("POST", content_type="application/x-www-form-urlencoded"), 415)
+
+    def test_unix_socket_skips_token_and_host_checks(self):
+        check_request(request(), None, None)
+        self.assertRefused(request("POST"), 415, token=None, hosts=None)
+        self.assertRefused(request(origin="https://evil.example"), 403, token=None, hosts=None)
+
+
+class ParseOptionsTest(unittest.TestCase):
+    def assertInvalid(self, data):
+        with self.assertRaises(HttpError) as raised:
+            parse_options(data)
+        self.assertEqual(raised.exception.status, 400)
+
+    def test_defaults(self):
+        self.assertEqual(parse_options({}), ConversionOptions())
+
+    def test_values_are_converted_to_the_field_types(self):
+        options = parse_options({"rotate": True, "rotate_method": ROTATE_FAST, "segments": "4",
+                                 "target_fps": 30, "profile": "auto"})
+        self.assertEqual(options, ConversionOptions(rotate=True, rotate_method=ROTATE_FAST, segments=4,
+                                                    target_fps=30.0, profile="auto"))
+
+    def test_trim_times(self):
+        options = parse_options({"trim_start": "1:05", "trim_end": 90})
+        self.assertEqual((options.trim_start, options.trim_end), (65.0, 90.0))
+        self.assertInvalid({"trim_start": "1:xx"})
+        self.assertInvalid({"trim_start": 30, "trim_end": "0:20"})
+
+    def test_invalid_values(self):
+        self.assertInvalid([])
+        self.assertInvalid({"rotate": "yes"})
+        self.assertInvalid({"segments": "many"})
+        self.assertInvalid({"profile": "best"})
+        self.assertInvalid({"rotate_method": "sideways"})
+
+    def test_negative_values(self):
+        for name in ("max_workers", "segments", "threads", "target_fps", "deadline", "trim_start", "trim_end"):
+            self.assertInvalid({name: -1})
+
+    def test_unknown_and_internal_options(self):
+        self.assertInvalid({"colour": "red"})
+        self.assertInvalid({"requested_profile": "auto"})
+
+
+class ApiTokenTest(unittest.TestCase):
+    def test_token_is_created_once_and_private(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "state", "api-token")
+            token = api_token(path)
+            self.assertGreaterEqual(len(token), 32)
+            self.assertEqual(api_token(path), token)
+            self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), 0o600)
+
+
+if __name__ == "__main__":
+    unittest.main()
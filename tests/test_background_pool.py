@@ -0,0 +1,69 @@
+"""Background probing: queue order, prioritization and result signals"""
+import time
+import threading
+import unittest
+
+try:
+    from PyQt6.QtCore import QCoreApplication
+except ImportError:  # The GUI's Qt bindings are optional for the headless tests
+    QCoreApplication = None
+
+
+@unittest.skipIf(QCoreApplication is None, "PyQt6 is not installed")
+class BackgroundPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.app = QCoreApplication.instance() or QCoreApplication([])
+
+    def test_prioritized_file_goes_first(self):
+        from app import BackgroundPool
+
+        started = threading.Event()
+        release = threading.Event()
+        done = threading.Event()
+        order = []
+
+        class Pool(BackgroundPool):
+            def process(self, video_path):
+                order.append(video_path)
+                if video_path == "first":
+                    started.set()
+                    release.wait(5)
+                elif video_path == "last":
+                    done.set()
+
+        pool = Pool(max_workers=1)
+        self.addCleanup(pool.stop)
+        pool.enqueue(["first"])
+        self.assertTrue(started.wait(5))
+        pool.enqueue(["a", "b", "c", "a"])
+        pool.prioritize("c")
+        pool.enqueue(["last"])
+        release.set()
+        self.assertTrue(done.wait(5))
+        self.assertEqual(order, ["first", "c", "a", "b", "last"])
+
+    def test_prober_reports_results_and_failures(self):
+        from app import MetadataProber
+
+        class Cache:
+            def get(self, path):
+                if path == "broken":
+                    raise RuntimeError("not a video")
+                return {"path": path}
+
+        results = []
+        prober = MetadataProber(Cache(), max_workers=2)
+        self.addCleanup(prober.stop)
+        prober.metadata_ready.connect(lambda path, metadata: results.append((path, metadata)))
+        prober.probe_failed.connect(lambda path, error: results.append((path, error)))
+        prober.enqueue(["good", "broken"])
+        # The signals come from the worker threads and are delivered on this thread's event loop
+        deadline = time.monotonic() + 5
+        while len(results) < 2 and time.monotonic() < deadline:
+            self.app.processEvents()
+            time.sleep(0.01)
+        self.assertEqual(sorted(results), [("broken", "not a video"), ("good", {"path": "good"})])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+"""Output paths, ffmpeg commands and input expansion of the headless engine"""
+import os
+import tempfile
+import unittest
+
+from engine import ConversionJob, ConversionOptions, build_command, expand_inputs, output_path_for
+from probe import StreamInfo, VideoMetadata
+
+
+def avchd_metadata(path="/card/00000.MTS"):
+    """A probed AVCHD clip: H.264 video and AC-3 audio"""
+    return VideoMetadata(path, 1000, 0, duration=60.0, streams=[
+        StreamInfo(0, "video", "h264", width=1920, height=1080, fps=29.97),
+        StreamInfo(1, "audio", "ac3", sample_rate=48000, channels=2),
+    ])
+
+
+def write_clip(path, seed):
+    """Write a tiny file that sniffs as an MPEG transport stream, distinct for each seed"""
+    with open(path, "wb") as f:
+        for i in range(4):
+            f.write(bytes([0x47]) + bytes([(seed + i) % 256]) * 187)
+
+
+class OutputPathTest(unittest.TestCase):
+    def test_single_clip(self):
+        self.assertEqual(output_path_for("/card/00003.MTS", "/out"), os.path.join("/out", "00003.mp4"))
+
+    def test_spanned_sequence_names_first_and_last_clip(self):
+        self.assertEqual(output_path_for("/card/00003.MTS", "/out", "/card/00005.MTS"),
+                         os.path.join("/out", "00003-00005.mp4"))
+        self.assertEqual(output_path_for("/card/00003.MTS", "/out", "/card/00003.MTS"),
+                         os.path.join("/out", "00003.mp4"))
+
+
+class BuildCommandTest(unittest.TestCase):
+    def test_probed_clip_copies_video_and_converts_audio(self):
+        job = ConversionJob("/card/00000.MTS", "/out/00000.mp4", avchd_metadata())
+        cmd = build_command(job, ConversionOptions())
+
+        self.assertEqual(cmd[:2], ["ffmpeg", "-nostdin"])
+        self.assertIn("-i", cmd)
+        self.assertEqual(cmd[cmd.index("-i") + 1], "/card/00000.MTS")
+        self.assertEqual([cmd[i + 1] for i, arg in enumerate(cmd) if arg == "-map"], ["0:0", "0:1"])
+        self.assertEqual(cmd[cmd.index("-c:v:0") + 1], "copy")
+        self.assertEqual(cmd[cmd.index("-c:a:0") + 1], "aac")
+        self.assertEqual(cmd[-4:], ["-progress", "pipe:1", "-y", "/out/00000.mp4"])
+
+    def test_unprobed_clip_leaves_stream_selection_to_ffmpeg(self):
+        job = ConversionJob("/card/00000.MTS", "/out/00000.mp4")
+        cmd = build_command(job, ConversionOptions())
+
+        self.assertNotIn("-map", cmd)
+        self.assertEqual(cmd[cmd.index("-c:v") + 1], "copy")
+
+    def test_burned_rotation_reencodes_with_a_thread_budget(self):
+        job = ConversionJob("/card/00000.MTS", "/out/00000.mp4", avchd_metadata())
+        cmd = build_command(job, ConversionOptions(rotate=True, threads=3))
+
+        self.assertEqual(cmd[cmd.index("-c:v:0") + 1], "libx264")
+        self.assertEqual(cmd[cmd.index("-vf") + 1], "transpose=2")
+        self.assertEqual(cmd[cmd.index("-threads") + 1], "3")
+
+    def test_trim_seeks_the_input_and_limits_the_length(self):
+        job = ConversionJob("/card/00000.MTS", "/out/00000.mp4", avchd_metadata())
+        cmd = build_command(job, ConversionOptions(trim_start=10.0, trim_end=25.0))
+
+        self.assertLess(cmd.index("-ss"), cmd.index("-i"))
+        self.assertEqual(float(cmd[cmd.index("-ss") + 1]), 10.0)
+        self.assertEqual(float(cmd[cmd.index("-t") + 1]), 15.0)
+
+
+class ExpandInputsTest(unittest.TestCase):
+    def test_globs_and_folders_are_expanded_once(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for seed, name in enumerate(("00001.MTS", "00000.MTS", "notes.txt")):
+                write_clip(os.path.join(tmp, name), seed)
+
+            expected = [os.path.join(tmp, "00000.MTS"), os.path.join(tmp, "00001.MTS")]
+            self.assertEqual(expand_inputs([os.path.join(tmp, "*.MTS")]), expected)
+            self.assertEqual(sorted(expand_inputs([tmp, os.path.join(tmp, "00000.MTS")])), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+"""Frame rates of interlaced and progressive streams, and the trims planned with them"""
+import unittest
+
+from probe import StreamInfo
+from trim import COPY, ENCODE, plan_cut
+
+# ffprobe's report of 1080i AVCHD video: r_frame_rate is the field rate
+INTERLACED_AVCHD = {
+    "index": 0, "codec_type": "video", "codec_name": "h264", "profile": "High", "width": 1920, "height": 1080,
+    "pix_fmt": "yuv420p", "field_order": "tt", "r_frame_rate": "60000/1001", "avg_frame_rate": "30000/1001",
+}
+
+
+class FrameRateTest(unittest.TestCase):
+    def test_interlaced_stream_uses_the_frame_rate(self):
+        stream = StreamInfo.from_ffprobe(INTERLACED_AVCHD)
+        self.assertAlmostEqual(stream.fps, 30000 / 1001)
+        self.assertEqual(stream.field_order, "tt")
+
+    def test_unknown_average_falls_back_to_the_base_rate(self):
+        stream = StreamInfo.from_ffprobe(dict(INTERLACED_AVCHD, field_order="progressive", avg_frame_rate="0/0",
+                                              r_frame_rate="25/1"))
+        self.assertEqual(stream.fps, 25.0)
+
+    def test_audio_has_no_frame_rate(self):
+        stream = StreamInfo.from_ffprobe({"index": 1, "codec_type": "audio", "avg_frame_rate": "0/0",
+                                          "r_frame_rate": "0/0", "sample_rate": "48000"})
+        self.assertEqual(stream.fps, 0.0)
+
+    def test_trim_of_interlaced_clip_counts_frames_not_fields(self):
+        fps = StreamInfo.from_ffprobe(INTERLACED_AVCHD).fps
+        # One keyframe every 15 frames (half a second), starting at the file's start time of 1.0
+        keyframes = [1.0 + i * 15 / fps for i in range(40)]
+        pieces = plan_cut(keyframes, 1.0, fps, 1.2, 10.2, min_copy=2.0)
+
+        self.assertEqual([piece.action for piece in pieces], [ENCODE, COPY, ENCODE])
+        # Frames 36 to 306 at 29.97 fps; the field rate would have doubled every count
+        self.assertEqual([piece.frames for piece in pieces], [9, 255, 6])
+        self.assertEqual(sum(piece.frames for piece in pieces), round(9.0 * fps))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,142 @@
+"""Admission control and priorities of conversions"""
+import os
+import sys
+import subprocess
+import threading
+import unittest
+from unittest import mock
+
+from governor import BACKGROUND, BATCH, PRIORITIES, ResourceGovernor, set_priority
+from runner import ConversionCancelled, JobControl
+
+GIB = 1024 * 1024 * 1024
+
+
+class GovernorTestCase(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.multiple("governor", load_per_cpu=mock.DEFAULT, memory_status=mock.DEFAULT,
+                                      ADMIT_POLL=0.01)
+        mocks = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.load, self.memory = mocks["load_per_cpu"], mocks["memory_status"]
+        self.load.return_value = 0.1
+        self.memory.return_value = (8 * GIB, 0.0)
+
+    def governor(self, **kwargs):
+        kwargs.setdefault("max_load", 1.5)
+        kwargs.setdefault("min_free_mb", 512)
+        return ResourceGovernor(**kwargs)
+
+
+class ThreadBudgetTest(GovernorTestCase):
+    @mock.patch("os.cpu_count", return_value=8)
+    def test_cores_are_split_between_jobs(self, _):
+        self.assertEqual(self.governor(max_jobs=1).threads, 8)
+        self.assertEqual(self.governor(max_jobs=3).threads, 2)
+        self.assertEqual(self.governor(max_jobs=16).threads, 1)
+
+    def test_explicit_thread_count(self):
+        self.assertEqual(self.governor(max_jobs=4, threads=3).threads, 3)
+
+
+class PressureTest(GovernorTestCase):
+    def test_idle_machine(self):
+        self.assertIsNone(self.governor().pressure())
+
+    def test_high_load(self):
+        self.load.return_value = 2.0
+        self.assertEqual(self.governor().pressure(), "load average 2.00 per CPU core")
+        self.assertIsNone(self.governor(max_load=0).pressure())
+
+    def test_low_memory(self):
+        self.memory.return_value = (100 * 1024 * 1024, 0.0)
+        self.assertEqual(self.governor().pressure(), "only 100 MB of memory available")
+
+    def test_memory_pressure(self):
+        self.memory.return_value = (8 * GIB, 25.0)
+        self.assertEqual(self.governor().pressure(), "memory pressure 25%")
+
+    def test_unknown_readings_are_no_pressure(self):
+        self.load.return_value = None
+        self.memory.return_value = (None, None)
+        self.assertIsNone(self.governor().pressure())
+
+
+class AdmitTest(GovernorTestCase):
+    def start_waiting(self, governor, **kwargs):
+        """Try to admit a job on a thread; returns (thread, event set once it was admitted)"""
+        admitted = threading.Event()
+        errors = []
+
+        def run():
+            try:
+                with governor.admit(**kwargs):
+                    admitted.set()
+            except ConversionCancelled as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread, admitted, errors
+
+    def test_job_starts_when_nothing_runs_despite_the_load(self):
+        self.load.return_value = 10.0
+        with self.governor(max_jobs=2).admit() as threads:
+            self.assertGreaterEqual(threads, 1)
+
+    def test_job_waits_for_a_free_slot(self):
+        governor = self.governor(max_jobs=1)
+        with governor.admit():
+            thread, admitted, _ = self.start_waiting(governor)
+            self.assertFalse(admitted.wait(0.1))
+        self.assertTrue(admitted.wait(5))
+        thread.join()
+
+    def test_job_waits_for_the_load_to_drop_while_another_runs(self):
+        governor = self.governor(max_jobs=2)
+        self.load.return_value = 3.0
+        reasons = []
+        with governor.admit():
+            thread, admitted, _ = self.start_waiting(governor, on_wait=reasons.append)
+            self.assertFalse(admitted.wait(0.1))
+            self.load.return_value = 0.5
+            self.assertTrue(admitted.wait(5))
+        thread.join()
+        self.assertEqual(reasons, ["load average 3.00 per CPU core"])
+
+    def test_paused_job_waits_and_cancelled_job_gives_up(self):
+        governor = self.governor()
+        control = JobControl()
+        control.pause()
+        thread, admitted, errors = self.start_waiting(governor, control=control)
+        self.assertFalse(admitted.wait(0.1))
+        control.cancel()
+        thread.join(5)
+        self.assertFalse(admitted.is_set())
+        self.assertEqual(len(errors), 1)
+
+
+@unittest.skipUnless(hasattr(os, "getpriority"), "process priorities are POSIX only")
+class SetPriorityTest(unittest.TestCase):
+    def child(self):
+        process = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+        self.addCleanup(process.wait)
+        self.addCleanup(process.kill)
+        return process
+
+    def test_child_priority_is_lowered(self):
+        process = self.child()
+        set_priority(BACKGROUND, process.pid)
+        self.assertEqual(os.getpriority(os.PRIO_PROCESS, process.pid),
+                         max(PRIORITIES[BACKGROUND][0], os.getpriority(os.PRIO_PROCESS, 0)))
+
+    def test_priority_is_never_raised(self):
+        process = self.child()
+        set_priority(BACKGROUND, process.pid)
+        set_priority(BATCH, process.pid)
+        self.assertEqual(os.getpriority(os.PRIO_PROCESS, process.pid),
+                         max(PRIORITIES[BACKGROUND][0], os.getpriority(os.PRIO_PROCESS, 0)))
+
+
+if __name__ == "__main__":
+    unittest.main()
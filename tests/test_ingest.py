@@ -0,0 +1,106 @@
+"""Importing clips from files, folders and card copies"""
+import os
+import tempfile
+import unittest
+
+from ingest import AVCHD_STREAM_DIR, collect_files, find_duplicates, sniff_container
+
+
+def write_clip(path, seed):
+    """Write a tiny file that sniffs as an MPEG transport stream, distinct for each seed"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        for i in range(4):
+            f.write(bytes([0x47]) + bytes([(seed + i) % 256]) * 187)
+
+
+def write_file(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(content)
+
+
+class IngestTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def path(self, *parts):
+        return os.path.join(self.tmp.name, *parts)
+
+
+class SniffTest(IngestTestCase):
+    def test_transport_streams(self):
+        write_clip(self.path("a.MTS"), 1)
+        self.assertEqual(sniff_container(self.path("a.MTS")), "mpegts")
+        write_file(self.path("b.m2ts"), b"".join(b"\0\0\0\0\x47" + bytes(187) for _ in range(4)))
+        self.assertEqual(sniff_container(self.path("b.m2ts")), "m2ts")
+
+    def test_short_transport_stream(self):
+        write_file(self.path("a.ts"), b"\x47" + bytes(187) + b"\x47" + bytes(100))
+        self.assertEqual(sniff_container(self.path("a.ts")), "mpegts")
+
+    def test_mp4(self):
+        write_file(self.path("a.mp4"), b"\0\0\0\x18ftypisom" + bytes(200))
+        self.assertEqual(sniff_container(self.path("a.mp4")), "mp4")
+
+    def test_unknown_or_missing(self):
+        write_file(self.path("a.MTS"), b"not a video" * 100)
+        self.assertIsNone(sniff_container(self.path("a.MTS")))
+        self.assertIsNone(sniff_container(self.path("missing.MTS")))
+
+
+class CollectFilesTest(IngestTestCase):
+    def test_folders_are_searched_for_clips(self):
+        write_clip(self.path("clips", "00001.MTS"), 1)
+        write_clip(self.path("clips", "day", "00000.m2ts"), 2)
+        write_file(self.path("clips", "notes.txt"), b"notes")
+        write_clip(self.path("clips", ".hidden", "00002.MTS"), 3)
+
+        result = collect_files([self.path("clips")])
+        self.assertEqual(result.files, [self.path("clips", "00001.MTS"), self.path("clips", "day", "00000.m2ts")])
+
+    def test_card_is_only_searched_below_its_stream_folder(self):
+        write_clip(self.path("card", AVCHD_STREAM_DIR, "00000.MTS"), 1)
+        write_clip(self.path("card", "PRIVATE", "AVCHD", "BACKUP", "00000.MTS"), 2)
+
+        self.assertEqual(collect_files([self.path("card")]).files, [self.path("card", AVCHD_STREAM_DIR, "00000.MTS")])
+        self.assertEqual(collect_files([self.path()]).files, [self.path("card", AVCHD_STREAM_DIR, "00000.MTS")])
+
+    def test_files_without_a_known_container_are_rejected(self):
+        write_clip(self.path("clips", "00000.MTS"), 1)
+        write_file(self.path("clips", "00001.MTS"), b"not a video" * 100)
+
+        result = collect_files([self.path("clips")])
+        self.assertEqual(result.files, [self.path("clips", "00000.MTS")])
+        self.assertEqual(result.rejected, [self.path("clips", "00001.MTS")])
+
+    def test_copies_of_a_clip_are_imported_once(self):
+        write_clip(self.path("a", "00000.MTS"), 1)
+        write_clip(self.path("b", "00000.MTS"), 1)
+        write_clip(self.path("b", "00001.MTS"), 2)
+
+        result = collect_files([self.path("a"), self.path("b")])
+        self.assertEqual(result.files, [self.path("a", "00000.MTS"), self.path("b", "00001.MTS")])
+        self.assertEqual(result.duplicates, {self.path("b", "00000.MTS"): self.path("a", "00000.MTS")})
+
+    def test_known_files_and_their_copies_are_left_out(self):
+        write_clip(self.path("a", "00000.MTS"), 1)
+        write_clip(self.path("b", "00000.MTS"), 1)
+        write_clip(self.path("b", "00001.MTS"), 2)
+
+        result = collect_files([self.path("a"), self.path("b")], known=[self.path("a", "00000.MTS")])
+        self.assertEqual(result.files, [self.path("b", "00001.MTS")])
+
+    def test_explicit_files_are_taken_as_they_are(self):
+        write_file(self.path("clip.MTS"), b"not a video" * 100)
+        self.assertEqual(collect_files([self.path("clip.MTS"), self.path("clip.MTS")]).files, [self.path("clip.MTS")])
+
+    def test_files_of_equal_size_with_different_content_are_kept(self):
+        write_clip(self.path("a", "00000.MTS"), 1)
+        write_clip(self.path("a", "00001.MTS"), 2)
+        self.assertEqual(find_duplicates([self.path("a", "00000.MTS"), self.path("a", "00001.MTS")]), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
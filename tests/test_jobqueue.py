@@ -0,0 +1,194 @@
+"""The SQLite job queue on a temporary database"""
+import os
+import json
+import tempfile
+import threading
+import unittest
+
+from engine import ConversionJob, ConversionOptions
+from jobqueue import CANCEL, CANCELLED, DONE, FAILED, PAUSE, PENDING, RUNNING, JobQueue, options_from_json
+from probe import VideoMetadata
+
+
+class QueueTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.db_path = os.path.join(self.tmp.name, "jobs.sqlite3")
+        self.queue = JobQueue(self.db_path)
+        self.addCleanup(self.queue.close)
+
+    def enqueue(self, name, batch="batch", **kwargs):
+        return self.queue.enqueue(f"/card/{name}.MTS", f"/out/{name}.mp4", ConversionOptions(), batch, **kwargs)
+
+
+class JobQueueTest(QueueTestCase):
+    def test_jobs_are_claimed_oldest_first(self):
+        first, second = self.enqueue("00000"), self.enqueue("00001")
+
+        job = self.queue.claim("host:1")
+        self.assertEqual((job["id"], job["state"], job["worker"], job["attempts"]), (first, RUNNING, "host:1", 1))
+        self.assertEqual(self.queue.claim("host:2")["id"], second)
+        self.assertIsNone(self.queue.claim("host:3"))
+
+    def test_finished_job_is_not_claimed_again(self):
+        job_id = self.enqueue("00000")
+        self.queue.claim("host:1")
+        self.queue.finish(job_id)
+
+        self.assertEqual(self.queue.get(job_id)["state"], DONE)
+        self.assertEqual(self.queue.get(job_id)["progress"], 1)
+        self.assertIsNone(self.queue.claim("host:1"))
+
+    def test_failed_job_is_retried_until_out_of_attempts(self):
+        job_id = self.enqueue("00000", max_attempts=2)
+        self.queue.claim("host:1")
+        self.queue.fail(job_id, "first error")
+        self.assertEqual(self.queue.get(job_id)["state"], PENDING)
+
+        self.assertEqual(self.queue.claim("host:1")["attempts"], 2)
+        self.queue.fail(job_id, "second error")
+        job = self.queue.get(job_id)
+        self.assertEqual((job["state"], job["error"]), (FAILED, "second error"))
+
+    def test_jobs_of_unresponsive_workers_are_requeued(self):
+        retried, exhausted = self.enqueue("00000"), self.enqueue("00001", max_attempts=1)
+        self.queue.claim("host:1")
+        self.queue.claim("host:1")
+
+        self.queue.requeue_stale(stale_seconds=60)  # Heartbeats are fresh
+        self.assertEqual(self.queue.get(retried)["state"], RUNNING)
+        self.queue.requeue_stale(stale_seconds=-1)
+        self.assertEqual(self.queue.get(retried)["state"], PENDING)
+        self.assertEqual(self.queue.get(exhausted)["state"], FAILED)
+        self.assertEqual(self.queue.get(exhausted)["error"], "worker stopped responding")
+
+    def test_concurrent_workers_never_claim_the_same_job(self):
+        job_ids = [self.enqueue(f"{i:05d}") for i in range(40)]
+        claimed = []
+        lock = threading.Lock()
+
+        def worker(name):
+            queue = JobQueue(self.db_path)
+            try:
+                while True:
+                    job = queue.claim(name)
+                    if job is None:
+                        return
+                    with lock:
+                        claimed.append(job["id"])
+            finally:
+                queue.close()
+
+        threads = [threading.Thread(target=worker, args=(f"host:{i}",)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(claimed), job_ids)
+
+    def test_batch_is_queued_with_weights_and_inputs(self):
+        parts = [VideoMetadata(f"/card/0000{i}.MTS", 0, 0, duration=30.0) for i in range(2)]
+        spanned = ConversionJob(parts[0].path, "/out/00000-00001.mp4", parts[0], parts)
+        single = ConversionJob("/card/00005.MTS", "/out/00005.mp4", VideoMetadata("/card/00005.MTS", 0, 0, 20.0))
+        unknown = ConversionJob("/card/00006.MTS", "/out/00006.mp4")
+        job_ids = self.queue.enqueue_many([
+            (spanned, ConversionOptions()),
+            (single, ConversionOptions(trim_start=5.0, trim_end=15.0)),
+            (unknown, ConversionOptions()),
+        ], batch="batch")
+
+        jobs = self.queue.jobs("batch")
+        self.assertEqual([job["id"] for job in jobs], job_ids)
+        self.assertEqual([job["weight"] for job in jobs], [60.0, 10.0, 1.0])
+        self.assertEqual(json.loads(jobs[0]["inputs"]), [part.path for part in parts])
+        self.assertEqual(options_from_json(jobs[1]["options"]).trim_start, 5.0)
+
+    def test_options_from_newer_versions_are_ignored(self):
+        options = options_from_json(json.dumps({"rotate": True, "from_the_future": 1}))
+        self.assertEqual(options, ConversionOptions(rotate=True))
+
+
+class QueueControlTest(QueueTestCase):
+    def test_paused_jobs_are_not_claimed_until_resumed(self):
+        paused, other = self.enqueue("00000"), self.enqueue("00001")
+        self.queue.pause([paused])
+        self.assertEqual(self.queue.control(paused), PAUSE)
+
+        self.assertEqual(self.queue.claim("host:1")["id"], other)
+        self.assertIsNone(self.queue.claim("host:1"))
+        self.queue.resume([paused])
+        self.assertIsNone(self.queue.control(paused))
+        self.assertEqual(self.queue.claim("host:1")["id"], paused)
+
+    def test_running_job_is_asked_to_pause(self):
+        job_id = self.enqueue("00000")
+        self.queue.claim("host:1")
+        self.queue.pause(batch="batch")
+        self.assertEqual(self.queue.get(job_id)["state"], RUNNING)
+        self.assertEqual(self.queue.control(job_id), PAUSE)
+
+    def test_cancel_stops_pending_jobs_and_asks_workers_to_stop_running_ones(self):
+        running, pending = self.enqueue("00000"), self.enqueue("00001")
+        finished = self.enqueue("00002")
+        self.queue.claim("host:1")
+        self.queue.finish(finished)
+        self.queue.cancel(batch="batch")
+
+        self.assertEqual(self.queue.get(pending)["state"], CANCELLED)
+        self.assertEqual((self.queue.get(running)["state"], self.queue.control(running)), (RUNNING, CANCEL))
+        self.assertEqual(self.queue.get(finished)["state"], DONE)
+        self.queue.mark_cancelled(running)
+        self.assertEqual((self.queue.get(running)["state"], self.queue.control(running)), (CANCELLED, None))
+
+    def test_cancel_overrides_pause(self):
+        job_id = self.enqueue("00000")
+        self.queue.pause([job_id])
+        self.queue.cancel([job_id])
+        self.assertEqual((self.queue.get(job_id)["state"], self.queue.control(job_id)), (CANCELLED, None))
+
+    def test_selection_is_limited_to_the_batch(self):
+        mine, theirs = self.enqueue("00000"), self.enqueue("00001", batch="other")
+        self.queue.cancel(batch="batch")
+        self.assertEqual(self.queue.get(mine)["state"], CANCELLED)
+        self.assertEqual(self.queue.get(theirs)["state"], PENDING)
+
+    def test_prioritized_jobs_run_first_in_the_given_order(self):
+        job_ids = [self.enqueue(f"{i:05d}") for i in range(4)]
+        self.queue.prioritize([job_ids[3], job_ids[2]])
+        self.assertEqual([self.queue.claim("host:1")["id"] for _ in job_ids],
+                         [job_ids[3], job_ids[2], job_ids[0], job_ids[1]])
+
+    def test_prioritizing_again_moves_ahead_of_earlier_priorities(self):
+        job_ids = [self.enqueue(f"{i:05d}") for i in range(3)]
+        self.queue.prioritize([job_ids[1]])
+        self.queue.prioritize([job_ids[2]])
+        self.assertEqual(self.queue.claim("host:1")["id"], job_ids[2])
+        self.assertEqual(self.queue.claim("host:1")["id"], job_ids[1])
+
+    def test_control_of_unknown_job(self):
+        self.assertIsNone(self.queue.control(12345))
+
+
+class StagingReservationTest(QueueTestCase):
+    def test_workers_reserve_different_jobs(self):
+        job_ids = [self.enqueue(f"{i:05d}") for i in range(4)]
+        self.assertEqual([job["id"] for job in self.queue.reserve_upcoming("host:1", 2)], job_ids[:2])
+        self.assertEqual([job["id"] for job in self.queue.reserve_upcoming("host:2", 2)], job_ids[2:])
+        self.assertEqual([job["id"] for job in self.queue.reserve_upcoming("host:1", 3)], job_ids[:2])
+
+    def test_worker_claims_the_jobs_it_staged_first(self):
+        job_ids = [self.enqueue(f"{i:05d}") for i in range(3)]
+        self.queue.reserve_upcoming("host:1", 1)
+        self.queue.reserve_upcoming("host:2", 1)
+        self.assertEqual(self.queue.claim("host:2")["id"], job_ids[1])
+        self.assertEqual(self.queue.claim("host:1")["id"], job_ids[0])
+
+    def test_paused_jobs_are_not_reserved(self):
+        job_ids = [self.enqueue(f"{i:05d}") for i in range(2)]
+        self.queue.pause([job_ids[0]])
+        self.assertEqual([job["id"] for job in self.queue.reserve_upcoming("host:1", 2)], job_ids[1:])
+
+
+if __name__ == "__main__":
+    unittest.main()
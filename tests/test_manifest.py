@@ -0,0 +1,105 @@
+"""Output manifest and the option keys it records"""
+import os
+import tempfile
+import unittest
+
+from engine import ROTATE_FAST, ConversionJob, ConversionOptions, job_output_key, output_is_current
+from manifest import OutputManifest
+from probe import StreamInfo, VideoMetadata
+from profiles import AUTO
+
+
+def avchd_metadata(path):
+    """A probed AVCHD clip: H.264 video and AC-3 audio"""
+    return VideoMetadata(path, 1000, 0, duration=60.0, streams=[
+        StreamInfo(0, "video", "h264", width=1920, height=1080, fps=29.97),
+        StreamInfo(1, "audio", "ac3", sample_rate=48000, channels=2),
+    ])
+
+
+def write_file(path, content):
+    with open(path, "wb") as f:
+        f.write(content)
+
+
+class OutputManifestTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.input_path = os.path.join(self.tmp.name, "00000.MTS")
+        self.output_path = os.path.join(self.tmp.name, "out", "00000.mp4")
+        os.makedirs(os.path.dirname(self.output_path))
+        write_file(self.input_path, b"\x47" * 188)
+        write_file(self.output_path, b"converted")
+        self.manifest = OutputManifest(os.path.dirname(self.output_path))
+        self.key = ConversionOptions().output_key()
+        self.manifest.record(self.output_path, [self.input_path], self.key)
+
+    def test_recorded_output_is_current(self):
+        self.assertTrue(self.manifest.is_current(self.output_path, [self.input_path], self.key))
+        self.assertTrue(OutputManifest(self.manifest.output_dir).is_current(
+            self.output_path, [self.input_path], self.key))
+
+    def test_changed_options_are_not_current(self):
+        key = ConversionOptions(rotate=True).output_key()
+        self.assertFalse(self.manifest.is_current(self.output_path, [self.input_path], key))
+
+    def test_changed_input_is_not_current(self):
+        write_file(self.input_path, b"\x47" * 376)
+        self.assertFalse(self.manifest.is_current(self.output_path, [self.input_path], self.key))
+
+    def test_touched_input_with_same_content_is_current(self):
+        os.utime(self.input_path, ns=(0, 0))
+        self.assertTrue(self.manifest.is_current(self.output_path, [self.input_path], self.key))
+
+    def test_modified_or_missing_output_is_not_current(self):
+        write_file(self.output_path, b"something else")
+        self.assertFalse(self.manifest.is_current(self.output_path, [self.input_path], self.key))
+        os.unlink(self.output_path)
+        self.assertFalse(self.manifest.is_current(self.output_path, [self.input_path], self.key))
+
+    def test_unknown_output_is_not_current(self):
+        other = os.path.join(self.manifest.output_dir, "00001.mp4")
+        write_file(other, b"converted")
+        self.assertFalse(self.manifest.is_current(other, [self.input_path], self.key))
+
+    def test_output_is_current_honours_incremental(self):
+        job = ConversionJob(self.input_path, self.output_path)
+        options = ConversionOptions()
+        self.manifest.record(self.output_path, [self.input_path], job_output_key(job, options))
+        self.assertTrue(output_is_current(job, options))
+        self.assertFalse(output_is_current(job, ConversionOptions(incremental=False)))
+
+
+class OutputKeyTest(unittest.TestCase):
+    def test_scheduling_options_are_ignored(self):
+        self.assertEqual(ConversionOptions().output_key(),
+                         ConversionOptions(max_workers=3, segments=4, threads=2, deadline=60).output_key())
+
+    def test_copied_video_ignores_the_profile(self):
+        job = ConversionJob("/card/00000.MTS", "/out/00000.mp4", avchd_metadata("/card/00000.MTS"))
+        fast = ConversionOptions(profile="fast")
+        key = job_output_key(job, fast)
+        self.assertNotIn("profile", key)
+        self.assertEqual(key, job_output_key(job, ConversionOptions(profile="archive")))
+        self.assertEqual(job_output_key(job, ConversionOptions(rotate=True, rotate_method=ROTATE_FAST)),
+                         job_output_key(job, ConversionOptions(rotate=True, rotate_method=ROTATE_FAST,
+                                                               profile="archive")))
+
+    def test_reencoded_video_records_the_profile(self):
+        job = ConversionJob("/card/00000.MTS", "/out/00000.mp4", avchd_metadata("/card/00000.MTS"))
+        self.assertEqual(job_output_key(job, ConversionOptions(rotate=True, profile="fast"))["profile"], "fast")
+        self.assertEqual(job_output_key(job, ConversionOptions(trim_start=5.0, profile="fast"))["profile"], "fast")
+
+    def test_automatic_profile_is_recorded_as_auto(self):
+        job = ConversionJob("/card/00000.MTS", "/out/00000.mp4", avchd_metadata("/card/00000.MTS"))
+        options = ConversionOptions(rotate=True, profile="fast", requested_profile=AUTO)
+        self.assertEqual(job_output_key(job, options)["profile"], AUTO)
+
+    def test_untrimmed_key_has_no_trim_fields(self):
+        self.assertNotIn("trim_start", ConversionOptions().output_key())
+        self.assertIn("trim_start", ConversionOptions(trim_end=10.0).output_key())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+"""Output names of clips imported from several folders"""
+import os
+import tempfile
+import unittest
+
+from engine import plan_jobs
+from ingest import AVCHD_STREAM_DIR, collect_files
+
+
+def write_clip(path, seed):
+    """Write a tiny file that sniffs as an MPEG transport stream, distinct for each seed"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        for i in range(4):
+            f.write(bytes([0x47]) + bytes([(seed + i) % 256]) * 187)
+
+
+class OutputNameTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.output_dir = os.path.join(self.tmp.name, "out")
+
+    def plan(self, *inputs):
+        files = collect_files([os.path.join(self.tmp.name, path) for path in inputs]).files
+        return plan_jobs(files, self.output_dir, {path: None for path in files})
+
+    def test_same_clip_names_in_two_folders(self):
+        for seed, folder in enumerate(("monday", "tuesday")):
+            for clip in ("00000.MTS", "00001.MTS"):
+                write_clip(os.path.join(self.tmp.name, folder, clip), seed * 10 + int(clip[4]))
+        jobs = self.plan("monday", "tuesday")
+
+        names = sorted(os.path.basename(job.output_path) for job in jobs)
+        self.assertEqual(names, ["monday-00000.mp4", "monday-00001.mp4", "tuesday-00000.mp4", "tuesday-00001.mp4"])
+        for job in jobs:
+            folder = os.path.basename(os.path.dirname(job.input_path))
+            self.assertTrue(os.path.basename(job.output_path).startswith(folder + "-"))
+
+    def test_cards_are_named_after_the_card(self):
+        for seed, card in enumerate(("CARD_A", "CARD_B")):
+            write_clip(os.path.join(self.tmp.name, card, AVCHD_STREAM_DIR, "00000.MTS"), seed)
+        jobs = self.plan("CARD_A", "CARD_B")
+
+        self.assertEqual(sorted(os.path.basename(job.output_path) for job in jobs),
+                         ["CARD_A-00000.mp4", "CARD_B-00000.mp4"])
+
+    def test_unique_names_are_kept(self):
+        write_clip(os.path.join(self.tmp.name, "monday", "00000.MTS"), 0)
+        write_clip(os.path.join(self.tmp.name, "tuesday", "00001.MTS"), 1)
+        jobs = self.plan("monday", "tuesday")
+
+        self.assertEqual(sorted(os.path.basename(job.output_path) for job in jobs), ["00000.mp4", "00001.mp4"])
+
+    def test_counter_when_folder_names_also_collide(self):
+        write_clip(os.path.join(self.tmp.name, "a", "clips", "00000.MTS"), 0)
+        write_clip(os.path.join(self.tmp.name, "b", "clips", "00000.MTS"), 1)
+        jobs = self.plan("a", "b")
+
+        self.assertEqual(sorted(os.path.basename(job.output_path) for job in jobs),
+                         ["clips-00000-2.mp4", "clips-00000.mp4"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+"""Per-stream copy/transcode/drop decisions"""
+import unittest
+
+from engine import ConversionOptions
+from planner import COPY, DROP, TRANSCODE, fallback_args, plan_streams
+from probe import StreamInfo, VideoMetadata
+from profiles import get_profile
+
+
+def metadata(*streams):
+    return VideoMetadata("/card/00000.MTS", 1000, 0, duration=60.0, streams=list(streams))
+
+
+H264 = StreamInfo(0, "video", "h264", profile="High", width=1920, height=1080, fps=29.97)
+AC3 = StreamInfo(1, "audio", "ac3", sample_rate=48000, channels=2)
+AAC = StreamInfo(2, "audio", "aac", sample_rate=48000, channels=2)
+
+
+class PlanStreamsTest(unittest.TestCase):
+    def test_mp4_compatible_streams_are_copied(self):
+        plan = plan_streams(metadata(H264, AAC), ConversionOptions())
+        self.assertEqual([d.action for d in plan.streams], [COPY, COPY])
+        self.assertEqual(plan.video_args(), ["-c:v:0", "copy"])
+        self.assertEqual(plan.audio_args(), ["-c:a:0", "copy"])
+        self.assertFalse(plan.transcodes_video())
+
+    def test_ac3_audio_is_converted_to_aac(self):
+        plan = plan_streams(metadata(H264, AC3), ConversionOptions())
+        self.assertEqual(plan.streams[1].action, TRANSCODE)
+        self.assertEqual(plan.audio_args(), ["-c:a:0", "aac", "-b:a:0", "192k"])
+
+    def test_audio_streams_are_numbered_in_output_order(self):
+        plan = plan_streams(metadata(H264, AC3, AAC), ConversionOptions())
+        self.assertEqual(plan.audio_args(), ["-c:a:0", "aac", "-b:a:0", "192k", "-c:a:1", "copy"])
+        self.assertTrue(plan.has_audio())
+
+    def test_unsupported_and_extra_streams_are_dropped(self):
+        extra_video = StreamInfo(3, "video", "h264")
+        data = StreamInfo(4, "data", "bin_data")
+        plan = plan_streams(metadata(H264, AC3, extra_video, data), ConversionOptions())
+        self.assertEqual([d.action for d in plan.streams], [COPY, TRANSCODE, DROP, DROP])
+        self.assertEqual([d.index for d in plan.kept], [0, 1])
+        self.assertEqual(plan.map_args(), ["-map", "0:0", "-map", "0:1"])
+
+    def test_map_args_of_one_stream_type(self):
+        plan = plan_streams(metadata(H264, AC3, AAC), ConversionOptions())
+        self.assertEqual(plan.map_args("video"), ["-map", "0:0"])
+        self.assertEqual(plan.map_args("audio"), ["-map", "0:1", "-map", "0:2"])
+
+    def test_incompatible_video_is_encoded_with_the_profile(self):
+        mpeg2 = StreamInfo(0, "video", "mpeg2video", width=1920, height=1080)
+        plan = plan_streams(metadata(mpeg2, AAC), ConversionOptions(profile="fast"))
+        self.assertTrue(plan.transcodes_video())
+        self.assertEqual(plan.video_args(), ["-c:v:0", *get_profile("fast").video_encoder_args()])
+
+    def test_burned_rotation_transcodes_video(self):
+        plan = plan_streams(metadata(H264, AAC), ConversionOptions(rotate=True))
+        self.assertTrue(plan.transcodes_video())
+        self.assertIn("transpose=2", plan.video_args())
+        self.assertEqual(plan.streams[1].action, COPY)
+
+    def test_video_only_clip(self):
+        plan = plan_streams(metadata(H264), ConversionOptions())
+        self.assertFalse(plan.has_audio())
+        self.assertEqual(plan.audio_args(), [])
+
+    def test_describe(self):
+        plan = plan_streams(metadata(H264, AC3), ConversionOptions())
+        self.assertEqual(plan.describe()[0], {"stream": 0, "type": "video", "codec": "h264", "action": COPY,
+                                              "reason": "h264 (High) at 29.970 fps: MP4 compatible, copied"})
+
+
+class FallbackTest(unittest.TestCase):
+    def test_unprobed_file_has_no_plan(self):
+        self.assertIsNone(plan_streams(None, ConversionOptions()))
+
+    def test_fallback_copies_video_and_converts_audio(self):
+        self.assertEqual(fallback_args(ConversionOptions()), (["-c:v", "copy"], ["-c:a", "aac", "-b:a", "192k"]))
+
+    def test_fallback_with_burned_rotation(self):
+        video_args, _ = fallback_args(ConversionOptions(rotate=True))
+        self.assertEqual(video_args[:2], ["-c:v", "libx264"])
+        self.assertIn("transpose=2", video_args)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+"""Fast rotation through the display matrix"""
+import unittest
+from unittest import mock
+
+from engine import (ROTATE_BURN, ROTATE_FAST, ConversionJob, ConversionOptions, build_command, codec_args,
+                    input_options)
+from probe import StreamInfo, VideoMetadata
+
+
+def avchd_metadata(path="/card/00000.MTS"):
+    """A probed AVCHD clip: H.264 video and AC-3 audio"""
+    return VideoMetadata(path, 1000, 0, duration=60.0, streams=[
+        StreamInfo(0, "video", "h264", width=1920, height=1080, fps=29.97),
+        StreamInfo(1, "audio", "ac3", sample_rate=48000, channels=2),
+    ])
+
+
+FAST = ConversionOptions(rotate=True, rotate_method=ROTATE_FAST)
+
+
+class FastRotationTest(unittest.TestCase):
+    def setUp(self):
+        self.job = ConversionJob("/card/00000.MTS", "/out/00000.mp4", avchd_metadata())
+
+    def test_options(self):
+        self.assertTrue(FAST.fast_rotation)
+        self.assertFalse(FAST.burn_rotation)
+        burn = ConversionOptions(rotate=True, rotate_method=ROTATE_BURN)
+        self.assertTrue(burn.burn_rotation)
+        self.assertFalse(burn.fast_rotation)
+        self.assertFalse(ConversionOptions(rotate_method=ROTATE_FAST).fast_rotation)
+
+    @mock.patch("engine.ffmpeg_supports_display_rotation", return_value=True)
+    def test_display_rotation_option_copies_video(self, _):
+        self.assertEqual(input_options(FAST), ["-display_rotation:v:0", "90"])
+        _, video_args, _ = codec_args(self.job, FAST)
+        self.assertEqual(video_args, ["-c:v:0", "copy"])
+
+        cmd = build_command(self.job, FAST)
+        self.assertLess(cmd.index("-display_rotation:v:0"), cmd.index("-i"))
+        self.assertNotIn("transpose=2", cmd)
+
+    @mock.patch("engine.ffmpeg_supports_display_rotation", return_value=False)
+    def test_older_ffmpeg_sets_the_rotate_tag(self, _):
+        self.assertEqual(input_options(FAST), [])
+        _, video_args, _ = codec_args(self.job, FAST)
+        self.assertEqual(video_args, ["-c:v:0", "copy", "-metadata:s:v:0", "rotate=270"])
+
+    @mock.patch("engine.ffmpeg_supports_display_rotation", return_value=False)
+    def test_unprobed_clip_sets_the_rotate_tag(self, _):
+        job = ConversionJob("/card/00000.MTS", "/out/00000.mp4")
+        _, video_args, _ = codec_args(job, FAST)
+        self.assertEqual(video_args, ["-c:v", "copy", "-metadata:s:v:0", "rotate=270"])
+
+    @mock.patch("engine.ffmpeg_supports_display_rotation")
+    def test_no_rotation_does_not_ask_ffmpeg(self, supports):
+        self.assertEqual(input_options(ConversionOptions()), [])
+        codec_args(self.job, ConversionOptions())
+        supports.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+"""Keyframe-aligned chunk boundaries and the encodes of segmented conversions"""
+import time
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import segmented
+from runner import ConversionCancelled, ConversionError
+from segmented import MIN_CHUNK_SECONDS, encode_segmented, plan_chunks
+
+
+class PlanChunksTest(unittest.TestCase):
+    def test_boundaries_fall_on_the_nearest_keyframes(self):
+        keyframes = [10.0 + i * 2.0 for i in range(60)]  # Every 2 s, from a start time of 10 s
+        chunks = plan_chunks(keyframes, 10.0, 120.0, 3)
+
+        self.assertEqual(chunks, [(0.0, 40.0), (40.0, 80.0), (80.0, 120.0)])
+
+    def test_uneven_keyframes_still_cover_the_whole_file(self):
+        keyframes = [0.0, 7.0, 31.0, 38.0, 66.0, 90.0]
+        chunks = plan_chunks(keyframes, 0.0, 100.0, 4)
+
+        self.assertEqual(chunks[0][0], 0.0)
+        self.assertEqual(chunks[-1][1], 100.0)
+        for (_, end), (start, _) in zip(chunks, chunks[1:]):
+            self.assertEqual(end, start)
+            self.assertIn(start, keyframes)
+
+    def test_short_file_is_not_split(self):
+        keyframes = [i * 1.0 for i in range(30)]
+        self.assertEqual(plan_chunks(keyframes, 0.0, MIN_CHUNK_SECONDS * 1.5, 4), [(0.0, MIN_CHUNK_SECONDS * 1.5)])
+
+    def test_no_keyframes_inside_the_file(self):
+        self.assertEqual(plan_chunks([0.0], 0.0, 300.0, 4), [(0.0, 300.0)])
+
+    def test_chunk_count_is_limited_by_the_minimum_length(self):
+        keyframes = [i * 1.0 for i in range(100)]
+        chunks = plan_chunks(keyframes, 0.0, 100.0, 16)
+
+        self.assertEqual(len(chunks), int(100.0 // MIN_CHUNK_SECONDS))
+        self.assertTrue(all(end - start >= MIN_CHUNK_SECONDS / 2 for start, end in chunks))
+
+
+class EncodeSegmentedTest(unittest.TestCase):
+    def setUp(self):
+        index = mock.Mock()
+        index.get.return_value = [i * 2.0 for i in range(60)]
+        patcher = mock.patch.object(segmented, "default_index", return_value=index)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.output_path = f"{self.tmp.name}/out.mp4"
+
+    def encode(self, run_ffmpeg):
+        with mock.patch.object(segmented, "run_ffmpeg", side_effect=run_ffmpeg):
+            return encode_segmented("/card/00000.MTS", self.output_path, 120.0, ["-c:v:0", "libx264"],
+                                    ["-c:a:0", "aac"], 3, fps=25.0,
+                                    video_map=["-map", "0:1"], audio_map=["-map", "0:2", "-map", "0:4"])
+
+    def test_streams_are_mapped_like_the_single_process_path(self):
+        commands = []
+        lock = threading.Lock()
+
+        def run_ffmpeg(cmd, *args, **kwargs):
+            with lock:
+                commands.append(cmd)
+
+        self.assertTrue(self.encode(run_ffmpeg))
+        chunks = [cmd for cmd in commands if "chunk" in cmd[-1]]
+        audio = [cmd for cmd in commands if cmd[-1].endswith("audio.mp4")]
+        self.assertEqual(len(chunks), 3)
+        for cmd in chunks:
+            self.assertEqual(cmd[cmd.index("-map"):cmd.index("-map") + 3], ["-map", "0:1", "-an"])
+        self.assertEqual(audio[0][audio[0].index("-map"):audio[0].index("-vn")], ["-map", "0:2", "-map", "0:4"])
+
+    def test_failed_chunk_stops_the_others(self):
+        def run_ffmpeg(cmd, *args, control=None, **kwargs):
+            if cmd[-1].endswith("chunk0001.mp4"):
+                raise ConversionError("chunk failed")
+            # Every other encode runs until it is stopped
+            deadline = time.monotonic() + 10
+            while time.monotonic() < deadline:
+                control.check()
+                time.sleep(0.01)
+
+        started = time.monotonic()
+        with self.assertRaises(ConversionError) as raised:
+            self.encode(run_ffmpeg)
+        self.assertNotIsInstance(raised.exception, ConversionCancelled)
+        self.assertEqual(str(raised.exception), "chunk failed")
+        self.assertLess(time.monotonic() - started, 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
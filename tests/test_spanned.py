@@ -0,0 +1,57 @@
+"""Detection of spanned AVCHD recordings"""
+import unittest
+
+from probe import StreamInfo, VideoMetadata
+from spanned import TS_WRAP_SECONDS, clip_number, group_spanned, is_continuation
+
+
+def clip(path, start_time, duration=600.0, width=1920):
+    return VideoMetadata(path, 0, 0, duration=duration, start_time=start_time, streams=[
+        StreamInfo(0, "video", "h264", width=width, height=1080, fps=29.97),
+        StreamInfo(1, "audio", "ac3", sample_rate=48000, channels=2),
+    ])
+
+
+class SpannedTest(unittest.TestCase):
+    def test_clip_number(self):
+        self.assertEqual(clip_number("/card/00012.MTS"), 12)
+        self.assertIsNone(clip_number("/card/holiday.MTS"))
+
+    def test_continuing_timestamps_are_one_recording(self):
+        self.assertTrue(is_continuation(clip("/card/00000.MTS", 1.0), clip("/card/00001.MTS", 601.2)))
+
+    def test_gap_in_timestamps_starts_a_new_recording(self):
+        self.assertFalse(is_continuation(clip("/card/00000.MTS", 1.0), clip("/card/00001.MTS", 900.0)))
+
+    def test_timestamps_may_wrap_around(self):
+        previous = clip("/card/00000.MTS", TS_WRAP_SECONDS - 300.0)
+        self.assertTrue(is_continuation(previous, clip("/card/00001.MTS", 300.0)))
+
+    def test_clips_must_be_consecutive_in_one_folder_with_the_same_streams(self):
+        previous = clip("/card/00000.MTS", 1.0)
+        self.assertFalse(is_continuation(previous, clip("/card/00002.MTS", 601.0)))
+        self.assertFalse(is_continuation(previous, clip("/other/00001.MTS", 601.0)))
+        self.assertFalse(is_continuation(previous, clip("/card/00001.MTS", 601.0, width=1440)))
+
+    def test_groups_keep_the_order_of_the_list(self):
+        metadata = {
+            "/card/00000.MTS": clip("/card/00000.MTS", 1.0),
+            "/card/00001.MTS": clip("/card/00001.MTS", 601.0),
+            "/card/00002.MTS": clip("/card/00002.MTS", 1201.0, duration=30.0),
+            "/card/00003.MTS": clip("/card/00003.MTS", 5000.0),
+            "/card/holiday.MTS": clip("/card/holiday.MTS", 0.0),
+            "/card/00004.MTS": None,
+        }
+        files = ["/card/holiday.MTS", "/card/00001.MTS", "/card/00003.MTS", "/card/00000.MTS",
+                 "/card/00002.MTS", "/card/00004.MTS"]
+
+        self.assertEqual(group_spanned(files, metadata), [
+            ["/card/holiday.MTS"],
+            ["/card/00000.MTS", "/card/00001.MTS", "/card/00002.MTS"],
+            ["/card/00003.MTS"],
+            ["/card/00004.MTS"],
+        ])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,38 @@
+"""Trim points set on the clips of a spanned recording"""
+import unittest
+
+from engine import ConversionJob, job_trim
+from probe import VideoMetadata
+
+
+def spanned_job(*durations):
+    parts = [VideoMetadata(f"/card/0000{i}.MTS", 0, 0, duration=duration) for i, duration in enumerate(durations)]
+    return ConversionJob(parts[0].path, "/out/00000.mp4", parts[0], parts)
+
+
+class SpannedTrimTest(unittest.TestCase):
+    def test_single_clip_keeps_its_trim(self):
+        job = ConversionJob("/card/00000.MTS", "/out/00000.mp4", None)
+        self.assertEqual(job_trim(job, {"/card/00000.MTS": (5.0, 9.0)}), (5.0, 9.0))
+        self.assertEqual(job_trim(job, {}), (0.0, 0.0))
+
+    def test_points_on_later_clips_move_onto_the_recording(self):
+        job = spanned_job(100.0, 100.0, 50.0)
+        trims = {"/card/00000.MTS": (10.0, 0.0), "/card/00002.MTS": (0.0, 20.0)}
+        self.assertEqual(job_trim(job, trims), (10.0, 220.0))
+        self.assertEqual(job_trim(job, {"/card/00001.MTS": (30.0, 40.0)}), (130.0, 140.0))
+
+    def test_out_point_is_kept_within_its_clip(self):
+        job = spanned_job(100.0, 100.0)
+        self.assertEqual(job_trim(job, {"/card/00000.MTS": (0.0, 150.0)}), (0.0, 100.0))
+
+    def test_ambiguous_points_are_rejected(self):
+        job = spanned_job(100.0, 100.0)
+        with self.assertRaises(ValueError):
+            job_trim(job, {"/card/00000.MTS": (10.0, 0.0), "/card/00001.MTS": (10.0, 0.0)})
+        with self.assertRaises(ValueError):
+            job_trim(job, {"/card/00000.MTS": (0.0, 50.0), "/card/00001.MTS": (10.0, 0.0)})
+
+
+if __name__ == "__main__":
+    unittest.main()
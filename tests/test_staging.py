@@ -0,0 +1,117 @@
+"""Staging inputs to local scratch space and writing outputs atomically"""
+import os
+import time
+import tempfile
+import unittest
+
+from engine import partial_output_path
+from staging import StagingArea
+
+
+def write_file(path, size):
+    with open(path, "wb") as f:
+        f.write(os.urandom(size))
+
+
+class StagingAreaTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.scratch = os.path.join(self.tmp.name, "scratch")
+        self.sources = []
+        for i in range(3):
+            path = os.path.join(self.tmp.name, f"0000{i}.MTS")
+            write_file(path, 4096)
+            self.sources.append(path)
+
+    def staging(self, **kwargs):
+        staging = StagingArea(scratch_root=self.scratch, **kwargs)
+        self.addCleanup(staging.close)
+        return staging
+
+    def wait_for_copies(self, staging, count, timeout=5.0):
+        """Wait until the copier has started `count` copies (acquire() waits for the rest)"""
+        deadline = time.monotonic() + timeout
+        while len(os.listdir(staging.directory)) < count:
+            self.assertLess(time.monotonic(), deadline, "copies were not made in time")
+            time.sleep(0.01)
+
+    def read(self, path):
+        with open(path, "rb") as f:
+            return f.read()
+
+    def test_staged_file_is_read_from_scratch_space(self):
+        staging = self.staging()
+        staging.stage(self.sources[:1])
+        self.wait_for_copies(staging, 1)
+
+        local = staging.acquire(self.sources[0])
+        self.assertEqual(os.path.dirname(local), staging.directory)
+        self.assertEqual(self.read(local), self.read(self.sources[0]))
+
+        staging.release(self.sources[0])
+        self.assertFalse(os.path.exists(local))
+        self.assertTrue(os.path.exists(self.sources[0]))
+
+    def test_file_that_was_not_staged_is_read_from_its_source(self):
+        staging = self.staging()
+        self.assertEqual(staging.acquire(self.sources[0]), self.sources[0])
+        staging.release(self.sources[0])
+
+    def test_file_bigger_than_the_scratch_space_is_read_from_its_source(self):
+        staging = self.staging(max_bytes=1024)
+        staging.stage(self.sources[:1])
+        self.assertEqual(staging.acquire(self.sources[0]), self.sources[0])
+
+    def test_copies_wait_for_earlier_ones_to_be_used(self):
+        staging = self.staging(lookahead=1)
+        staging.stage(self.sources)
+        self.wait_for_copies(staging, 1)
+        time.sleep(0.1)
+        self.assertEqual(len(os.listdir(staging.directory)), 1)
+
+        staging.acquire(self.sources[0])
+        staging.release(self.sources[0])
+        self.wait_for_copies(staging, 1)
+        self.assertNotEqual(staging.acquire(self.sources[1]), self.sources[1])
+
+    def test_copies_that_are_no_longer_upcoming_are_dropped(self):
+        staging = self.staging()
+        staging.stage(self.sources[:1])
+        self.wait_for_copies(staging, 1)
+
+        staging.stage(self.sources[1:2])
+        self.assertEqual(staging.acquire(self.sources[0]), self.sources[0])
+
+    def test_copy_in_use_is_kept_when_restaging(self):
+        staging = self.staging()
+        staging.stage(self.sources[:1])
+        self.wait_for_copies(staging, 1)
+        local = staging.acquire(self.sources[0])
+
+        staging.stage(self.sources[1:2])
+        self.assertTrue(os.path.exists(local))
+        self.assertEqual(staging.acquire(self.sources[0]), local)
+
+    def test_close_removes_the_scratch_directory(self):
+        staging = StagingArea(scratch_root=self.scratch)
+        staging.stage(self.sources)
+        self.wait_for_copies(staging, 1)
+        staging.close()
+        self.assertFalse(os.path.exists(staging.directory))
+
+
+class PartialOutputTest(unittest.TestCase):
+    def test_partial_output_is_hidden_next_to_the_output(self):
+        path = partial_output_path(os.path.join("out", "00000.mp4"))
+        directory, name = os.path.split(path)
+        self.assertEqual(directory, "out")
+        self.assertTrue(name.startswith(".00000."))
+        self.assertTrue(name.endswith(".part.mp4"))
+
+    def test_partial_outputs_are_unique(self):
+        self.assertNotEqual(partial_output_path("00000.mp4"), partial_output_path("00000.mp4"))
+
+
+if __name__ == "__main__":
+    unittest.main()
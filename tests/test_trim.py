@@ -0,0 +1,86 @@
+"""Time parsing and cut planning of smart-render trims"""
+import unittest
+
+from probe import StreamInfo, VideoMetadata
+from profiles import get_profile
+from trim import COPY, ENCODE, can_smart_trim, edge_encoder_args, format_time, parse_time, plan_cut
+
+# A keyframe every second, as ffprobe reports them for a file starting at 1 s
+KEYFRAMES = [1.0 + i for i in range(20)]
+FPS = 25.0
+
+
+class TimeTest(unittest.TestCase):
+    def test_parse_time(self):
+        self.assertEqual(parse_time("12.5"), 12.5)
+        self.assertEqual(parse_time(" 1:02.5 "), 62.5)
+        self.assertEqual(parse_time("1:00:03"), 3603.0)
+
+    def test_invalid_times(self):
+        for text in ("", "abc", "1:xx", "-5"):
+            with self.assertRaises(ValueError):
+                parse_time(text)
+
+    def test_format_time_round_trips(self):
+        self.assertEqual(format_time(62.5), "1:02.500")
+        self.assertEqual(format_time(3603.25), "1:00:03.250")
+        self.assertEqual(format_time(0), "0:00.000")
+        self.assertAlmostEqual(parse_time(format_time(4321.125)), 4321.125)
+
+
+class PlanCutTest(unittest.TestCase):
+    def assertPieces(self, pieces, expected):
+        self.assertEqual([piece.action for piece in pieces], [action for action, *_ in expected])
+        for piece, (_, start, end, frames) in zip(pieces, expected):
+            self.assertAlmostEqual(piece.start, start)
+            self.assertAlmostEqual(piece.end, end)
+            self.assertEqual(piece.frames, frames)
+
+    def test_edges_are_encoded_and_whole_gops_copied(self):
+        self.assertPieces(plan_cut(KEYFRAMES, 1.0, FPS, 2.2, 8.4), [
+            (ENCODE, 2.2, 3.0, 20),
+            (COPY, 3.0, 8.0, 125),
+            (ENCODE, 8.0, 8.4, 10),
+        ])
+
+    def test_cuts_on_keyframes_need_no_edges(self):
+        self.assertPieces(plan_cut(KEYFRAMES, 1.0, FPS, 3.0, 8.0), [(COPY, 3.0, 8.0, 125)])
+
+    def test_cuts_are_snapped_to_the_frame_grid(self):
+        self.assertPieces(plan_cut(KEYFRAMES, 1.0, FPS, 2.21, 8.39), [
+            (ENCODE, 2.2, 3.0, 20),
+            (COPY, 3.0, 8.0, 125),
+            (ENCODE, 8.0, 8.4, 10),
+        ])
+
+    def test_short_range_is_encoded_in_one_piece(self):
+        self.assertPieces(plan_cut(KEYFRAMES, 1.0, FPS, 2.2, 4.4), [(ENCODE, 2.2, 4.4, 55)])
+        self.assertPieces(plan_cut(KEYFRAMES, 1.0, FPS, 2.2, 8.4, min_copy=10.0), [(ENCODE, 2.2, 8.4, 155)])
+
+    def test_no_keyframes_in_range(self):
+        self.assertPieces(plan_cut([1.0], 1.0, FPS, 2.2, 8.4), [(ENCODE, 2.2, 8.4, 155)])
+
+
+class EdgeEncoderTest(unittest.TestCase):
+    def test_edges_match_the_source_format(self):
+        video = StreamInfo(0, "video", "h264", profile="High", fps=29.97, pix_fmt="yuv420p", field_order="tt")
+        self.assertEqual(edge_encoder_args(video, "fast"), [
+            "-c:v", *get_profile("fast").video_encoder_args(), "-pix_fmt", "yuv420p", "-profile:v", "high",
+            "-flags", "+ildct+ilme", "-top", "1",
+        ])
+
+    def test_progressive_source_of_unknown_profile(self):
+        video = StreamInfo(0, "video", "h264", profile="Unknown", fps=25.0, field_order="progressive")
+        self.assertEqual(edge_encoder_args(video, "fast"), ["-c:v", *get_profile("fast").video_encoder_args()])
+
+    def test_only_h264_with_a_frame_rate_is_smart_trimmed(self):
+        def metadata(codec_name, fps):
+            return VideoMetadata("/card/00000.MTS", 0, 0, streams=[StreamInfo(0, "video", codec_name, fps=fps)])
+        self.assertTrue(can_smart_trim(metadata("h264", 25.0)))
+        self.assertFalse(can_smart_trim(metadata("mpeg2video", 25.0)))
+        self.assertFalse(can_smart_trim(metadata("h264", 0.0)))
+        self.assertFalse(can_smart_trim(None))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""Poster frames and filmstrips from keyframes, cached on disk by content fingerprint
+
+One ffmpeg run extracts every image of a clip. Each image has its own input
+that is seeked to the nearest keyframe with "-noaccurate_seek", and
+"-skip_frame nokey" keeps the decoder from touching anything but keyframes, so
+a clip costs a few seeks and keyframe decodes however long it is. Browsing a
+batch therefore needs no preview encodes.
+
+Images are stored under a key made from the size and partial hash of the
+clip (see fingerprint.py), so a clip keeps its images when it is renamed or
+copied, and a re-recorded file gets new ones. The cache is capped in size;
+the images of the clips looked at least recently are deleted first.
+"""
+import os
+import sys
+import glob
+import time
+import uuid
+import hashlib
+import threading
+
+from probe import cache_dir
+from fingerprint import partial_hash
+from supervisor import ProcessSupervisor, SupervisorError
+from governor import BACKGROUND
+
+# Bump whenever the extraction changes so old cache entries are not reused
+THUMBNAIL_VERSION = 1
+POSTER_WIDTH = 320
+FILMSTRIP_FRAMES = 6
+FILMSTRIP_FRAME_WIDTH = 160
+# Where in the clip the poster frame is taken (fraction of the duration)
+POSTER_POSITION = 0.1
+# Seeking a handful of keyframes should never take long
+EXTRACT_TIMEOUT = 60
+# Default cap for the cache, overridable with VIDEOCONVERTER_THUMBNAIL_CACHE_MB
+DEFAULT_CACHE_MB = 256
+# The cache is trimmed once this share of its cap has been added since the last trim
+EVICT_SLACK = 0.05
+
+
+def frame_times(duration, frames=FILMSTRIP_FRAMES):
+    """Evenly spaced filmstrip times, each in the middle of its part of the clip"""
+    if duration <= 0:
+        return [0.0] * frames
+    return [duration * (i + 0.5) / frames for i in range(frames)]
+
+
+def build_thumbnail_command(video_path, duration, poster_path, filmstrip_path, frames=FILMSTRIP_FRAMES):
+    """Build the ffmpeg command that writes a poster JPEG and a filmstrip JPEG in one run"""
+    times = [duration * POSTER_POSITION if duration > 0 else 0.0, *frame_times(duration, frames)]
+    inputs = []
+    for position in times:
+        # Input seeking jumps straight to a keyframe; nothing else is decoded
+        inputs += ["-skip_frame", "nokey", "-noaccurate_seek", "-ss", f"{position:.3f}", "-i", video_path]
+
+    # The keyframe found can lie before the seek point; restarting each input's timestamps
+    # at zero keeps it from being dropped and lines the filmstrip frames up for hstack
+    filters = [f"[0:v:0]setpts=PTS-STARTPTS,scale={POSTER_WIDTH}:-2[poster]"]
+    filters += [f"[{i + 1}:v:0]setpts=PTS-STARTPTS,scale={FILMSTRIP_FRAME_WIDTH}:-2,setsar=1[f{i}]"
+                for i in range(frames)]
+    filters.append("".join(f"[f{i}]" for i in range(frames)) + f"hstack=inputs={frames}[strip]")
+
+    return [
+        "ffmpeg", "-v", "error", "-nostdin",
+        *inputs,
+        "-filter_complex", ";".join(filters),
+        "-map", "[poster]", "-frames:v", "1", "-q:v", "4", "-y", poster_path,
+        "-map", "[strip]", "-frames:v", "1", "-q:v", "4", "-y", filmstrip_path,
+    ]
+
+
+class ThumbnailCache:
+    """Size-capped LRU cache of poster and filmstrip JPEGs, keyed by the source clip's fingerprint
+
+    As in the preview cache, an image's modification time doubles as its LRU
+    stamp. The cache is trimmed to max_bytes on the first extraction of a
+    session and whenever a few percent of the cap has been added since.
+    """
+
+    def __init__(self, directory=None, max_bytes=None):
+        self.directory = directory or os.path.join(cache_dir(), "thumbnails")
+        os.makedirs(self.directory, exist_ok=True)
+        if max_bytes is None:
+            max_mb = int(os.environ.get("VIDEOCONVERTER_THUMBNAIL_CACHE_MB", DEFAULT_CACHE_MB))
+            max_bytes = max_mb * 1024 * 1024
+        self.max_bytes = max_bytes
+        self._added = None  # Bytes added since the last trim (None: not trimmed yet)
+        # Fingerprints by (path, size, mtime), so a clip is only hashed once per session
+        self._keys = {}
+        self._lock = threading.Lock()
+
+    def key(self, video_path):
+        """Cache key for a clip's content and the extraction parameters"""
+        stat = os.stat(video_path)
+        identity = (os.path.abspath(video_path), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            key = self._keys.get(identity)
+        if key is None:
+            content = f"{stat.st_size}:{partial_hash(video_path, stat.st_size)}:{FILMSTRIP_FRAMES}:{THUMBNAIL_VERSION}"
+            key = hashlib.sha1(content.encode("ascii")).hexdigest()
+            with self._lock:
+                self._keys[identity] = key
+        return key
+
+    def _paths(self, key):
+        return os.path.join(self.directory, key + ".poster.jpg"), os.path.join(self.directory, key + ".strip.jpg")
+
+    def get(self, video_path):
+        """Return (poster, filmstrip) paths for a clip if both are cached (marking them as recently used), else None"""
+        try:
+            paths = self._paths(self.key(video_path))
+            for path in paths:
+                os.utime(path)
+        except OSError:
+            return None
+        return paths
+
+    def generate(self, video_path, duration, low_priority=True):
+        """Extract a clip's poster and filmstrip into the cache; returns their paths (None on failure)"""
+        poster_path, filmstrip_path = self._paths(self.key(video_path))
+        suffix = f".{uuid.uuid4().hex}.part.jpg"
+        temp_paths = (poster_path + suffix, filmstrip_path + suffix)
+        cmd = build_thumbnail_command(video_path, duration, *temp_paths)
+        supervisor = ProcessSupervisor(
+            cmd, timeout=EXTRACT_TIMEOUT,
+            priority=BACKGROUND if low_priority else None
+        )
+        try:
+            ok = supervisor.run() == 0 and all(os.path.exists(p) for p in temp_paths)
+        except SupervisorError as e:
+            ok = False
+            supervisor.stderr_lines.append(str(e))
+
+        if ok:
+            # Readers only ever see complete images
+            os.replace(temp_paths[0], poster_path)
+            os.replace(temp_paths[1], filmstrip_path)
+            self._stored(os.path.getsize(poster_path) + os.path.getsize(filmstrip_path))
+            return poster_path, filmstrip_path
+        for temp_path in temp_paths:
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+        print(f"Thumbnail extraction failed for {video_path}: {supervisor.stderr_tail.strip()}", file=sys.stderr)
+        return None
+
+    def _stored(self, size):
+        """Count a new entry and trim the cache when enough has been added"""
+        with self._lock:
+            due = self._added is None or self._added + size > self.max_bytes * EVICT_SLACK
+            self._added = 0 if due else self._added + size
+        if due:
+            self.evict()
+
+    def evict(self):
+        """Delete the least recently used clips' images until the cache fits in max_bytes
+
+        Temporary files left by extractions that never finished are deleted too.
+        """
+        entries = {}  # key -> [last use, bytes, paths]
+        for path in glob.glob(os.path.join(self.directory, "*.jpg")):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if path.endswith(".part.jpg"):
+                if time.time() - stat.st_mtime > EXTRACT_TIMEOUT * 2:
+                    self._unlink(path)
+                continue
+            entry = entries.setdefault(os.path.basename(path).split(".")[0], [0.0, 0, []])
+            entry[0] = max(entry[0], stat.st_mtime)
+            entry[1] += stat.st_size
+            entry[2].append(path)
+
+        total = sum(size for _, size, _ in entries.values())
+        for _, size, paths in sorted(entries.values()):
+            if total <= self.max_bytes:
+                break
+            for path in paths:
+                self._unlink(path)
+            total -= size
+
+    def _unlink(self, path):
+        try:
+            os.unlink(path)
+        except OSError as e:
+            print(f"Error evicting thumbnail {path}: {str(e)}", file=sys.stderr)
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""Smart-render trimming: copy whole GOPs, re-encode only the partial GOPs at the cuts
+
+A clip is trimmed to [in, out) without re-encoding what lies between its
+first keyframe after the in point and its last keyframe before the out
+point; that run of whole GOPs is stream-copied. Only the frames from the in
+point up to that first keyframe, and from that last keyframe up to the out
+point, are decoded and encoded again (with the source's profile and pixel
+format), so cutting a few seconds from an hour-long clip costs a few seconds
+of encoding plus one copy.
+
+Every piece is cut by frame count on the source's frame grid and carries its
+H.264 parameter sets in-band, so the concat demuxer can join pieces from
+different encoders into one stream. Audio is cut (and converted if needed)
+separately over the whole range.
+"""
+import os
+import shutil
+import tempfile
+import threading
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+
+from runner import run_ffmpeg
+from segmented import concat_line
+from keyframes import default_index
+from profiles import get_profile
+
+# Pieces carry SPS/PPS in front of every keyframe, whichever encoder made them
+PIECE_BSF = "h264_mp4toannexb,dump_extra=freq=keyframe"
+PIECE_FORMAT = "nut"
+# Copy runs shorter than this are not worth the extra processes; the range is encoded instead
+MIN_COPY_SECONDS = 2.0
+# Copying costs a small fraction of encoding the same length (for progress weights)
+COPY_COST = 0.02
+
+# libx264 profile for each H.264 profile ffprobe reports, so encoded edges match the copied middle
+X264_PROFILES = {
+    "Constrained Baseline": "baseline",
+    "Baseline": "baseline",
+    "Main": "main",
+    "High": "high",
+    "High 10": "high10",
+    "High 4:2:2": "high422",
+    "High 4:4:4 Predictive": "high444",
+}
+
+ENCODE = "encode"
+COPY = "copy"
+
+
+def parse_time(text):
+    """Parse "SS", "MM:SS" or "HH:MM:SS" (seconds may have decimals) into seconds"""
+    seconds = 0.0
+    for part in text.strip().split(":"):
+        seconds = seconds * 60 + float(part)
+    if seconds < 0:
+        raise ValueError(f"negative time: {text}")
+    return seconds
+
+
+def format_time(seconds):
+    """Format seconds as "M:SS.mmm" (or "H:MM:SS.mmm"), the form parse_time() reads"""
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(int(minutes), 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:06.3f}"
+    return f"{minutes}:{seconds:06.3f}"
+
+
+@dataclass
+class Piece:
+    """A run of frames of the output, in seconds from the start of the file (end exclusive)"""
+    action: str
+    start: float
+    end: float
+    frames: int
+
+
+def plan_cut(keyframes, start_time, fps, in_point, out_point, min_copy=MIN_COPY_SECONDS):
+    """Split the trim range [in_point, out_point) into encoded edges and a copied middle
+
+    `keyframes` are keyframe times as ffprobe reports them, `start_time` the
+    file's start time. The cuts are snapped to the frame grid. Returns a
+    single ENCODE piece if no run of whole GOPs of at least `min_copy`
+    seconds fits between them.
+    """
+    frame = 1.0 / fps
+    positions = [k - start_time for k in keyframes]
+    first = next((k for k in positions if k >= in_point - frame / 2), None)
+    last = max((k for k in positions if k <= out_point + frame / 2), default=None)
+
+    # Snap the cuts onto the frame grid, which passes through every keyframe
+    anchor = first if first is not None else in_point
+    start = anchor + round((in_point - anchor) * fps) * frame
+    end = anchor + round((out_point - anchor) * fps) * frame
+    if first is None or last is None or last - first < min_copy:
+        return [Piece(ENCODE, start, end, round((end - start) * fps))]
+
+    pieces = []
+    if first - start > frame / 2:
+        pieces.append(Piece(ENCODE, start, first, round((first - start) * fps)))
+    pieces.append(Piece(COPY, first, last, round((last - first) * fps)))
+    if end - last > frame / 2:
+        pieces.append(Piece(ENCODE, last, end, round((end - last) * fps)))
+    return pieces
+
+
+def edge_encoder_args(video_stream, profile):
+    """Encoder arguments that give re-encoded edges the same format as the copied middle"""
+    args = ["-c:v", *get_profile(profile).video_encoder_args()]
+    if video_stream.pix_fmt:
+        args.extend(["-pix_fmt", video_stream.pix_fmt])
+    if video_stream.profile in X264_PROFILES:
+        args.extend(["-profile:v", X264_PROFILES[video_stream.profile]])
+    if video_stream.field_order in ("tt", "tb", "bb", "bt"):
+        # Interlaced AVCHD: encode the edges as interlaced too, with the same field order
+        args.extend(["-flags", "+ildct+ilme", "-top", "1" if video_stream.field_order in ("tt", "tb") else "0"])
+    return args
+
+
+def can_smart_trim(metadata):
+    """True if a file's video can be cut at GOP boundaries and joined with re-encoded edges"""
+    video = metadata.video_stream if metadata else None
+    return video is not None and video.codec_name == "h264" and video.fps > 0
+
+
+def smart_trim(input_path, output_path, metadata, in_point, out_point, encoder_args, audio_args,
+               video_args=None, mux_input_args=None, profile=None, on_progress=None, stats=None, control=None,
+               keyframes=None):
+    """Cut [in_point, out_point) of a file into output_path, copying every whole GOP
+
+    encoder_args are added to the edge encodes (e.g. a thread budget), and
+    mux_input_args and video_args to the input and output of the final mux
+    (e.g. the display rotation). audio_args encode the audio, or are empty if
+    it has none. Returns False (without doing any work) if the range holds
+    too few whole GOPs to copy; raises ConversionError if any step fails. The ProcessStats of every ffmpeg
+    process are appended to `stats`, and a JobControl given as `control`
+    pauses or cancels all of them together.
+    """
+    video = metadata.video_stream
+    fps = video.fps
+    keyframes = keyframes if keyframes is not None else default_index().get(input_path)
+    pieces = plan_cut(keyframes, metadata.start_time, fps, in_point, out_point)
+    if not any(piece.action == COPY for piece in pieces):
+        return False
+
+    # Seek half a frame before (or after) the wanted frame so rounding never picks its neighbor
+    half_frame = 0.5 / fps
+    duration = pieces[-1].end - pieces[0].start
+
+    work_dir = tempfile.mkdtemp(prefix=".trim-", dir=os.path.dirname(os.path.abspath(output_path)))
+    try:
+        weights = [(piece.end - piece.start) * (COPY_COST if piece.action == COPY else 1.0) for piece in pieces]
+        if audio_args:
+            weights.append(duration * 0.05)
+        progress = [0.0] * len(weights)
+        lock = threading.Lock()
+
+        def report(index, fraction):
+            with lock:
+                progress[index] = fraction
+                overall = sum(w * p for w, p in zip(weights, progress)) / sum(weights)
+            if on_progress:
+                on_progress(overall)
+
+        def cut_piece(index, piece):
+            if piece.action == COPY:
+                # Input seeking lands on the keyframe the piece starts with
+                seek, codec = piece.start + half_frame, ["-c:v", "copy"]
+            else:
+                # Decode from the keyframe before the piece and drop the frames before it
+                seek, codec = max(0.0, piece.start - half_frame), [*edge_encoder_args(video, profile), *encoder_args]
+            cmd = [
+                "ffmpeg", "-nostdin", "-ss", f"{seek:.6f}", "-i", input_path,
+                "-map", "0:v:0", "-an", "-frames:v", str(piece.frames), *codec,
+                "-bsf:v", PIECE_BSF, "-f", PIECE_FORMAT,
+                "-progress", "pipe:1", "-y", piece_paths[index]
+            ]
+            run_ffmpeg(cmd, piece.end - piece.start, lambda fraction: report(index, fraction), stats,
+                       control=control)
+
+        def cut_audio():
+            cmd = [
+                "ffmpeg", "-nostdin", "-ss", f"{pieces[0].start:.6f}", "-i", input_path,
+                "-t", f"{duration:.6f}", "-map", "0:a", "-vn",
+                *audio_args,
+                "-progress", "pipe:1", "-y", audio_path
+            ]
+            run_ffmpeg(cmd, duration, lambda fraction: report(len(pieces), fraction), stats, control=control)
+
+        piece_paths = [os.path.join(work_dir, f"piece{i}.{PIECE_FORMAT}") for i in range(len(pieces))]
+        audio_path = os.path.join(work_dir, "audio.m4a")
+
+        with ThreadPoolExecutor(max_workers=len(weights)) as pool:
+            futures = [pool.submit(cut_piece, i, piece) for i, piece in enumerate(pieces)]
+            if audio_args:
+                futures.append(pool.submit(cut_audio))
+            for future in futures:
+                future.result()  # Re-raises the first failure
+
+        # Join the pieces without re-encoding. Their exact lengths are given, since a
+        # container's duration may leave out the last frame and shift the next piece.
+        list_path = os.path.join(work_dir, "pieces.txt")
+        with open(list_path, "w") as f:
+            for path, piece in zip(piece_paths, pieces):
+                f.write(concat_line(path))
+                f.write(f"duration {piece.frames / fps:.6f}\n")
+
+        cmd = ["ffmpeg", "-nostdin", *(mux_input_args or []), "-f", "concat", "-safe", "0", "-i", list_path]
+        if audio_args:
+            cmd.extend(["-i", audio_path, "-map", "0:v:0", "-map", "1:a"])
+        cmd.extend(["-c", "copy", *(video_args or []), "-progress", "pipe:1", "-y", output_path])
+        run_ffmpeg(cmd, stats=stats, control=control)
+        return True
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)